@@ -4,13 +4,20 @@ FastAPI routes for artwork operations
 from typing import List, Optional
 from uuid import UUID
 from decimal import Decimal
-from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi import APIRouter, HTTPException, Query, Depends, Request
 from fastapi.responses import JSONResponse
 import logging
 
-from models.artwork import ArtworkCreate, ArtworkUpdate, ArtworkResponse, ArtworkSearch
+from models.artwork import ArtworkCreate, ArtworkUpdate, ArtworkResponse, ArtworkSearch, ArtworkTextMatch, CoSelectedArtwork, SimilarArtwork, StyleCluster
 from crud.artwork_crud import artwork_crud
 from database import db_connection
+from services.clustering import style_clusters
+from services.coselection import coselection_graph
+from services.embedding_store import IndexNotReadyError
+from services.http_cache import HTTP_CACHE_LIST_CONTROL, conditional_response, count_etag, item_etag, list_etag
+from services.jobs import PRIORITY_INTERACTIVE, job_queue
+from services.neighbours import neighbour_table
+from services.serialization import FastJSONResponse
 
 logger = logging.getLogger(__name__)
 
@@ -19,37 +26,121 @@ router = APIRouter(prefix="/api/artworks", tags=["artworks"])
 
 @router.post("/", response_model=ArtworkResponse, status_code=201)
 async def create_artwork(artwork: ArtworkCreate):
-    """Create a new artwork"""
+    """Create a new artwork (its image embedding is computed by a background job)"""
     try:
         result = await artwork_crud.create_artwork(artwork)
-        return result
+        if result.image_url:
+            job_queue.enqueue(
+                "embed_artwork",
+                {"artwork_id": str(result.id), "image_url": result.image_url},
+                priority=PRIORITY_INTERACTIVE,
+            )
+        return FastJSONResponse(content=result, status_code=201)
     except Exception as e:
         logger.error(f"Error creating artwork: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/clusters", response_model=List[StyleCluster])
+async def get_style_clusters(
+    sample_size: int = Query(default=5, ge=0, le=20, description="Sample artworks per cluster")
+):
+    """Browse style clusters (k-means over artwork embeddings)"""
+    try:
+        return style_clusters.describe(sample_size=sample_size)
+    except IndexNotReadyError as e:
+        logger.error(f"Style clusters not ready: {e}")
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error getting style clusters: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/clusters/{cluster_id}", response_model=dict)
+async def get_style_cluster_artworks(
+    cluster_id: int,
+    limit: int = Query(default=20, ge=1, le=100),
+    offset: int = Query(default=0, ge=0)
+):
+    """Get artwork IDs in a style cluster, closest to the centroid first"""
+    try:
+        artwork_ids = style_clusters.members(cluster_id, limit=limit, offset=offset)
+        if artwork_ids is None:
+            raise HTTPException(status_code=404, detail="Style cluster not found")
+        return {"cluster_id": cluster_id, "artwork_ids": artwork_ids}
+    except HTTPException:
+        raise
+    except IndexNotReadyError as e:
+        logger.error(f"Style clusters not ready: {e}")
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error getting artworks for style cluster {cluster_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/{artwork_id}", response_model=ArtworkResponse)
-async def get_artwork(artwork_id: UUID):
+async def get_artwork(artwork_id: UUID, request: Request):
     """Get artwork by ID"""
     try:
         artwork = await artwork_crud.get_artwork_by_id(artwork_id)
         if not artwork:
             raise HTTPException(status_code=404, detail="Artwork not found")
-        return artwork
+        return conditional_response(
+            request, item_etag(artwork), lambda: FastJSONResponse(content=artwork), last_modified=artwork.updated_at
+        )
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error getting artwork {artwork_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/{artwork_id}/similar", response_model=List[SimilarArtwork])
+async def get_similar_artworks(
+    artwork_id: UUID,
+    limit: int = Query(default=10, ge=1, le=100, description="Maximum number of similar artworks")
+):
+    """Get precomputed similar artworks ("more like this")"""
+    try:
+        similar = neighbour_table.get_similar(str(artwork_id), limit=limit)
+        if similar is None:
+            raise HTTPException(status_code=404, detail="No similar artworks computed for this artwork")
+        return similar
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting similar artworks for {artwork_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{artwork_id}/co-selected", response_model=List[CoSelectedArtwork])
+async def get_co_selected_artworks(
+    artwork_id: UUID,
+    limit: int = Query(default=10, ge=1, le=100, description="Maximum number of artworks"),
+    min_count: int = Query(default=1, ge=1, description="Ignore pairs seen in fewer sessions than this")
+):
+    """People who were shown this artwork chose these instead (from session history)"""
+    try:
+        chosen = coselection_graph.co_selected(str(artwork_id), limit=limit, min_count=min_count)
+        if chosen is None:
+            raise HTTPException(status_code=404, detail="No sessions with a choice have shown this artwork")
+        return chosen
+    except HTTPException:
+        raise
+    except IndexNotReadyError as e:
+        logger.error(f"Co-selection graph not ready: {e}")
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error getting co-selected artworks for {artwork_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/", response_model=List[ArtworkResponse])
 async def get_artworks(
+    request: Request,
     limit: int = Query(default=10, ge=1, le=100),
     offset: int = Query(default=0, ge=0)
 ):
     """Get all artworks with pagination"""
     try:
         artworks = await artwork_crud.get_all_artworks(limit=limit, offset=offset)
-        return artworks
+        return conditional_response(
+            request, list_etag(artworks), lambda: FastJSONResponse(content=artworks), cache_control=HTTP_CACHE_LIST_CONTROL
+        )
     except Exception as e:
         logger.error(f"Error getting artworks: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -61,7 +152,7 @@ async def update_artwork(artwork_id: UUID, artwork_update: ArtworkUpdate):
         artwork = await artwork_crud.update_artwork(artwork_id, artwork_update)
         if not artwork:
             raise HTTPException(status_code=404, detail="Artwork not found")
-        return artwork
+        return FastJSONResponse(content=artwork)
     except HTTPException:
         raise
     except Exception as e:
@@ -87,64 +178,94 @@ async def search_artworks(search_params: ArtworkSearch):
     """Search artworks with filters"""
     try:
         artworks = await artwork_crud.search_artworks(search_params)
-        return artworks
+        return FastJSONResponse(content=artworks)
     except Exception as e:
         logger.error(f"Error searching artworks: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/search/style", response_model=List[ArtworkResponse])
 async def get_artworks_by_style(
+    request: Request,
     style_tags: List[str] = Query(..., description="Style tags to search for")
 ):
     """Get artworks by style tags"""
     try:
         artworks = await artwork_crud.get_artworks_by_style(style_tags)
-        return artworks
+        return conditional_response(
+            request, list_etag(artworks), lambda: FastJSONResponse(content=artworks), cache_control=HTTP_CACHE_LIST_CONTROL
+        )
     except Exception as e:
         logger.error(f"Error getting artworks by style: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/search/price", response_model=List[ArtworkResponse])
 async def get_artworks_by_price_range(
+    request: Request,
     min_price: Decimal = Query(..., ge=0, description="Minimum price"),
     max_price: Decimal = Query(..., ge=0, description="Maximum price")
 ):
     """Get artworks within price range"""
     try:
         artworks = await artwork_crud.get_artworks_by_price_range(min_price, max_price)
-        return artworks
+        return conditional_response(
+            request, list_etag(artworks), lambda: FastJSONResponse(content=artworks), cache_control=HTTP_CACHE_LIST_CONTROL
+        )
     except Exception as e:
         logger.error(f"Error getting artworks by price range: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/search/brand", response_model=List[ArtworkResponse])
-async def get_artworks_by_brand(brand: str = Query(..., description="Brand name")):
+async def get_artworks_by_brand(request: Request, brand: str = Query(..., description="Brand name")):
     """Get artworks by brand"""
     try:
         artworks = await artwork_crud.get_artworks_by_brand(brand)
-        return artworks
+        return conditional_response(
+            request, list_etag(artworks), lambda: FastJSONResponse(content=artworks), cache_control=HTTP_CACHE_LIST_CONTROL
+        )
     except Exception as e:
         logger.error(f"Error getting artworks by brand: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/search/text", response_model=List[ArtworkTextMatch])
+async def search_artworks_text(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200, description="Search text, e.g. \"blue abstract waves\""),
+    limit: int = Query(default=10, ge=1, le=100, description="Number of results to return"),
+    offset: int = Query(default=0, ge=0, description="Number of results to skip")
+):
+    """Full-text search over artwork title, brand and style tags, ranked by relevance and tolerant of typos"""
+    try:
+        artworks = await artwork_crud.search_artworks_text(q, limit, offset)
+        return conditional_response(
+            request, list_etag(artworks), lambda: FastJSONResponse(content=artworks), cache_control=HTTP_CACHE_LIST_CONTROL
+        )
+    except Exception as e:
+        logger.error(f"Error searching artworks by text: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/stats/count", response_model=dict)
-async def get_artwork_count():
+async def get_artwork_count(request: Request):
     """Get total count of artworks"""
     try:
         count = await artwork_crud.count_artworks()
-        return {"total_artworks": count}
+        return conditional_response(
+            request, count_etag(count), lambda: FastJSONResponse(content={"total_artworks": count}), cache_control=HTTP_CACHE_LIST_CONTROL
+        )
     except Exception as e:
         logger.error(f"Error getting artwork count: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/recent", response_model=List[ArtworkResponse])
 async def get_recent_artworks(
+    request: Request,
     limit: int = Query(default=5, ge=1, le=20, description="Number of recent artworks to return")
 ):
     """Get recently added artworks"""
     try:
         artworks = await artwork_crud.get_recent_artworks(limit)
-        return artworks
+        return conditional_response(
+            request, list_etag(artworks), lambda: FastJSONResponse(content=artworks), cache_control=HTTP_CACHE_LIST_CONTROL
+        )
     except Exception as e:
         logger.error(f"Error getting recent artworks: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -3,7 +3,7 @@ FastAPI routes for artwork embedding operations
 """
 from typing import List, Optional
 from uuid import UUID
-from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi import APIRouter, HTTPException, Query, Depends, Request, Response
 from fastapi.responses import JSONResponse
 import logging
 
@@ -11,10 +11,16 @@ from models.artwork_embedding import (
     ArtworkEmbeddingCreate,
     ArtworkEmbeddingUpdate,
     ArtworkEmbeddingResponse,
-    ArtworkEmbeddingSearch
+    ArtworkEmbeddingSearch,
+    ArtworkEmbeddingBatchSearch
 )
 from pydantic import BaseModel
 from crud.artwork_embedding_crud import artwork_embedding_crud
+from services.embedder import embedder
+from services.embedding_codec import body_parser, embedding_response, negotiate, request_body_openapi
+from services.embedding_store import IndexNotReadyError
+from services.http_cache import HTTP_CACHE_LIST_CONTROL, conditional_response, count_etag, embedding_etag, list_etag
+from services.serialization import FastJSONResponse
 from database import db_connection
 
 logger = logging.getLogger(__name__)
@@ -23,12 +29,20 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/artwork-embeddings", tags=["artwork-embeddings"])
 
 
-@router.post("/", response_model=ArtworkEmbeddingResponse, status_code=201)
-async def create_embedding(embedding: ArtworkEmbeddingCreate):
-    """Create a new artwork embedding"""
+def _conditional_embedding(request: Request, embedding) -> Response:
+    """One embedding in the negotiated format, or 304 if the client already has it"""
+    media = negotiate(request.headers.get("accept"))
+    return conditional_response(
+        request, embedding_etag(embedding, media), lambda: embedding_response(request, embedding), vary="Accept"
+    )
+
+
+@router.post("/", response_model=ArtworkEmbeddingResponse, status_code=201, openapi_extra=request_body_openapi("ArtworkEmbeddingCreate"))
+async def create_embedding(request: Request, embedding: ArtworkEmbeddingCreate = Depends(body_parser(ArtworkEmbeddingCreate))):
+    """Create a new artwork embedding (JSON, msgpack or octet-stream body)"""
     try:
         result = await artwork_embedding_crud.create_embedding(embedding)
-        return result
+        return embedding_response(request, result, status_code=201)
     except ValueError as e:
         logger.error(f"Validation error creating embedding: {e}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -38,13 +52,13 @@ async def create_embedding(embedding: ArtworkEmbeddingCreate):
 
 
 @router.get("/{embedding_id}", response_model=ArtworkEmbeddingResponse)
-async def get_embedding(embedding_id: UUID):
+async def get_embedding(embedding_id: UUID, request: Request):
     """Get artwork embedding by ID"""
     try:
         embedding = await artwork_embedding_crud.get_embedding_by_id(embedding_id)
         if not embedding:
             raise HTTPException(status_code=404, detail="Artwork embedding not found")
-        return embedding
+        return _conditional_embedding(request, embedding)
     except HTTPException:
         raise
     except Exception as e:
@@ -53,13 +67,13 @@ async def get_embedding(embedding_id: UUID):
 
 
 @router.get("/artwork/{artwork_id}", response_model=ArtworkEmbeddingResponse)
-async def get_embedding_by_artwork_id(artwork_id: UUID):
+async def get_embedding_by_artwork_id(artwork_id: UUID, request: Request):
     """Get artwork embedding by artwork ID"""
     try:
         embedding = await artwork_embedding_crud.get_embedding_by_artwork_id(artwork_id)
         if not embedding:
             raise HTTPException(status_code=404, detail="Artwork embedding not found for this artwork")
-        return embedding
+        return _conditional_embedding(request, embedding)
     except HTTPException:
         raise
     except Exception as e:
@@ -69,26 +83,34 @@ async def get_embedding_by_artwork_id(artwork_id: UUID):
 
 @router.get("/", response_model=List[ArtworkEmbeddingResponse])
 async def get_embeddings(
+    request: Request,
     limit: int = Query(default=10, ge=1, le=100, description="Maximum number of results"),
     offset: int = Query(default=0, ge=0, description="Number of results to skip")
 ):
     """Get all artwork embeddings with pagination"""
     try:
         embeddings = await artwork_embedding_crud.get_all_embeddings(limit=limit, offset=offset)
-        return embeddings
+        etag = list_etag(embeddings, negotiate(request.headers.get("accept")), validator=embedding_etag)
+        return conditional_response(
+            request, etag, lambda: embedding_response(request, embeddings), cache_control=HTTP_CACHE_LIST_CONTROL, vary="Accept"
+        )
     except Exception as e:
         logger.error(f"Error getting embeddings: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.put("/{embedding_id}", response_model=ArtworkEmbeddingResponse)
-async def update_embedding(embedding_id: UUID, embedding_update: ArtworkEmbeddingUpdate):
-    """Update artwork embedding by ID"""
+@router.put("/{embedding_id}", response_model=ArtworkEmbeddingResponse, openapi_extra=request_body_openapi("ArtworkEmbeddingUpdate"))
+async def update_embedding(
+    embedding_id: UUID,
+    request: Request,
+    embedding_update: ArtworkEmbeddingUpdate = Depends(body_parser(ArtworkEmbeddingUpdate))
+):
+    """Update artwork embedding by ID (JSON, msgpack or octet-stream body)"""
     try:
         embedding = await artwork_embedding_crud.update_embedding(embedding_id, embedding_update)
         if not embedding:
             raise HTTPException(status_code=404, detail="Artwork embedding not found")
-        return embedding
+        return embedding_response(request, embedding)
     except HTTPException:
         raise
     except ValueError as e:
@@ -134,7 +156,10 @@ async def search_similar_embeddings(search_params: ArtworkEmbeddingSearch):
     """Search for similar artwork embeddings using vector similarity"""
     try:
         results = await artwork_embedding_crud.search_similar_embeddings(search_params)
-        return results
+        return FastJSONResponse(content=results)
+    except IndexNotReadyError as e:
+        logger.error(f"Index not ready for {search_params.mode} search: {e}")
+        raise HTTPException(status_code=503, detail=str(e))
     except ValueError as e:
         logger.error(f"Validation error searching embeddings: {e}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -143,17 +168,42 @@ async def search_similar_embeddings(search_params: ArtworkEmbeddingSearch):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/search/batch", response_model=List[List[dict]])
+async def batch_search_similar_embeddings(search_params: ArtworkEmbeddingBatchSearch):
+    """Search neighbours for many query vectors at once (one top-k list per query)"""
+    try:
+        results = await artwork_embedding_crud.batch_search_similar_embeddings(search_params)
+        return FastJSONResponse(content=results)
+    except IndexNotReadyError as e:
+        logger.error(f"Index not ready for batch search: {e}")
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        logger.error(f"Validation error batch searching embeddings: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error batch searching embeddings: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/stats/count", response_model=dict)
-async def get_embedding_count():
+async def get_embedding_count(request: Request):
     """Get total count of artwork embeddings"""
     try:
         count = await artwork_embedding_crud.count_embeddings()
-        return {"total_embeddings": count}
+        return conditional_response(
+            request, count_etag(count), lambda: FastJSONResponse(content={"total_embeddings": count}), cache_control=HTTP_CACHE_LIST_CONTROL
+        )
     except Exception as e:
         logger.error(f"Error getting embedding count: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/embedder/stats", response_model=dict)
+async def get_embedder_stats():
+    """Embedding model throughput (images/sec) and micro-batching statistics"""
+    return embedder.stats()
+
+
 class SampleEmbeddingRequest(BaseModel):
     """Request model for creating sample embedding"""
     artwork_id: Optional[UUID] = None
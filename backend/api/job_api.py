@@ -0,0 +1,118 @@
+"""
+FastAPI routes for background job status and admin actions
+"""
+from typing import Dict, List, Optional
+from uuid import UUID
+from fastapi import APIRouter, HTTPException, Query
+import logging
+
+from models.job import JobResponse, RoomAnalysisBackfillRequest, ReindexRequest
+from services.job_tasks import enqueue_reindex, enqueue_room_analysis_backfill
+from services.jobs import JOB_STATUSES, job_queue, job_workers
+
+logger = logging.getLogger(__name__)
+
+# Create router
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+
+@router.get("/", response_model=List[JobResponse])
+async def get_jobs(
+    status: Optional[str] = Query(default=None, description="Filter by status"),
+    kind: Optional[str] = Query(default=None, description="Filter by job type"),
+    limit: int = Query(default=50, ge=1, le=500, description="Maximum number of results"),
+    offset: int = Query(default=0, ge=0, description="Number of results to skip")
+):
+    """List jobs, most recent first"""
+    try:
+        if status and status not in JOB_STATUSES:
+            raise HTTPException(status_code=400, detail=f"status must be one of: {', '.join(JOB_STATUSES)}")
+        return job_queue.list(status=status, kind=kind, limit=limit, offset=offset)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error listing jobs: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/stats", response_model=Dict)
+async def get_job_stats():
+    """Job counts per type and status, plus worker health"""
+    try:
+        return job_workers.stats()
+    except Exception as e:
+        logger.error(f"Error getting job stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/reindex", response_model=JobResponse, status_code=202)
+async def create_reindex_job(request: ReindexRequest):
+    """Enqueue a rebuild of the in-memory indexes (repeated requests share the queued job)"""
+    try:
+        return enqueue_reindex(request.targets)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error enqueuing reindex job: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/backfill-room-analysis", response_model=JobResponse, status_code=202)
+async def create_room_analysis_backfill_job(request: RoomAnalysisBackfillRequest):
+    """Enqueue palette/lighting analysis for existing room uploads (by default only where it is missing)"""
+    try:
+        return enqueue_room_analysis_backfill(request.steps, overwrite=request.overwrite, limit=request.limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error enqueuing room analysis backfill job: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(job_id: UUID):
+    """Get a job's status, progress and result"""
+    try:
+        job = job_queue.get(job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting job {job_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/{job_id}/retry", response_model=JobResponse)
+async def retry_job(job_id: UUID):
+    """Re-queue a failed or cancelled job"""
+    try:
+        job = job_queue.retry(job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error retrying job {job_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/{job_id}", response_model=JobResponse)
+async def cancel_job(job_id: UUID):
+    """Cancel a job that has not started yet"""
+    try:
+        job = job_queue.cancel(job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error cancelling job {job_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
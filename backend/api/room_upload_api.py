@@ -14,6 +14,7 @@ from models.room_upload import (
     RoomUploadSearch
 )
 from crud.room_upload_crud import room_upload_crud
+from services.jobs import job_queue
 
 logger = logging.getLogger(__name__)
 
@@ -23,9 +24,17 @@ router = APIRouter(prefix="/api/room-uploads", tags=["room-uploads"])
 
 @router.post("/", response_model=RoomUploadResponse, status_code=201)
 async def create_room_upload(room_upload: RoomUploadCreate):
-    """Create a new room upload"""
+    """Create a new room upload (the room photo is analysed by a background job)"""
     try:
         result = await room_upload_crud.create_room_upload(room_upload)
+        if result.s3_url:
+            # Palette and lighting supplied by the client are kept; the rest is computed from the photo
+            steps = ["embedding"]
+            if not result.palette_json:
+                steps.append("palette")
+            if not result.lighting_json:
+                steps.append("lighting")
+            job_queue.enqueue("analyze_room_upload", {"upload_id": str(result.id), "image_url": result.s3_url, "steps": steps})
         return result
     except Exception as e:
         logger.error(f"Error creating room upload: {e}")
@@ -14,6 +14,8 @@ from models.session import (
     SessionSearch
 )
 from crud.session_crud import session_crud
+from services.embedding_store import IndexNotReadyError
+from services.session_stats import session_stats
 
 logger = logging.getLogger(__name__)
 
@@ -159,3 +161,81 @@ async def get_session_count(user_id: Optional[UUID] = Query(None, description="O
         logger.error(f"Error getting session count: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+
+
+@router.get("/stats/funnel", response_model=dict)
+async def get_session_funnel():
+    """Session, choice and click-through totals from the incremental counters"""
+    try:
+        return session_stats.funnel()
+    except IndexNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error getting session funnel: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/stats/ranks", response_model=dict)
+async def get_chosen_rank_distribution():
+    """How often the chosen artwork sat at each position of the suggested list"""
+    try:
+        return session_stats.rank_distribution()
+    except IndexNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error getting chosen rank distribution: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/stats/artworks", response_model=List[dict])
+async def get_top_artwork_stats(
+    sort: str = Query(default="choices", pattern="^(impressions|choices|click_through_rate)$", description="Ranking key"),
+    limit: int = Query(default=10, ge=1, le=100, description="Maximum number of results"),
+    min_impressions: int = Query(default=1, ge=1, description="Ignore artworks shown fewer times than this")
+):
+    """Artworks with the most impressions or choices, or the best click-through rate"""
+    try:
+        return session_stats.top_artworks(by=sort, limit=limit, min_impressions=min_impressions)
+    except IndexNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error getting artwork stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/stats/artworks/{artwork_id}", response_model=dict)
+async def get_artwork_stats(artwork_id: UUID):
+    """Impressions, choices and click-through rate of one artwork"""
+    try:
+        return session_stats.artwork(artwork_id)
+    except IndexNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error getting stats for artwork {artwork_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/stats/style-tags", response_model=List[dict])
+async def get_style_tag_stats():
+    """Impressions, choices and click-through rate per style tag"""
+    try:
+        return session_stats.style_tags()
+    except IndexNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error getting style tag stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/stats/room-types", response_model=List[dict])
+async def get_room_type_stats():
+    """Sessions, choices and choice rate per room type"""
+    try:
+        return session_stats.room_types()
+    except IndexNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error getting room type stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
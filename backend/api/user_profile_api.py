@@ -11,9 +11,11 @@ from models.user_profile import (
     UserProfileCreate,
     UserProfileUpdate,
     UserProfileResponse,
-    UserProfileSearch
+    UserProfileSearch,
+    UserPurgeRequest
 )
 from crud.user_profile_crud import user_profile_crud
+from services.user_purge import PurgeIncompleteError, purge_user, purge_users
 
 logger = logging.getLogger(__name__)
 
@@ -150,6 +152,29 @@ async def delete_user_profile_by_user_id(user_id: UUID):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.delete("/user/{user_id}/purge", response_model=dict)
+async def purge_user_data(user_id: UUID):
+    """Delete everything stored about a user (sessions, room uploads, profile) and report rows per table"""
+    try:
+        return await purge_user(user_id)
+    except PurgeIncompleteError as e:
+        # Purging is idempotent: the client can retry and only the failed tables have rows left
+        raise HTTPException(status_code=500, detail=e.report) from e
+    except Exception as e:
+        logger.error(f"Error purging data for user {user_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/purge", response_model=List[dict])
+async def purge_users_data(request: UserPurgeRequest):
+    """Purge many users' data concurrently; failed tables are reported per user"""
+    try:
+        return await purge_users(request.user_ids)
+    except Exception as e:
+        logger.error(f"Error purging data for {len(request.user_ids)} users: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.post("/search", response_model=List[UserProfileResponse])
 async def search_user_profiles(search_params: UserProfileSearch):
     """Search user profiles with filters"""
@@ -0,0 +1,75 @@
+"""
+Benchmark response compression on typical catalog payloads.
+
+For an artwork list and an embedding search response (rows carrying 384
+float vectors plus a similarity), reports per request and per encoding:
+- bytes on the wire and the compression ratio
+- CPU time to compress (process time, so it is comparable across encodings)
+
+plus a streamed variant that compresses the embedding rows in 16-row chunks
+the way CompressionMiddleware handles StreamingResponse exports. zstd and br
+rows only appear when the optional zstandard / brotli packages are installed.
+
+Usage: python bench_compression.py [--rows 100] [--repeat 50]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+# Add the backend directory to Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_serialization import artwork_rows, embedding_rows
+from services.compression import CODECS, COMPRESSION_MIN_SIZE
+from services.serialization import dumps
+
+
+def search_rows(count: int) -> List[dict]:
+    rows = embedding_rows(count)
+    for row in rows:
+        row["similarity"] = random.uniform(0.5, 1.0)
+    rows.sort(key=lambda row: row["similarity"], reverse=True)
+    return rows
+
+
+def cpu_ms(func, repeat: int):
+    func()  # warm up
+    start = time.process_time()
+    for _ in range(repeat):
+        out = func()
+    return (time.process_time() - start) / repeat * 1000, out
+
+
+def streamed(factory, chunks: List[bytes]) -> bytes:
+    stream = factory()
+    return b"".join(stream.chunk(chunk) for chunk in chunks) + stream.finish()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"Encodings: {', '.join(CODECS)} (responses under {COMPRESSION_MIN_SIZE} bytes are sent uncompressed)")
+    search = search_rows(args.rows)
+    payloads = (
+        ("artwork list", dumps(artwork_rows(args.rows)), None),
+        ("embedding search", dumps(search), [dumps(search[i:i + 16]) for i in range(0, len(search), 16)]),
+    )
+    for label, body, chunks in payloads:
+        print(f"\n{label} ({args.rows} rows, {len(body) / 1024:.1f} KB uncompressed)")
+        print(f"  {'encoding':<16} {'KB':>8} {'ratio':>7} {'cpu ms':>8}")
+        for encoding, (compress, factory) in CODECS.items():
+            ms, out = cpu_ms(lambda: compress(body), args.repeat)
+            print(f"  {encoding:<16} {len(out) / 1024:8.1f} {len(body) / len(out):6.1f}x {ms:8.3f}")
+            if chunks:
+                ms, out = cpu_ms(lambda: streamed(factory, chunks), args.repeat)
+                print(f"  {encoding + ' streamed':<16} {len(out) / 1024:8.1f} {len(body) / len(out):6.1f}x {ms:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Profile import (boot) time of the API and the job workers.
+
+Runs ``python -X importtime -c "import <module>"`` in fresh interpreters and
+aggregates the per-module timings:
+- median total import time per entry point over ``--repeat`` runs
+- the slowest top-level packages (self time summed over their submodules)
+- the slowest modules by cumulative time
+- packages that are meant to load lazily (on first query, not at boot) but
+  were imported anyway
+
+Entry points default to ``main`` (what uvicorn imports before it can serve)
+and ``services.job_tasks`` (what every spawned job worker imports).
+``--budget-ms`` exits non-zero when a median exceeds it, so a regression in
+boot time fails CI instead of showing up as slow autoscaling.
+
+Usage: python bench_import_time.py [--repeat 5] [--top 15] [--budget-ms 800] [module ...]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent
+
+# Heavy packages that should only load when first needed
+LAZY_PACKAGES = ("supabase", "postgrest", "httpx", "uvicorn", "PIL")
+
+
+def import_times(module: str) -> List[Tuple[str, int, int]]:
+    """(module, self µs, cumulative µs) for every module imported by ``import module``"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def profile(module: str, repeat: int) -> Dict[str, object]:
+    totals: List[float] = []
+    packages: Dict[str, List[float]] = defaultdict(list)
+    cumulative: Dict[str, List[float]] = defaultdict(list)
+    imported = set()
+    for _ in range(repeat):
+        rows = import_times(module)
+        per_package: Dict[str, float] = defaultdict(float)
+        for name, self_us, cumulative_us in rows:
+            per_package[name.split(".")[0]] += self_us / 1000
+            cumulative[name].append(cumulative_us / 1000)
+            imported.add(name.split(".")[0])
+        for package, ms in per_package.items():
+            packages[package].append(ms)
+        totals.append(sum(self_us for _, self_us, _ in rows) / 1000)
+    return {
+        "total_ms": statistics.median(totals),
+        "packages": {package: statistics.median(ms) for package, ms in packages.items()},
+        "cumulative": {name: statistics.median(ms) for name, ms in cumulative.items()},
+        "lazy_violations": [package for package in LAZY_PACKAGES if package in imported],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=["main", "services.job_tasks"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail if a median import time exceeds this")
+    args = parser.parse_args()
+
+    over_budget = []
+    for module in args.modules:
+        report = profile(module, args.repeat)
+        print(f"\nimport {module}: {report['total_ms']:.0f} ms (median of {args.repeat})")
+        print(f"  {'package':<28} {'self ms':>8}")
+        for package, ms in sorted(report["packages"].items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {package:<28} {ms:8.1f}")
+        print(f"  {'module':<44} {'cumulative ms':>13}")
+        for name, ms in sorted(report["cumulative"].items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {name:<44} {ms:13.1f}")
+        if report["lazy_violations"]:
+            print(f"  imported at boot but meant to load lazily: {', '.join(report['lazy_violations'])}")
+        if args.budget_ms is not None and report["total_ms"] > args.budget_ms:
+            over_budget.append(module)
+
+    if over_budget:
+        print(f"\nOver the {args.budget_ms:.0f} ms budget: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark the trusted-row response path against full Pydantic validation.
+
+Compares, per request:
+- current path: Model(**row) for every row, then FastAPI-style response_model
+  validation + jsonable_encoder + JSONResponse rendering
+- fast path: Model.model_construct(**row) + FastJSONResponse rendering
+
+for an artwork list of 100 rows and an embedding list of 100 rows (384 floats each).
+
+Usage: python bench_serialization.py [--rows 100] [--repeat 50]
+"""
+import argparse
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List
+
+# Add the backend directory to Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from models.artwork import ArtworkResponse
+from models.artwork_embedding import ArtworkEmbeddingResponse
+from services.serialization import FastJSONResponse, orjson, trusted_model
+
+
+def artwork_rows(count: int) -> List[dict]:
+    now = datetime.now(timezone.utc).isoformat()
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "title": f"Artwork {i}",
+            "brand": "Contemporary Gallery",
+            "price": round(random.uniform(50, 900), 2),
+            "style_tags": ["abstract", "modern", "blue"],
+            "dominant_palette": {"primary": "#1e3a8a", "secondary": "#3b82f6", "accent": "#93c5fd"},
+            "image_url": f"https://example.com/artwork-{i}.jpg",
+            "created_at": now,
+            "updated_at": now,
+        }
+        for i in range(count)
+    ]
+
+
+def embedding_rows(count: int) -> List[dict]:
+    now = datetime.now(timezone.utc).isoformat()
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "artwork_id": str(uuid.uuid4()),
+            "vector": [random.uniform(-1.0, 1.0) for _ in range(384)],
+            "created_at": now,
+        }
+        for _ in range(count)
+    ]
+
+
+def current_path(model, adapter, rows) -> bytes:
+    models = [model(**row) for row in rows]
+    validated = adapter.validate_python(models, from_attributes=True)
+    content = jsonable_encoder(adapter.dump_python(validated, mode="json"))
+    return JSONResponse(content=content).body
+
+
+def fast_path(model, rows) -> bytes:
+    models = [trusted_model(model, row) for row in rows]
+    return FastJSONResponse(content=models).body
+
+
+def bench(label: str, func, repeat: int) -> float:
+    func()  # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        body = func()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"  {label:<14} {elapsed * 1000:8.3f} ms/request  {len(body) / 1024:8.1f} KB")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"JSON encoder: {'orjson' if orjson is not None else 'json (install orjson for the full speed-up)'}")
+    for label, model, rows in (
+        ("artwork list", ArtworkResponse, artwork_rows(args.rows)),
+        ("embedding list", ArtworkEmbeddingResponse, embedding_rows(args.rows)),
+    ):
+        adapter = TypeAdapter(List[model])
+        print(f"\n{label} ({args.rows} rows)")
+        slow = bench("current", lambda: current_path(model, adapter, rows), args.repeat)
+        fast = bench("trusted+fast", lambda: fast_path(model, rows), args.repeat)
+        print(f"  speed-up       {slow / fast:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,17 +9,29 @@ import logging
 from datetime import datetime
 
 from database import db_connection
-from models.artwork import ArtworkCreate, ArtworkUpdate, ArtworkResponse, ArtworkSearch, ArtworkFilter
+from models.artwork import ARTWORK_COLUMNS, ArtworkCreate, ArtworkUpdate, ArtworkResponse, ArtworkSearch, ArtworkFilter, ArtworkTextMatch
+from services.serialization import trusted_model
+from services.snapshot import CatalogSnapshot, catalog_snapshot
+from services.coalescing import SingleFlight
+from services.session_stats import session_stats
+from services.text_index import TEXT_SEARCH_MIN_SIMILARITY, TEXT_SEARCH_SOURCE
 
 logger = logging.getLogger(__name__)
 
+# Identical concurrent reads of this table share one PostgREST request
+_reads = SingleFlight("artwork")
+
 class ArtworkCRUD:
     """CRUD operations for artwork table"""
     
     def __init__(self):
-        self.db = db_connection.client
         self.table_name = "artwork"
     
+    @property
+    def db(self):
+        """Supabase client, created on first query rather than when this module is imported"""
+        return db_connection.client
+    
     @staticmethod
     def _convert_decimals_to_primitives(value: Any) -> Any:
         """Recursively convert Decimal values to float so payload is JSON serializable."""
@@ -31,6 +43,7 @@ class ArtworkCRUD:
             return {k: ArtworkCRUD._convert_decimals_to_primitives(v) for k, v in value.items()}
         return value
     
+    @_reads.invalidates
     async def create_artwork(self, artwork: ArtworkCreate) -> ArtworkResponse:
         """Create a new artwork"""
         try:
@@ -46,33 +59,38 @@ class ArtworkCRUD:
                 raise Exception("Failed to create artwork")
             
             logger.info(f"Created artwork: {result.data[0]['id']}")
-            return ArtworkResponse(**result.data[0])
+            session_stats.note_artwork_tags(result.data[0]["id"], result.data[0].get("style_tags"))
+            return trusted_model(ArtworkResponse, result.data[0])
             
         except Exception as e:
             logger.error(f"Error creating artwork: {e}")
             raise
     
+    @_reads.coalesce
+    @catalog_snapshot.serves_stale(CatalogSnapshot.artwork, ArtworkResponse)
     async def get_artwork_by_id(self, artwork_id: UUID) -> Optional[ArtworkResponse]:
         """Get artwork by ID"""
         try:
-            result = self.db.table(self.table_name).select("*").eq("id", str(artwork_id)).execute()
+            result = self.db.table(self.table_name).select(ARTWORK_COLUMNS).eq("id", str(artwork_id)).execute()
             
             if not result.data:
                 logger.warning(f"Artwork not found: {artwork_id}")
                 return None
             
-            return ArtworkResponse(**result.data[0])
+            return trusted_model(ArtworkResponse, result.data[0])
             
         except Exception as e:
             logger.error(f"Error getting artwork {artwork_id}: {e}")
             raise
     
+    @_reads.coalesce
+    @catalog_snapshot.serves_stale(CatalogSnapshot.artwork_page, ArtworkResponse)
     async def get_all_artworks(self, limit: int = 10, offset: int = 0) -> List[ArtworkResponse]:
         """Get all artworks with pagination"""
         try:
-            result = self.db.table(self.table_name).select("*").range(offset, offset + limit - 1).execute()
+            result = self.db.table(self.table_name).select(ARTWORK_COLUMNS).range(offset, offset + limit - 1).execute()
             
-            artworks = [ArtworkResponse(**item) for item in result.data]
+            artworks = [trusted_model(ArtworkResponse, item) for item in result.data]
             logger.info(f"Retrieved {len(artworks)} artworks")
             return artworks
             
@@ -80,6 +98,7 @@ class ArtworkCRUD:
             logger.error(f"Error getting all artworks: {e}")
             raise
     
+    @_reads.invalidates
     async def update_artwork(self, artwork_id: UUID, artwork_update: ArtworkUpdate) -> Optional[ArtworkResponse]:
         """Update artwork by ID"""
         try:
@@ -100,12 +119,15 @@ class ArtworkCRUD:
                 return None
             
             logger.info(f"Updated artwork: {artwork_id}")
-            return ArtworkResponse(**result.data[0])
+            if "style_tags" in update_data:
+                session_stats.note_artwork_tags(artwork_id, result.data[0].get("style_tags"))
+            return trusted_model(ArtworkResponse, result.data[0])
             
         except Exception as e:
             logger.error(f"Error updating artwork {artwork_id}: {e}")
             raise
     
+    @_reads.invalidates
     async def delete_artwork(self, artwork_id: UUID) -> bool:
         """Delete artwork by ID"""
         try:
@@ -122,10 +144,12 @@ class ArtworkCRUD:
             logger.error(f"Error deleting artwork {artwork_id}: {e}")
             raise
     
+    @_reads.coalesce
+    @catalog_snapshot.serves_stale(CatalogSnapshot.search_artworks, ArtworkResponse)
     async def search_artworks(self, search_params: ArtworkSearch) -> List[ArtworkResponse]:
         """Search artworks with filters"""
         try:
-            query = self.db.table(self.table_name).select("*")
+            query = self.db.table(self.table_name).select(ARTWORK_COLUMNS)
             
             # Apply filters
             if search_params.style_tags:
@@ -144,7 +168,7 @@ class ArtworkCRUD:
             query = query.range(search_params.offset, search_params.offset + search_params.limit - 1)
             
             result = query.execute()
-            artworks = [ArtworkResponse(**item) for item in result.data]
+            artworks = [trusted_model(ArtworkResponse, item) for item in result.data]
             
             logger.info(f"Found {len(artworks)} artworks matching search criteria")
             return artworks
@@ -153,12 +177,14 @@ class ArtworkCRUD:
             logger.error(f"Error searching artworks: {e}")
             raise
     
+    @_reads.coalesce
+    @catalog_snapshot.serves_stale(CatalogSnapshot.artworks_by_style, ArtworkResponse)
     async def get_artworks_by_style(self, style_tags: List[str]) -> List[ArtworkResponse]:
         """Get artworks by style tags"""
         try:
-            result = self.db.table(self.table_name).select("*").overlaps("style_tags", style_tags).execute()
+            result = self.db.table(self.table_name).select(ARTWORK_COLUMNS).overlaps("style_tags", style_tags).execute()
             
-            artworks = [ArtworkResponse(**item) for item in result.data]
+            artworks = [trusted_model(ArtworkResponse, item) for item in result.data]
             logger.info(f"Found {len(artworks)} artworks with styles: {style_tags}")
             return artworks
             
@@ -166,12 +192,14 @@ class ArtworkCRUD:
             logger.error(f"Error getting artworks by style: {e}")
             raise
     
+    @_reads.coalesce
+    @catalog_snapshot.serves_stale(CatalogSnapshot.artworks_by_price_range, ArtworkResponse)
     async def get_artworks_by_price_range(self, min_price: Decimal, max_price: Decimal) -> List[ArtworkResponse]:
         """Get artworks within price range"""
         try:
-            result = self.db.table(self.table_name).select("*").gte("price", float(min_price)).lte("price", float(max_price)).execute()
+            result = self.db.table(self.table_name).select(ARTWORK_COLUMNS).gte("price", float(min_price)).lte("price", float(max_price)).execute()
             
-            artworks = [ArtworkResponse(**item) for item in result.data]
+            artworks = [trusted_model(ArtworkResponse, item) for item in result.data]
             logger.info(f"Found {len(artworks)} artworks in price range ${min_price}-${max_price}")
             return artworks
             
@@ -179,12 +207,14 @@ class ArtworkCRUD:
             logger.error(f"Error getting artworks by price range: {e}")
             raise
     
+    @_reads.coalesce
+    @catalog_snapshot.serves_stale(CatalogSnapshot.artworks_by_brand, ArtworkResponse)
     async def get_artworks_by_brand(self, brand: str) -> List[ArtworkResponse]:
         """Get artworks by brand"""
         try:
-            result = self.db.table(self.table_name).select("*").eq("brand", brand).execute()
+            result = self.db.table(self.table_name).select(ARTWORK_COLUMNS).eq("brand", brand).execute()
             
-            artworks = [ArtworkResponse(**item) for item in result.data]
+            artworks = [trusted_model(ArtworkResponse, item) for item in result.data]
             logger.info(f"Found {len(artworks)} artworks by brand: {brand}")
             return artworks
             
@@ -192,6 +222,35 @@ class ArtworkCRUD:
             logger.error(f"Error getting artworks by brand: {e}")
             raise
     
+    @_reads.coalesce
+    @catalog_snapshot.serves_stale(CatalogSnapshot.search_text, ArtworkTextMatch)
+    async def search_artworks_text(self, query: str, limit: int = 10, offset: int = 0) -> List[ArtworkTextMatch]:
+        """Full-text search over title, brand and style tags, best match first"""
+        try:
+            if TEXT_SEARCH_SOURCE == "snapshot" and catalog_snapshot.is_ready:
+                # Answer from the in-process index without a database round trip
+                rows = catalog_snapshot.search_text(query, limit, offset)
+            else:
+                rows = self.db.rpc(
+                    "search_artworks_text",
+                    {
+                        "query": query,
+                        "match_count": limit,
+                        "match_offset": offset,
+                        "min_similarity": TEXT_SEARCH_MIN_SIMILARITY
+                    }
+                ).execute().data
+            
+            artworks = [trusted_model(ArtworkTextMatch, item) for item in rows]
+            logger.info(f"Found {len(artworks)} artworks matching text: {query}")
+            return artworks
+            
+        except Exception as e:
+            logger.error(f"Error searching artworks by text: {e}")
+            raise
+    
+    @_reads.coalesce
+    @catalog_snapshot.serves_stale(CatalogSnapshot.count_artworks)
     async def count_artworks(self) -> int:
         """Get total count of artworks"""
         try:
@@ -204,12 +263,14 @@ class ArtworkCRUD:
             logger.error(f"Error counting artworks: {e}")
             raise
     
+    @_reads.coalesce
+    @catalog_snapshot.serves_stale(CatalogSnapshot.recent_artworks, ArtworkResponse)
     async def get_recent_artworks(self, limit: int = 5) -> List[ArtworkResponse]:
         """Get recently added artworks"""
         try:
-            result = self.db.table(self.table_name).select("*").order("created_at", desc=True).limit(limit).execute()
+            result = self.db.table(self.table_name).select(ARTWORK_COLUMNS).order("created_at", desc=True).limit(limit).execute()
             
-            artworks = [ArtworkResponse(**item) for item in result.data]
+            artworks = [trusted_model(ArtworkResponse, item) for item in result.data]
             logger.info(f"Retrieved {len(artworks)} recent artworks")
             return artworks
             
@@ -2,8 +2,10 @@
 CRUD operations for artwork_embedding table
 """
 from database import db_connection
-from typing import List, Optional
+from typing import List, Optional, Sequence, Tuple, Union
 from uuid import UUID
+import asyncio
+import json
 import logging
 from datetime import datetime
 
@@ -11,19 +13,51 @@ from models.artwork_embedding import (
     ArtworkEmbeddingCreate,
     ArtworkEmbeddingUpdate,
     ArtworkEmbeddingResponse,
-    ArtworkEmbeddingSearch
+    ArtworkEmbeddingSearch,
+    ArtworkEmbeddingBatchSearch
 )
+from services.binary_index import binary_index
+from services.clustering import style_clusters
+from services.coalescing import SingleFlight
+from services.dedup import duplicate_index
+from services.embedder import decode_image, embedder, fetch_image
+from services.embedding_store import notify_embedding_delete, notify_embedding_upsert
+from services.flat_index import flat_index
+from services.pq_index import pq_index
+from services.serialization import trusted_model
+from services.snapshot import CatalogSnapshot, catalog_snapshot
 
 logger = logging.getLogger(__name__)
 
+# Identical concurrent reads of this table share one PostgREST request
+_reads = SingleFlight("artwork_embedding")
+
 
 class ArtworkEmbeddingCRUD:
     """CRUD operations for artwork_embedding table"""
     
     def __init__(self):
-        self.db = db_connection.client
         self.table_name = "artwork_embedding"
+        # In-memory indexes selectable through ArtworkEmbeddingSearch.mode
+        self.indexes = {
+            "pq": pq_index,
+            "binary": binary_index,
+            "cluster": style_clusters
+        }
+    
+    @property
+    def db(self):
+        """Supabase client, created on first query rather than when this module is imported"""
+        return db_connection.client
+    
+    @staticmethod
+    def _to_response(item: dict) -> ArtworkEmbeddingResponse:
+        """Build a response from a trusted row; pgvector may come back as a "[...]" string"""
+        if isinstance(item.get("vector"), str):
+            item = dict(item, vector=json.loads(item["vector"]))
+        return trusted_model(ArtworkEmbeddingResponse, item)
     
+    @_reads.invalidates
     async def create_embedding(self, embedding: ArtworkEmbeddingCreate) -> ArtworkEmbeddingResponse:
         """Create a new artwork embedding"""
         try:
@@ -42,12 +76,58 @@ class ArtworkEmbeddingCRUD:
                 raise Exception("Failed to create artwork embedding")
             
             logger.info(f"Created artwork embedding: {result.data[0]['id']}")
-            return ArtworkEmbeddingResponse(**result.data[0])
+            notify_embedding_upsert(result.data[0])
+            return self._to_response(result.data[0])
             
         except Exception as e:
             logger.error(f"Error creating artwork embedding: {e}")
             raise
     
+    async def embed_artwork_image(self, artwork_id: UUID, image_url: str) -> ArtworkEmbeddingResponse:
+        """Compute an artwork's embedding from its image and store it (creating or replacing)"""
+        result = (await self.embed_artwork_images([(artwork_id, image_url)]))[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+    
+    async def embed_artwork_images(self, artworks: Sequence[Tuple[UUID, str]]) -> List[Union[ArtworkEmbeddingResponse, Exception]]:
+        """
+        Embed many artworks' images and store each vector (creating or replacing).
+        
+        Images are downloaded and decoded concurrently, then embedded in a
+        single batch. Returns one entry per artwork, in order: its stored
+        embedding, or the exception that stopped it.
+        """
+        images = await asyncio.gather(
+            *(asyncio.to_thread(lambda url=url: decode_image(fetch_image(url))) for _, url in artworks),
+            return_exceptions=True,
+        )
+        results: List[Union[ArtworkEmbeddingResponse, Exception]] = list(images)
+        fetched = [i for i, image in enumerate(images) if not isinstance(image, BaseException)]
+        if fetched:
+            try:
+                vectors = await asyncio.to_thread(embedder.embed, [images[i] for i in fetched])
+            except Exception as e:
+                vectors = [e] * len(fetched)
+            for i, vector in zip(fetched, vectors):
+                results[i] = vector if isinstance(vector, Exception) else await self._store_image_embedding(artworks[i][0], vector)
+        for (artwork_id, _), result in zip(artworks, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error embedding image for artwork {artwork_id}: {result}")
+        logger.info(f"Embedded {len(fetched)} of {len(artworks)} artwork images with the {embedder.model_name} model")
+        return results
+    
+    async def _store_image_embedding(self, artwork_id: UUID, vector) -> Union[ArtworkEmbeddingResponse, Exception]:
+        try:
+            existing = await self.get_embedding_by_artwork_id(artwork_id)
+            if existing:
+                return await self.update_embedding(existing.id, ArtworkEmbeddingUpdate(vector=vector.tolist()))
+            return await self.create_embedding(ArtworkEmbeddingCreate(artwork_id=artwork_id, vector=vector.tolist()))
+        except Exception as e:
+            return e
+    
+    @_reads.coalesce
+    @catalog_snapshot.serves_stale(CatalogSnapshot.embedding, ArtworkEmbeddingResponse)
     async def get_embedding_by_id(self, embedding_id: UUID) -> Optional[ArtworkEmbeddingResponse]:
         """Get artwork embedding by ID"""
         try:
@@ -57,12 +137,14 @@ class ArtworkEmbeddingCRUD:
                 logger.warning(f"Artwork embedding not found: {embedding_id}")
                 return None
             
-            return ArtworkEmbeddingResponse(**result.data[0])
+            return self._to_response(result.data[0])
             
         except Exception as e:
             logger.error(f"Error getting artwork embedding {embedding_id}: {e}")
             raise
     
+    @_reads.coalesce
+    @catalog_snapshot.serves_stale(CatalogSnapshot.embedding_for_artwork, ArtworkEmbeddingResponse)
     async def get_embedding_by_artwork_id(self, artwork_id: UUID) -> Optional[ArtworkEmbeddingResponse]:
         """Get artwork embedding by artwork ID"""
         try:
@@ -73,18 +155,20 @@ class ArtworkEmbeddingCRUD:
                 return None
             
             # Return the first embedding (assuming one embedding per artwork)
-            return ArtworkEmbeddingResponse(**result.data[0])
+            return self._to_response(result.data[0])
             
         except Exception as e:
             logger.error(f"Error getting artwork embedding for artwork {artwork_id}: {e}")
             raise
     
+    @_reads.coalesce
+    @catalog_snapshot.serves_stale(CatalogSnapshot.embedding_page, ArtworkEmbeddingResponse)
     async def get_all_embeddings(self, limit: int = 10, offset: int = 0) -> List[ArtworkEmbeddingResponse]:
         """Get all artwork embeddings with pagination"""
         try:
             result = self.db.table(self.table_name).select("*").range(offset, offset + limit - 1).execute()
             
-            embeddings = [ArtworkEmbeddingResponse(**item) for item in result.data]
+            embeddings = [self._to_response(item) for item in result.data]
             logger.info(f"Retrieved {len(embeddings)} artwork embeddings")
             return embeddings
             
@@ -92,6 +176,7 @@ class ArtworkEmbeddingCRUD:
             logger.error(f"Error getting all artwork embeddings: {e}")
             raise
     
+    @_reads.invalidates
     async def update_embedding(self, embedding_id: UUID, embedding_update: ArtworkEmbeddingUpdate) -> Optional[ArtworkEmbeddingResponse]:
         """Update artwork embedding by ID"""
         try:
@@ -109,12 +194,14 @@ class ArtworkEmbeddingCRUD:
                 return None
             
             logger.info(f"Updated artwork embedding: {embedding_id}")
-            return ArtworkEmbeddingResponse(**result.data[0])
+            notify_embedding_upsert(result.data[0])
+            return self._to_response(result.data[0])
             
         except Exception as e:
             logger.error(f"Error updating artwork embedding {embedding_id}: {e}")
             raise
     
+    @_reads.invalidates
     async def delete_embedding(self, embedding_id: UUID) -> bool:
         """Delete artwork embedding by ID"""
         try:
@@ -125,12 +212,14 @@ class ArtworkEmbeddingCRUD:
                 return False
             
             logger.info(f"Deleted artwork embedding: {embedding_id}")
+            notify_embedding_delete(str(embedding_id))
             return True
             
         except Exception as e:
             logger.error(f"Error deleting artwork embedding {embedding_id}: {e}")
             raise
     
+    @_reads.invalidates
     async def delete_embedding_by_artwork_id(self, artwork_id: UUID) -> bool:
         """Delete artwork embedding by artwork ID"""
         try:
@@ -141,12 +230,16 @@ class ArtworkEmbeddingCRUD:
                 return False
             
             logger.info(f"Deleted artwork embedding for artwork: {artwork_id}")
+            for item in result.data:
+                notify_embedding_delete(str(item["id"]))
             return True
             
         except Exception as e:
             logger.error(f"Error deleting artwork embedding for artwork {artwork_id}: {e}")
             raise
     
+    @_reads.coalesce
+    @catalog_snapshot.serves_stale(CatalogSnapshot.search_embeddings)
     async def search_similar_embeddings(self, search_params: ArtworkEmbeddingSearch) -> List[dict]:
         """
         Search for similar artwork embeddings using vector similarity.
@@ -155,6 +248,25 @@ class ArtworkEmbeddingCRUD:
         The actual similarity calculation depends on your database configuration.
         """
         try:
+            if search_params.collapse_duplicates:
+                # Over-fetch so collapsing duplicate clusters still fills the requested limit
+                expanded = search_params.model_copy(
+                    update={"limit": min(search_params.limit * 2, 200), "collapse_duplicates": False}
+                )
+                results = duplicate_index.collapse(await self.search_similar_embeddings(expanded))
+                return results[:search_params.limit]
+            
+            if search_params.mode in self.indexes:
+                extra = {"n_probe": search_params.n_probe} if search_params.mode == "cluster" else {}
+                results = self.indexes[search_params.mode].search(
+                    search_params.query_vector,
+                    limit=search_params.limit,
+                    threshold=search_params.threshold,
+                    **extra
+                )
+                logger.info(f"Found {len(results)} similar embeddings via {search_params.mode} index")
+                return results
+            
             # Use RPC function if available, otherwise use direct query
             # First, try to use the match_artworks function if it exists
             try:
@@ -206,6 +318,29 @@ class ArtworkEmbeddingCRUD:
             logger.error(f"Error searching similar embeddings: {e}")
             raise
     
+    async def batch_search_similar_embeddings(self, search_params: ArtworkEmbeddingBatchSearch) -> List[List[dict]]:
+        """
+        Search neighbours for many query vectors at once.
+        
+        All queries are scored together against the in-memory embedding matrix
+        with blocked matrix-matrix products instead of one search per query.
+        The scoring runs in a worker thread so a large batch does not block
+        the event loop.
+        """
+        try:
+            results = await asyncio.to_thread(
+                flat_index.batch_search,
+                search_params.query_vectors,
+                limit=search_params.limit,
+                threshold=search_params.threshold
+            )
+            logger.info(f"Batch searched {len(results)} query vectors")
+            return results
+            
+        except Exception as e:
+            logger.error(f"Error batch searching similar embeddings: {e}")
+            raise
+    
     @staticmethod
     def _cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
         """Calculate cosine similarity between two vectors"""
@@ -221,6 +356,8 @@ class ArtworkEmbeddingCRUD:
         
         return dot_product / (magnitude1 * magnitude2)
     
+    @_reads.coalesce
+    @catalog_snapshot.serves_stale(CatalogSnapshot.count_embeddings)
     async def count_embeddings(self) -> int:
         """Get total count of artwork embeddings"""
         try:
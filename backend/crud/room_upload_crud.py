@@ -8,22 +8,33 @@ import logging
 from datetime import datetime
 
 from models.room_upload import (
+    ROOM_UPLOAD_COLUMNS,
     RoomUploadCreate,
     RoomUploadUpdate,
     RoomUploadResponse,
     RoomUploadSearch
 )
+from services.coalescing import SingleFlight
+from services.session_stats import session_stats
+from services.user_purge import PURGE_CHUNK_SIZE, delete_in_chunks
 
 logger = logging.getLogger(__name__)
 
+# Identical concurrent reads of this table share one PostgREST request
+_reads = SingleFlight("room_upload")
+
 
 class RoomUploadCRUD:
     """CRUD operations for room_upload table"""
     
     def __init__(self):
-        self.db = db_connection.client
         self.table_name = "room_upload"
     
+    @property
+    def db(self):
+        """Supabase client, created on first query rather than when this module is imported"""
+        return db_connection.client
+    
     @staticmethod
     def _convert_decimals_to_primitives(value: Any) -> Any:
         """Recursively convert Decimal values to float so payload is JSON serializable."""
@@ -39,6 +50,7 @@ class RoomUploadCRUD:
             return {k: RoomUploadCRUD._convert_decimals_to_primitives(v) for k, v in value.items()}
         return value
     
+    @_reads.invalidates
     async def create_room_upload(self, room_upload: RoomUploadCreate) -> RoomUploadResponse:
         """Create a new room upload"""
         try:
@@ -55,16 +67,18 @@ class RoomUploadCRUD:
                 raise Exception("Failed to create room upload")
             
             logger.info(f"Created room upload: {result.data[0]['id']} for user: {upload_data['user_id']}")
+            session_stats.note_room_type(upload_data["user_id"], result.data[0].get("room_type"))
             return RoomUploadResponse(**result.data[0])
             
         except Exception as e:
             logger.error(f"Error creating room upload: {e}")
             raise
     
+    @_reads.coalesce
     async def get_room_upload_by_id(self, upload_id: UUID) -> Optional[RoomUploadResponse]:
         """Get room upload by ID"""
         try:
-            result = self.db.table(self.table_name).select("*").eq("id", str(upload_id)).execute()
+            result = self.db.table(self.table_name).select(ROOM_UPLOAD_COLUMNS).eq("id", str(upload_id)).execute()
             
             if not result.data:
                 logger.warning(f"Room upload not found: {upload_id}")
@@ -76,12 +90,13 @@ class RoomUploadCRUD:
             logger.error(f"Error getting room upload {upload_id}: {e}")
             raise
     
+    @_reads.coalesce
     async def get_room_uploads_by_user_id(self, user_id: UUID, limit: int = 10, offset: int = 0) -> List[RoomUploadResponse]:
         """Get room uploads by user ID with pagination"""
         try:
             result = (
                 self.db.table(self.table_name)
-                .select("*")
+                .select(ROOM_UPLOAD_COLUMNS)
                 .eq("user_id", str(user_id))
                 .order("created_at", desc=True)
                 .range(offset, offset + limit - 1)
@@ -96,12 +111,13 @@ class RoomUploadCRUD:
             logger.error(f"Error getting room uploads for user {user_id}: {e}")
             raise
     
+    @_reads.coalesce
     async def get_all_room_uploads(self, limit: int = 10, offset: int = 0) -> List[RoomUploadResponse]:
         """Get all room uploads with pagination"""
         try:
             result = (
                 self.db.table(self.table_name)
-                .select("*")
+                .select(ROOM_UPLOAD_COLUMNS)
                 .order("created_at", desc=True)
                 .range(offset, offset + limit - 1)
                 .execute()
@@ -114,7 +130,24 @@ class RoomUploadCRUD:
         except Exception as e:
             logger.error(f"Error getting all room uploads: {e}")
             raise
-    
+
+    @_reads.coalesce
+    async def get_uploads_for_analysis(self, columns: List[str], after: Optional[str] = None, limit: int = 100, overwrite: bool = False) -> List[Dict[str, Any]]:
+        """Page (by id) through uploads with a photo where any of the analysis columns is empty (or all, with overwrite)"""
+        try:
+            query = self.db.table(self.table_name).select(", ".join(["id", "s3_url", *columns])).not_.is_("s3_url", "null")
+            if not overwrite:
+                query = query.or_(",".join(f"{column}.is.null" for column in columns))
+            if after:
+                query = query.gt("id", str(after))
+            result = query.order("id").limit(limit).execute()
+            return result.data or []
+
+        except Exception as e:
+            logger.error(f"Error listing room uploads missing {', '.join(columns)}: {e}")
+            raise
+
+    @_reads.invalidates
     async def update_room_upload(self, upload_id: UUID, upload_update: RoomUploadUpdate) -> Optional[RoomUploadResponse]:
         """Update room upload by ID"""
         try:
@@ -141,6 +174,33 @@ class RoomUploadCRUD:
             logger.error(f"Error updating room upload {upload_id}: {e}")
             raise
     
+    @_reads.invalidates
+    async def save_analysis(self, upload_id: UUID, fields: Dict[str, Any]) -> bool:
+        """Store results computed from the room photo (embedding, palette_json, lighting_json) in one update"""
+        try:
+            # Imported here so importing the CRUD layer doesn't load postgrest before the client exists
+            from postgrest.types import CountMethod, ReturnMethod
+
+            # The written embedding is not needed back: ask only for the number of rows updated
+            result = (
+                self.db.table(self.table_name)
+                .update(fields, count=CountMethod.exact, returning=ReturnMethod.minimal)
+                .eq("id", str(upload_id))
+                .execute()
+            )
+            
+            if not result.count:
+                logger.warning(f"Room upload not found for analysis: {upload_id}")
+                return False
+            
+            logger.info(f"Saved {', '.join(fields)} for room upload {upload_id}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error saving analysis for room upload {upload_id}: {e}")
+            raise
+    
+    @_reads.invalidates
     async def delete_room_upload(self, upload_id: UUID) -> bool:
         """Delete room upload by ID"""
         try:
@@ -157,12 +217,11 @@ class RoomUploadCRUD:
             logger.error(f"Error deleting room upload {upload_id}: {e}")
             raise
     
-    async def delete_room_uploads_by_user_id(self, user_id: UUID) -> int:
-        """Delete all room uploads for a user"""
+    @_reads.invalidates
+    async def delete_room_uploads_by_user_id(self, user_id: UUID, chunk_size: int = PURGE_CHUNK_SIZE) -> int:
+        """Delete all room uploads for a user, chunk_size rows per statement"""
         try:
-            result = self.db.table(self.table_name).delete().eq("user_id", str(user_id)).execute()
-            
-            deleted_count = len(result.data) if result.data else 0
+            deleted_count = sum(len(deleted) for deleted in delete_in_chunks(self.db, self.table_name, "user_id", user_id, chunk_size))
             logger.info(f"Deleted {deleted_count} room uploads for user: {user_id}")
             return deleted_count
             
@@ -170,10 +229,11 @@ class RoomUploadCRUD:
             logger.error(f"Error deleting room uploads for user {user_id}: {e}")
             raise
     
+    @_reads.coalesce
     async def search_room_uploads(self, search_params: RoomUploadSearch) -> List[RoomUploadResponse]:
         """Search room uploads with filters"""
         try:
-            query = self.db.table(self.table_name).select("*")
+            query = self.db.table(self.table_name).select(ROOM_UPLOAD_COLUMNS)
             
             # Apply filters
             if search_params.user_id:
@@ -210,12 +270,13 @@ class RoomUploadCRUD:
             logger.error(f"Error searching room uploads: {e}")
             raise
     
+    @_reads.coalesce
     async def get_room_uploads_by_type(self, room_type: str, limit: int = 10, offset: int = 0) -> List[RoomUploadResponse]:
         """Get room uploads by room type"""
         try:
             result = (
                 self.db.table(self.table_name)
-                .select("*")
+                .select(ROOM_UPLOAD_COLUMNS)
                 .eq("room_type", room_type)
                 .order("created_at", desc=True)
                 .range(offset, offset + limit - 1)
@@ -230,6 +291,7 @@ class RoomUploadCRUD:
             logger.error(f"Error getting room uploads by type: {e}")
             raise
     
+    @_reads.coalesce
     async def count_room_uploads(self, user_id: Optional[UUID] = None) -> int:
         """Get total count of room uploads"""
         try:
@@ -13,17 +13,27 @@ from models.session import (
     SessionResponse,
     SessionSearch
 )
+from services.coalescing import SingleFlight
+from services.session_events import SESSION_COLUMNS, has_listeners, notify_session_change
+from services.user_purge import PURGE_CHUNK_SIZE, delete_in_chunks
 
 logger = logging.getLogger(__name__)
 
+# Identical concurrent reads of this table share one PostgREST request
+_reads = SingleFlight("session")
+
 
 class SessionCRUD:
     """CRUD operations for session table"""
     
     def __init__(self):
-        self.db = db_connection.client
         self.table_name = "session"
     
+    @property
+    def db(self):
+        """Supabase client, created on first query rather than when this module is imported"""
+        return db_connection.client
+    
     @staticmethod
     def _convert_uuid_list(uuid_list: Optional[List[UUID]]) -> Optional[List[str]]:
         """Convert list of UUIDs to list of strings for database storage"""
@@ -31,6 +41,7 @@ class SessionCRUD:
             return None
         return [str(uuid) for uuid in uuid_list]
     
+    @_reads.invalidates
     async def create_session(self, session: SessionCreate) -> SessionResponse:
         """Create a new session"""
         try:
@@ -55,12 +66,14 @@ class SessionCRUD:
                 raise Exception("Failed to create session")
             
             logger.info(f"Created session: {result.data[0]['id']} for user: {session_data['user_id']}")
+            notify_session_change(None, result.data[0])
             return SessionResponse(**result.data[0])
             
         except Exception as e:
             logger.error(f"Error creating session: {e}")
             raise
     
+    @_reads.coalesce
     async def get_session_by_id(self, session_id: UUID) -> Optional[SessionResponse]:
         """Get session by ID"""
         try:
@@ -76,6 +89,7 @@ class SessionCRUD:
             logger.error(f"Error getting session {session_id}: {e}")
             raise
     
+    @_reads.coalesce
     async def get_sessions_by_user_id(self, user_id: UUID, limit: int = 10, offset: int = 0) -> List[SessionResponse]:
         """Get sessions by user ID with pagination"""
         try:
@@ -96,6 +110,7 @@ class SessionCRUD:
             logger.error(f"Error getting sessions for user {user_id}: {e}")
             raise
     
+    @_reads.coalesce
     async def get_all_sessions(self, limit: int = 10, offset: int = 0) -> List[SessionResponse]:
         """Get all sessions with pagination"""
         try:
@@ -115,6 +130,7 @@ class SessionCRUD:
             logger.error(f"Error getting all sessions: {e}")
             raise
     
+    @_reads.invalidates
     async def update_session(self, session_id: UUID, session_update: SessionUpdate) -> Optional[SessionResponse]:
         """Update session by ID"""
         try:
@@ -133,12 +149,19 @@ class SessionCRUD:
             if "chosen_id" in update_data and update_data["chosen_id"] is not None:
                 update_data["chosen_id"] = str(update_data["chosen_id"])
             
+            # Session listeners swap the row's old contribution for the new one
+            previous = None
+            if has_listeners() and update_data.keys() & {"topk_ids", "chosen_id"}:
+                previous = self.db.table(self.table_name).select(SESSION_COLUMNS).eq("id", str(session_id)).execute().data
+            
             result = self.db.table(self.table_name).update(update_data).eq("id", str(session_id)).execute()
             
             if not result.data:
                 logger.warning(f"Session not found for update: {session_id}")
                 return None
             
+            if previous:
+                notify_session_change(previous[0], result.data[0])
             logger.info(f"Updated session: {session_id}")
             return SessionResponse(**result.data[0])
             
@@ -146,6 +169,7 @@ class SessionCRUD:
             logger.error(f"Error updating session {session_id}: {e}")
             raise
     
+    @_reads.invalidates
     async def delete_session(self, session_id: UUID) -> bool:
         """Delete session by ID"""
         try:
@@ -155,6 +179,7 @@ class SessionCRUD:
                 logger.warning(f"Session not found for deletion: {session_id}")
                 return False
             
+            notify_session_change(result.data[0], None)
             logger.info(f"Deleted session: {session_id}")
             return True
             
@@ -162,12 +187,15 @@ class SessionCRUD:
             logger.error(f"Error deleting session {session_id}: {e}")
             raise
     
-    async def delete_sessions_by_user_id(self, user_id: UUID) -> int:
-        """Delete all sessions for a user"""
+    @_reads.invalidates
+    async def delete_sessions_by_user_id(self, user_id: UUID, chunk_size: int = PURGE_CHUNK_SIZE) -> int:
+        """Delete all sessions for a user, chunk_size rows per statement"""
         try:
-            result = self.db.table(self.table_name).delete().eq("user_id", str(user_id)).execute()
-            
-            deleted_count = len(result.data) if result.data else 0
+            deleted_count = 0
+            for deleted in delete_in_chunks(self.db, self.table_name, "user_id", user_id, chunk_size):
+                for row in deleted:
+                    notify_session_change(row, None)
+                deleted_count += len(deleted)
             logger.info(f"Deleted {deleted_count} sessions for user: {user_id}")
             return deleted_count
             
@@ -175,6 +203,7 @@ class SessionCRUD:
             logger.error(f"Error deleting sessions for user {user_id}: {e}")
             raise
     
+    @_reads.coalesce
     async def search_sessions(self, search_params: SessionSearch) -> List[SessionResponse]:
         """Search sessions with filters"""
         try:
@@ -218,6 +247,7 @@ class SessionCRUD:
             logger.error(f"Error searching sessions: {e}")
             raise
     
+    @_reads.coalesce
     async def get_sessions_with_chosen_artwork(self, user_id: Optional[UUID] = None, limit: int = 10, offset: int = 0) -> List[SessionResponse]:
         """Get sessions where user has chosen an artwork"""
         try:
@@ -241,6 +271,7 @@ class SessionCRUD:
             logger.error(f"Error getting sessions with chosen artwork: {e}")
             raise
     
+    @_reads.coalesce
     async def count_sessions(self, user_id: Optional[UUID] = None) -> int:
         """Get total count of sessions"""
         try:
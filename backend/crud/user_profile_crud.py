@@ -13,17 +13,25 @@ from models.user_profile import (
     UserProfileResponse,
     UserProfileSearch
 )
+from services.coalescing import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+# Identical concurrent reads of this table share one PostgREST request
+_reads = SingleFlight("user_profile")
+
 
 class UserProfileCRUD:
     """CRUD operations for user_profile table"""
     
     def __init__(self):
-        self.db = db_connection.client
         self.table_name = "user_profile"
     
+    @property
+    def db(self):
+        """Supabase client, created on first query rather than when this module is imported"""
+        return db_connection.client
+    
     @staticmethod
     def _convert_decimals_to_primitives(value: Any) -> Any:
         """Recursively convert Decimal values to float so payload is JSON serializable."""
@@ -39,6 +47,7 @@ class UserProfileCRUD:
             return {k: UserProfileCRUD._convert_decimals_to_primitives(v) for k, v in value.items()}
         return value
     
+    @_reads.invalidates
     async def create_user_profile(self, profile: UserProfileCreate) -> UserProfileResponse:
         """Create a new user profile"""
         try:
@@ -61,6 +70,7 @@ class UserProfileCRUD:
             logger.error(f"Error creating user profile: {e}")
             raise
     
+    @_reads.coalesce
     async def get_user_profile_by_id(self, profile_id: UUID) -> Optional[UserProfileResponse]:
         """Get user profile by ID"""
         try:
@@ -76,6 +86,7 @@ class UserProfileCRUD:
             logger.error(f"Error getting user profile {profile_id}: {e}")
             raise
     
+    @_reads.coalesce
     async def get_user_profile_by_user_id(self, user_id: UUID) -> Optional[UserProfileResponse]:
         """Get user profile by user ID"""
         try:
@@ -92,6 +103,7 @@ class UserProfileCRUD:
             logger.error(f"Error getting user profile for user {user_id}: {e}")
             raise
     
+    @_reads.coalesce
     async def get_all_user_profiles(self, limit: int = 10, offset: int = 0) -> List[UserProfileResponse]:
         """Get all user profiles with pagination"""
         try:
@@ -105,6 +117,7 @@ class UserProfileCRUD:
             logger.error(f"Error getting all user profiles: {e}")
             raise
     
+    @_reads.invalidates
     async def update_user_profile(self, profile_id: UUID, profile_update: UserProfileUpdate) -> Optional[UserProfileResponse]:
         """Update user profile by ID"""
         try:
@@ -134,6 +147,7 @@ class UserProfileCRUD:
             logger.error(f"Error updating user profile {profile_id}: {e}")
             raise
     
+    @_reads.invalidates
     async def update_user_profile_by_user_id(self, user_id: UUID, profile_update: UserProfileUpdate) -> Optional[UserProfileResponse]:
         """Update user profile by user ID"""
         try:
@@ -163,6 +177,7 @@ class UserProfileCRUD:
             logger.error(f"Error updating user profile for user {user_id}: {e}")
             raise
     
+    @_reads.invalidates
     async def upsert_user_profile(self, profile: UserProfileCreate) -> UserProfileResponse:
         """Upsert (insert or update) user profile by user_id"""
         try:
@@ -188,6 +203,7 @@ class UserProfileCRUD:
             logger.error(f"Error upserting user profile: {e}")
             raise
     
+    @_reads.invalidates
     async def delete_user_profile(self, profile_id: UUID) -> bool:
         """Delete user profile by ID"""
         try:
@@ -204,6 +220,7 @@ class UserProfileCRUD:
             logger.error(f"Error deleting user profile {profile_id}: {e}")
             raise
     
+    @_reads.invalidates
     async def delete_user_profile_by_user_id(self, user_id: UUID) -> bool:
         """Delete user profile by user ID"""
         try:
@@ -220,6 +237,7 @@ class UserProfileCRUD:
             logger.error(f"Error deleting user profile for user {user_id}: {e}")
             raise
     
+    @_reads.coalesce
     async def search_user_profiles(self, search_params: UserProfileSearch) -> List[UserProfileResponse]:
         """Search user profiles with filters"""
         try:
@@ -254,6 +272,7 @@ class UserProfileCRUD:
             logger.error(f"Error searching user profiles: {e}")
             raise
     
+    @_reads.coalesce
     async def get_user_profiles_by_style(self, style_tags: List[str]) -> List[UserProfileResponse]:
         """Get user profiles by preferred styles"""
         try:
@@ -267,6 +286,7 @@ class UserProfileCRUD:
             logger.error(f"Error getting user profiles by style: {e}")
             raise
     
+    @_reads.coalesce
     async def count_user_profiles(self) -> int:
         """Get total count of user profiles"""
         try:
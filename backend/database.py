@@ -4,10 +4,14 @@ Database connection and configuration for ArtDecorAI
 import os
 from pathlib import Path
 from dotenv import load_dotenv
-from supabase import create_client, Client
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 import logging
 
+from services.resilience import DB_READ_TIMEOUT, DB_WRITE_TIMEOUT, ResilientClient, db_executor
+
+if TYPE_CHECKING:
+    from supabase import Client
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -42,18 +46,23 @@ class DatabaseConnection:
         self.supabase_key = (raw_key or "").strip().strip('"').strip("'")
         if self.supabase_url.endswith("/"):
             self.supabase_url = self.supabase_url[:-1]
-        self._client: Optional[Client] = None
+        self._client: Optional[ResilientClient] = None
         
         # Log which key type is being used (without exposing the full key)
         key_type = "SERVICE_ROLE" if os.getenv("SUPABASE_SERVICE_ROLE_KEY") else "ANON"
         logger.info(f"Using Supabase {key_type} key (key ends with: ...{self.supabase_key[-10:]})")
     
     @property
-    def client(self) -> Client:
-        """Get Supabase client instance"""
+    def client(self) -> "Client":
+        """Get Supabase client instance (table and RPC calls get timeouts, retries and a circuit breaker)"""
         if self._client is None:
             try:
-                self._client = create_client(self.supabase_url, self.supabase_key)
+                # Imported on first use: supabase (auth, storage and realtime clients) is the slowest import at boot
+                from supabase import ClientOptions, create_client
+
+                # The socket timeout only backstops the per-operation timeouts in services.resilience
+                options = ClientOptions(postgrest_client_timeout=max(DB_READ_TIMEOUT, DB_WRITE_TIMEOUT) + 5)
+                self._client = ResilientClient(create_client(self.supabase_url, self.supabase_key, options=options), db_executor)
                 logger.info("Supabase client initialized successfully")
             except Exception as e:
                 logger.error(f"Failed to initialize Supabase client: {e}")
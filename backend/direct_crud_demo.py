@@ -8,6 +8,8 @@ from datetime import datetime
 from uuid import uuid4
 from typing import List, Optional, Dict, Any
 
+from services.catalog_index import CatalogIndex
+
 # Simple Artwork model
 class Artwork:
     def __init__(self, title: str, brand: str = None, price: Decimal = None, 
@@ -47,6 +49,13 @@ class ArtworkDatabase:
     def __init__(self):
         self.artworks: List[Artwork] = []
         self._id_counter = 1
+        # Price (sorted, bisect), style-tag and brand indexes for the search_by_* methods
+        self.index = CatalogIndex(
+            key_of=lambda a: a.id,
+            price_of=lambda a: a.price,
+            tags_of=lambda a: a.style_tags,
+            brand_of=lambda a: a.brand,
+        )
     
     def create(self, title: str, brand: str = None, price: Decimal = None, 
                style_tags: List[str] = None, dominant_palette: Dict = None, 
@@ -54,14 +63,12 @@ class ArtworkDatabase:
         """Create a new artwork"""
         artwork = Artwork(title, brand, price, style_tags, dominant_palette, image_url)
         self.artworks.append(artwork)
+        self.index.add(artwork)
         return artwork
     
     def get_by_id(self, artwork_id: str) -> Optional[Artwork]:
         """Get artwork by ID"""
-        for artwork in self.artworks:
-            if artwork.id == artwork_id:
-                return artwork
-        return None
+        return self.index.get(artwork_id)
     
     def get_all(self, limit: int = 10, offset: int = 0) -> List[Artwork]:
         """Get all artworks with pagination"""
@@ -72,6 +79,8 @@ class ArtworkDatabase:
         artwork = self.get_by_id(artwork_id)
         if artwork:
             artwork.update(**kwargs)
+            # Re-index the changed fields (Artwork.update mutates in place)
+            self.index.add(artwork)
             return artwork
         return None
     
@@ -80,32 +89,21 @@ class ArtworkDatabase:
         for i, artwork in enumerate(self.artworks):
             if artwork.id == artwork_id:
                 del self.artworks[i]
+                self.index.remove(artwork_id)
                 return True
         return False
     
     def search_by_style(self, style_tags: List[str]) -> List[Artwork]:
         """Search artworks by style tags"""
-        results = []
-        for artwork in self.artworks:
-            if any(tag in artwork.style_tags for tag in style_tags):
-                results.append(artwork)
-        return results
+        return self.index.search(style_tags=style_tags)
     
     def search_by_price_range(self, min_price: Decimal, max_price: Decimal) -> List[Artwork]:
         """Search artworks by price range"""
-        results = []
-        for artwork in self.artworks:
-            if artwork.price and min_price <= artwork.price <= max_price:
-                results.append(artwork)
-        return results
+        return self.index.price_range(min_price, max_price)
     
     def search_by_brand(self, brand: str) -> List[Artwork]:
         """Search artworks by brand"""
-        results = []
-        for artwork in self.artworks:
-            if artwork.brand and brand.lower() in artwork.brand.lower():
-                results.append(artwork)
-        return results
+        return self.index.search(brand=brand, brand_contains=True)
     
     def count(self) -> int:
         """Get total count of artworks"""
@@ -1,13 +1,18 @@
 """
 FastAPI main application for ArtDecorAI backend
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.exception_handlers import http_exception_handler
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import logging
-import uvicorn
+import math
 from datetime import datetime
 
+from services import request_context
+from services.admission import AdmissionMiddleware, admission
+from services.compression import CompressionMiddleware
+
 # Try to import database connection, but don't fail if it's not available
 try:
     from database import db_connection
@@ -16,6 +21,11 @@ try:
     from api.user_profile_api import router as user_profile_router
     from api.room_upload_api import router as room_upload_router
     from api.session_api import router as session_router
+    from api.job_api import router as job_router
+    from services.resilience import DatabaseUnavailableError, db_executor
+    from services.snapshot import catalog_snapshot
+    from services.jobs import job_workers
+    from services.warmup import warmup
     DATABASE_AVAILABLE = True
 except ImportError as e:
     print(f"Warning: Database modules not available: {e}")
@@ -26,6 +36,11 @@ except ImportError as e:
     user_profile_router = None
     room_upload_router = None
     session_router = None
+    job_router = None
+    db_executor = None
+    catalog_snapshot = None
+    job_workers = None
+    warmup = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -40,6 +55,9 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
+# Token-bucket rate limits (global, per client, per expensive route class); inside CORS so 429s carry CORS headers
+app.add_middleware(AdmissionMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -49,6 +67,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large JSON responses (gzip, or zstd/brotli when installed)
+app.add_middleware(CompressionMiddleware)
+
+@app.middleware("http")
+async def data_age_headers(request: Request, call_next):
+    """Flag responses built from a snapshot or stale cache with their data age"""
+    metadata = request_context.begin()
+    response = await call_next(request)
+    if "data_age" in metadata:
+        age = str(int(metadata["data_age"]))
+        response.headers["X-Data-Source"] = metadata["data_source"]
+        response.headers["X-Data-Age"] = age
+        response.headers["Age"] = age
+    return response
+
 # Include routers only if available
 if DATABASE_AVAILABLE and artwork_router:
     app.include_router(artwork_router)
@@ -80,20 +113,58 @@ if DATABASE_AVAILABLE and session_router:
 else:
     logger.warning("Session API router not available - using standalone mode")
 
+if DATABASE_AVAILABLE and job_router:
+    app.include_router(job_router)
+    logger.info("Job API router included")
+else:
+    logger.warning("Job API router not available - using standalone mode")
+
+def _database_unavailable_cause(exc: BaseException):
+    """Find a DatabaseUnavailableError behind an exception (routes wrap errors in HTTPException)"""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        if isinstance(exc, DatabaseUnavailableError):
+            return exc
+        seen.add(id(exc))
+        exc = exc.__cause__ or exc.__context__
+    return None
+
+
+@app.exception_handler(HTTPException)
+async def database_unavailable_handler(request: Request, exc: HTTPException):
+    """Turn 500s caused by an unhealthy database into 503 with Retry-After"""
+    cause = _database_unavailable_cause(exc) if DATABASE_AVAILABLE and exc.status_code == 500 else None
+    if cause is None:
+        return await http_exception_handler(request, exc)
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(cause)},
+        headers={"Retry-After": str(max(1, math.ceil(cause.retry_after)))},
+    )
+
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database connection on startup"""
+    """Start the warmup (database connection, indexes, hot caches); /ready fails until it finishes"""
     if DATABASE_AVAILABLE and db_connection:
-        try:
-            if db_connection.test_connection():
-                logger.info("Database connection established successfully")
-            else:
-                logger.warning("Database connection failed - running in standalone mode")
-        except Exception as e:
-            logger.warning(f"Database connection error: {e} - running in standalone mode")
+        warmup.start()
+        catalog_snapshot.start_background_refresh()
+        job_workers.start()
     else:
         logger.info("Running in standalone mode without database")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the job workers and the embedder's worker processes, and persist the session aggregates"""
+    if DATABASE_AVAILABLE:
+        job_workers.stop()
+        from services.embedder import embedder
+        embedder.shutdown()
+        from services.coselection import coselection_graph
+        from services.session_stats import session_stats
+        for aggregate in (session_stats, coselection_graph):
+            if aggregate.is_ready:
+                aggregate.save()
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -114,6 +185,11 @@ async def health_check():
                 "status": "healthy" if db_status else "degraded",
                 "database": "connected" if db_status else "disconnected",
                 "mode": "standalone" if not db_status else "database",
+                "resilience": db_executor.stats() if db_executor else None,
+                "snapshot_age_seconds": round(catalog_snapshot.age) if catalog_snapshot.is_ready else None,
+                "jobs": job_workers.stats(),
+                "admission": admission.stats(),
+                "warmup": {"ready": warmup.is_ready, "ms": warmup.report()["ms"]},
                 "timestamp": datetime.now().isoformat()
             }
         else:
@@ -133,6 +209,16 @@ async def health_check():
             "timestamp": datetime.now().isoformat()
         }
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 503 until the startup warmup has finished, with per-component timings"""
+    if not DATABASE_AVAILABLE:
+        return {"ready": True, "mode": "standalone"}
+    report = warmup.report()
+    if not report["ready"]:
+        return JSONResponse(status_code=503, content=report, headers={"Retry-After": "1"})
+    return report
+
 # Basic artwork endpoints for standalone mode
 if not DATABASE_AVAILABLE:
     # In-memory storage for demonstration
@@ -236,6 +322,8 @@ async def global_exception_handler(request, exc):
     )
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
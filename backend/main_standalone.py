@@ -13,6 +13,9 @@ from datetime import datetime
 from uuid import uuid4
 import json
 
+from services.catalog_index import CatalogIndex
+from services.text_index import TextIndex
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -84,6 +87,11 @@ artworks_db = [
     }
 ]
 
+# Price (sorted, bisect), style-tag and brand indexes over artworks_db, kept in sync by the CRUD routes
+artwork_index = CatalogIndex(artworks_db)
+# BM25 text index over title, brand and style tags
+artwork_text_index = TextIndex(artworks_db)
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -124,6 +132,8 @@ async def create_artwork(artwork_data: dict):
         }
         
         artworks_db.append(new_artwork)
+        artwork_index.add(new_artwork)
+        artwork_text_index.add(new_artwork)
         logger.info(f"Created artwork: {new_artwork['id']}")
         return new_artwork
     except Exception as e:
@@ -134,7 +144,7 @@ async def create_artwork(artwork_data: dict):
 async def get_artwork(artwork_id: str):
     """Get artwork by ID"""
     try:
-        artwork = next((a for a in artworks_db if a["id"] == artwork_id), None)
+        artwork = artwork_index.get(artwork_id)
         if not artwork:
             raise HTTPException(status_code=404, detail="Artwork not found")
         return artwork
@@ -160,18 +170,18 @@ async def get_artworks(limit: int = 10, offset: int = 0):
 async def update_artwork(artwork_id: str, artwork_data: dict):
     """Update artwork by ID"""
     try:
-        artwork_index = next((i for i, a in enumerate(artworks_db) if a["id"] == artwork_id), None)
-        if artwork_index is None:
+        if artwork_id not in artwork_index:
             raise HTTPException(status_code=404, detail="Artwork not found")
         
         # Update only provided fields
         update_data = {k: v for k, v in artwork_data.items() if v is not None}
         update_data["updated_at"] = datetime.now().isoformat()
         
-        artworks_db[artwork_index].update(update_data)
+        updated_artwork = artwork_index.update(artwork_id, update_data)
+        artwork_text_index.add(updated_artwork)
         
         logger.info(f"Updated artwork: {artwork_id}")
-        return artworks_db[artwork_index]
+        return updated_artwork
     except HTTPException:
         raise
     except Exception as e:
@@ -182,11 +192,12 @@ async def update_artwork(artwork_id: str, artwork_data: dict):
 async def delete_artwork(artwork_id: str):
     """Delete artwork by ID"""
     try:
-        artwork_index = next((i for i, a in enumerate(artworks_db) if a["id"] == artwork_id), None)
-        if artwork_index is None:
+        deleted_artwork = artwork_index.remove(artwork_id)
+        if deleted_artwork is None:
             raise HTTPException(status_code=404, detail="Artwork not found")
         
-        deleted_artwork = artworks_db.pop(artwork_index)
+        artworks_db.remove(deleted_artwork)
+        artwork_text_index.remove(artwork_id)
         logger.info(f"Deleted artwork: {artwork_id}")
         return {"message": "Artwork deleted successfully", "deleted_artwork": deleted_artwork}
     except HTTPException:
@@ -199,30 +210,18 @@ async def delete_artwork(artwork_id: str):
 async def search_artworks(search_params: dict):
     """Search artworks with filters"""
     try:
-        filtered_artworks = artworks_db.copy()
-        
-        # Apply filters
-        if search_params.get("style_tags"):
-            style_tags = search_params["style_tags"]
-            if isinstance(style_tags, str):
-                style_tags = [style_tags]
-            filtered_artworks = [a for a in filtered_artworks 
-                               if any(tag in a.get("style_tags", []) for tag in style_tags)]
-        
-        if search_params.get("min_price"):
-            min_price = float(search_params["min_price"])
-            filtered_artworks = [a for a in filtered_artworks 
-                               if a.get("price") and a["price"] >= min_price]
-        
-        if search_params.get("max_price"):
-            max_price = float(search_params["max_price"])
-            filtered_artworks = [a for a in filtered_artworks 
-                               if a.get("price") and a["price"] <= max_price]
+        style_tags = search_params.get("style_tags")
+        if isinstance(style_tags, str):
+            style_tags = [style_tags]
         
-        if search_params.get("brand"):
-            brand = search_params["brand"].lower()
-            filtered_artworks = [a for a in filtered_artworks 
-                               if a.get("brand") and brand in a["brand"].lower()]
+        # Intersect the index candidates instead of scanning every artwork
+        filtered_artworks = artwork_index.search(
+            style_tags=style_tags,
+            brand=search_params.get("brand"),
+            min_price=float(search_params["min_price"]) if search_params.get("min_price") else None,
+            max_price=float(search_params["max_price"]) if search_params.get("max_price") else None,
+            brand_contains=True,
+        )
         
         # Apply pagination
         limit = search_params.get("limit", 10)
@@ -239,8 +238,7 @@ async def search_artworks(search_params: dict):
 async def get_artworks_by_style(style_tags: List[str]):
     """Get artworks by style tags"""
     try:
-        filtered_artworks = [a for a in artworks_db 
-                           if any(tag in a.get("style_tags", []) for tag in style_tags)]
+        filtered_artworks = artwork_index.search(style_tags=style_tags)
         return filtered_artworks
     except Exception as e:
         logger.error(f"Error getting artworks by style: {e}")
@@ -250,8 +248,7 @@ async def get_artworks_by_style(style_tags: List[str]):
 async def get_artworks_by_price_range(min_price: float, max_price: float):
     """Get artworks within price range"""
     try:
-        filtered_artworks = [a for a in artworks_db 
-                           if a.get("price") and min_price <= a["price"] <= max_price]
+        filtered_artworks = artwork_index.price_range(min_price, max_price)
         return filtered_artworks
     except Exception as e:
         logger.error(f"Error getting artworks by price range: {e}")
@@ -261,13 +258,22 @@ async def get_artworks_by_price_range(min_price: float, max_price: float):
 async def get_artworks_by_brand(brand: str):
     """Get artworks by brand"""
     try:
-        filtered_artworks = [a for a in artworks_db 
-                           if a.get("brand") and brand.lower() in a["brand"].lower()]
+        filtered_artworks = artwork_index.search(brand=brand, brand_contains=True)
         return filtered_artworks
     except Exception as e:
         logger.error(f"Error getting artworks by brand: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/artworks/search/text")
+async def search_artworks_text(q: str, limit: int = 10, offset: int = 0):
+    """Full-text search over title, brand and style tags, best match first"""
+    try:
+        matches = artwork_text_index.search(q, limit, offset)
+        return [{**artwork, "score": score} for artwork, score in matches]
+    except Exception as e:
+        logger.error(f"Error searching artworks by text: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/artworks/stats/count")
 async def get_artwork_count():
     """Get total count of artworks"""
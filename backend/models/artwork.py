@@ -7,6 +7,9 @@ from datetime import datetime
 from decimal import Decimal
 import uuid
 
+# Columns read from the artwork table: everything the response models use, without the search_vector tsvector
+ARTWORK_COLUMNS = "id, title, brand, price, style_tags, dominant_palette, image_url, created_at, updated_at"
+
 class ArtworkBase(BaseModel):
     """Base artwork model with common fields"""
     title: str = Field(..., min_length=1, max_length=255, description="Artwork title")
@@ -38,6 +41,28 @@ class ArtworkResponse(ArtworkBase):
     class Config:
         from_attributes = True
 
+class ArtworkTextMatch(ArtworkResponse):
+    """Model for an artwork found by text search"""
+    score: float = Field(..., description="Text relevance (higher is better)")
+
+class SimilarArtwork(BaseModel):
+    """Model for a precomputed similar-artwork entry"""
+    artwork_id: uuid.UUID
+    similarity: float = Field(..., description="Cosine similarity of the artwork embeddings")
+
+class CoSelectedArtwork(BaseModel):
+    """Model for an artwork chosen in sessions that showed another one"""
+    artwork_id: uuid.UUID
+    score: float = Field(..., description="Co-selection count damped by both artworks' popularity")
+    count: int = Field(..., description="Sessions that showed the artwork and ended on this one")
+    confidence: float = Field(..., description="Share of the artwork's sessions that ended on this one")
+
+class StyleCluster(BaseModel):
+    """Model for a style cluster summary"""
+    cluster_id: int
+    size: int = Field(..., description="Number of artworks in the cluster")
+    sample_artwork_ids: List[uuid.UUID] = Field(default=[], description="Artworks closest to the cluster centroid")
+
 class ArtworkSearch(BaseModel):
     """Model for artwork search parameters"""
     style_tags: Optional[List[str]] = None
@@ -1,7 +1,7 @@
 """
 Artwork embedding model and data structures for ArtDecorAI
 """
-from typing import List, Optional
+from typing import List, Literal, Optional
 from pydantic import BaseModel, Field, field_validator
 from datetime import datetime
 import uuid
@@ -52,6 +52,12 @@ class ArtworkEmbeddingSearch(BaseModel):
     query_vector: List[float] = Field(..., description="Query vector for similarity search (384 dimensions)")
     limit: int = Field(default=10, ge=1, le=100, description="Maximum number of results")
     threshold: Optional[float] = Field(default=0.0, ge=0.0, le=1.0, description="Minimum similarity threshold")
+    mode: Literal["exact", "pq", "binary", "cluster"] = Field(
+        default="exact",
+        description="Search engine: exact (database), pq (compressed in-memory index), binary (Hamming pre-filter + cosine rescoring) or cluster (nearest style clusters only)"
+    )
+    n_probe: int = Field(default=4, ge=1, le=64, description="Style clusters scanned when mode is cluster")
+    collapse_duplicates: bool = Field(default=False, description="Return only the best-priced artwork of each near-duplicate cluster")
     
     @field_validator('query_vector')
     @classmethod
@@ -61,3 +67,19 @@ class ArtworkEmbeddingSearch(BaseModel):
             raise ValueError(f"Query vector must have exactly 384 dimensions, got {len(v)}")
         return v
 
+
+
+class ArtworkEmbeddingBatchSearch(BaseModel):
+    """Model for searching neighbours of many query vectors in one request"""
+    query_vectors: List[List[float]] = Field(..., min_length=1, max_length=1000, description="Query vectors (384 dimensions each)")
+    limit: int = Field(default=10, ge=1, le=100, description="Maximum number of results per query")
+    threshold: Optional[float] = Field(default=0.0, ge=0.0, le=1.0, description="Minimum similarity threshold")
+    
+    @field_validator('query_vectors')
+    @classmethod
+    def validate_vector_dimensions(cls, v: List[List[float]]) -> List[List[float]]:
+        """Validate that every query vector has exactly 384 dimensions"""
+        for i, vector in enumerate(v):
+            if len(vector) != 384:
+                raise ValueError(f"Query vector {i} must have exactly 384 dimensions, got {len(vector)}")
+        return v
@@ -0,0 +1,39 @@
+"""
+Background job model and data structures for ArtDecorAI
+"""
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field
+from datetime import datetime
+import uuid
+
+
+class JobResponse(BaseModel):
+    """Model for background job status"""
+    id: uuid.UUID
+    kind: str = Field(..., description="Job type, e.g. embed_artwork, analyze_room_upload, reindex")
+    status: str = Field(..., description="queued, running, succeeded, failed or cancelled")
+    priority: int = Field(..., description="Higher priorities run first")
+    progress: float = Field(..., ge=0.0, le=1.0, description="Fraction of the work done (0.0-1.0)")
+    message: Optional[str] = Field(None, description="Latest progress message")
+    attempts: int = Field(..., description="Attempts started so far")
+    max_attempts: int
+    payload: Dict[str, Any] = Field(default={}, description="Job input")
+    result: Optional[Any] = Field(None, description="Handler result once the job has succeeded")
+    error: Optional[str] = Field(None, description="Error from the most recent failed attempt")
+    created_at: datetime
+    updated_at: datetime
+    run_after: datetime = Field(..., description="Earliest time the job may (re)start")
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class ReindexRequest(BaseModel):
+    """Model for requesting an index rebuild"""
+    targets: Optional[List[str]] = Field(None, description="Indexes to rebuild (default: all)")
+
+
+class RoomAnalysisBackfillRequest(BaseModel):
+    """Model for requesting a room photo analysis backfill"""
+    steps: Optional[List[str]] = Field(None, description="embedding, palette and/or lighting (default: palette and lighting)")
+    overwrite: bool = Field(default=False, description="Recompute values that are already set")
+    limit: Optional[int] = Field(None, ge=1, description="Stop after this many uploads (default: all)")
@@ -6,6 +6,9 @@ from pydantic import BaseModel, Field
 from datetime import datetime
 import uuid
 
+# Columns read from the room_upload table: everything the response models use, without the embedding vector
+ROOM_UPLOAD_COLUMNS = "id, user_id, room_type, s3_url, palette_json, lighting_json, created_at"
+
 
 class PaletteData(BaseModel):
     """Palette JSON structure"""
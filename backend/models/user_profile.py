@@ -61,3 +61,7 @@ class UserProfileSearch(BaseModel):
     limit: int = Field(default=10, ge=1, le=100)
     offset: int = Field(default=0, ge=0)
 
+
+class UserPurgeRequest(BaseModel):
+    """Model for purging the data of many users at once"""
+    user_ids: List[uuid.UUID] = Field(..., min_length=1, max_length=100, description="Users whose data is deleted")
@@ -0,0 +1,237 @@
+"""
+In-process admission control with token buckets.
+
+One client looping on vector search can use up the PostgREST quota for
+everyone, so every request takes a token from up to four buckets before it
+reaches a route:
+
+* ``global``: all API traffic;
+* ``client``: one bucket per client address, or per API key for requests
+  carrying an ``X-API-Key`` listed in ``ADMISSION_API_KEYS``. Nothing else
+  authenticates request headers, so an unverified ``X-API-Key`` or
+  ``X-User-Id`` never earns a bucket of its own: a client could otherwise
+  send a fresh id with every request to get a full bucket each time, and
+  flood the LRU to reset other clients' limits;
+* ``<class> global`` and ``<class> client``: tighter budgets for expensive
+  route classes (``ROUTE_CLASSES``: vector and catalog search, exports).
+
+Buckets refill continuously at ``rate`` tokens per second up to ``burst``.
+A request that finds a bucket empty reserves its token anyway (the bucket
+goes negative) and waits until the token would have been refilled, as long
+as that is at most ``ADMISSION_MAX_WAIT`` seconds: short spikes queue
+instead of failing. Past that the request is shed with ``429 Too Many
+Requests`` and a ``Retry-After`` telling the client when a token will be
+free; a shed request takes nothing, so rejected retries don't dig the hole
+deeper. Each check touches a fixed number of buckets under one lock, so the
+cost per request is O(1). Idle client buckets are evicted LRU-first past
+``ADMISSION_MAX_CLIENTS``.
+
+Rates are per process: with several API processes behind a load balancer,
+divide the budgets by the number of processes. Health, readiness and docs
+routes are never limited.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Pattern, Tuple
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+ADMISSION = os.getenv("ADMISSION", "1").lower() not in ("0", "false", "no")
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "0.5"))
+ADMISSION_MAX_CLIENTS = int(os.getenv("ADMISSION_MAX_CLIENTS", "10000"))
+ADMISSION_TRUST_FORWARDED = os.getenv("ADMISSION_TRUST_FORWARDED", "0").lower() in ("1", "true", "yes")
+
+
+def _key_digest(api_key: str) -> str:
+    return hashlib.blake2b(api_key.encode(), digest_size=12).hexdigest()
+
+
+# API keys (comma-separated) whose requests are limited per key instead of per address; kept hashed
+ADMISSION_API_KEYS = {_key_digest(key.strip()) for key in os.getenv("ADMISSION_API_KEYS", "").split(",") if key.strip()}
+
+
+def _budget(name: str, rate: str, burst: str) -> Tuple[float, float]:
+    """(tokens per second, bucket size) from ADMISSION_<NAME>_RATE / _BURST"""
+    return float(os.getenv(f"ADMISSION_{name}_RATE", rate)), float(os.getenv(f"ADMISSION_{name}_BURST", burst))
+
+
+# Scope -> (rate, burst)
+BUDGETS: Dict[str, Tuple[float, float]] = {
+    "global": _budget("GLOBAL", "200", "400"),
+    "client": _budget("CLIENT", "20", "40"),
+    "search global": _budget("SEARCH_GLOBAL", "50", "100"),
+    "search client": _budget("SEARCH_CLIENT", "5", "10"),
+    "export global": _budget("EXPORT_GLOBAL", "2", "4"),
+    "export client": _budget("EXPORT_CLIENT", "0.2", "1"),
+}
+
+# Expensive route classes, matched on the path (first match wins)
+ROUTE_CLASSES: List[Tuple[str, Pattern[str]]] = [
+    ("search", re.compile(r"^/api/(artwork-embeddings|artworks)/search(/|$)")),
+    ("export", re.compile(r"/export(/|$)")),
+]
+
+EXEMPT_PATHS = ("/", "/health", "/ready", "/docs", "/redoc", "/openapi.json")
+
+
+class TokenBucket:
+    """Continuously refilled bucket; ``tokens`` may go negative while requests wait"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def wait_for(self, now: float, cost: float = 1.0) -> float:
+        """Seconds until ``cost`` tokens are available (0 if they are now)"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        deficit = cost - self.tokens
+        if deficit <= 0:
+            return 0.0
+        return deficit / self.rate if self.rate > 0 else math.inf
+
+    def take(self, cost: float = 1.0) -> None:
+        self.tokens -= cost
+
+
+class Rejected(Exception):
+    """No token within the allowed wait; ``scope`` is the bucket that ran dry"""
+
+    def __init__(self, scope: str, retry_after: float):
+        super().__init__(f"Rate limit exceeded ({scope})")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Global, per-client and per-route-class token buckets"""
+
+    def __init__(self, budgets: Dict[str, Tuple[float, float]] = BUDGETS, max_wait: float = ADMISSION_MAX_WAIT, max_clients: int = ADMISSION_MAX_CLIENTS):
+        self.budgets = budgets
+        self.max_wait = max_wait
+        self.max_clients = max_clients
+        self._global: Dict[str, TokenBucket] = {}
+        self._clients: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.queued = 0
+        self.rejected: Dict[str, int] = {}
+
+    def _global_bucket(self, scope: str, now: float) -> TokenBucket:
+        bucket = self._global.get(scope)
+        if bucket is None:
+            bucket = self._global[scope] = TokenBucket(*self.budgets[scope], now)
+        return bucket
+
+    def _client_bucket(self, scope: str, client: str, now: float) -> TokenBucket:
+        key = (scope, client)
+        bucket = self._clients.get(key)
+        if bucket is None:
+            bucket = self._clients[key] = TokenBucket(*self.budgets[scope], now)
+            if len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+        else:
+            self._clients.move_to_end(key)
+        return bucket
+
+    def reserve(self, client: str, route_class: Optional[str] = None) -> float:
+        """Take a token from every bucket that applies; returns how long to wait, or raises Rejected"""
+        now = time.monotonic()
+        with self._lock:
+            buckets = [("global", self._global_bucket("global", now)), ("client", self._client_bucket("client", client, now))]
+            if route_class is not None:
+                buckets.append((f"{route_class} global", self._global_bucket(f"{route_class} global", now)))
+                buckets.append((f"{route_class} client", self._client_bucket(f"{route_class} client", client, now)))
+            waits = [(bucket.wait_for(now), scope) for scope, bucket in buckets]
+            wait, scope = max(waits)
+            if wait > self.max_wait:
+                self.rejected[scope] = self.rejected.get(scope, 0) + 1
+                logger.debug(f"Shed request from {client}: {scope} bucket needs {wait:.2f}s")
+                raise Rejected(scope, wait)
+            for _, bucket in buckets:
+                bucket.take()
+            self.admitted += 1
+            if wait > 0:
+                self.queued += 1
+        return wait
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "rejected": dict(self.rejected),
+                "clients": len(self._clients),
+            }
+
+
+def route_class(path: str) -> Optional[str]:
+    for name, pattern in ROUTE_CLASSES:
+        if pattern.search(path):
+            return name
+    return None
+
+
+def client_key(scope: Scope, api_keys=ADMISSION_API_KEYS) -> str:
+    """A known API key (hashed, so keys aren't kept in memory), else the client address"""
+    headers = Headers(scope=scope)
+    api_key = headers.get("x-api-key")
+    if api_key and api_keys:
+        digest = _key_digest(api_key)
+        if digest in api_keys:
+            return "key:" + digest
+    if ADMISSION_TRUST_FORWARDED and headers.get("x-forwarded-for"):
+        return "ip:" + headers["x-forwarded-for"].split(",")[0].strip()
+    client = scope.get("client")
+    return f"ip:{client[0]}" if client else "ip:unknown"
+
+
+# Global admission controller instance
+admission = AdmissionController()
+
+
+class AdmissionMiddleware:
+    """ASGI middleware: queue briefly or shed with 429 before the request reaches a route"""
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController = admission):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not ADMISSION or scope["path"] in EXEMPT_PATHS or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        try:
+            wait = self.controller.reserve(client_key(scope), route_class(scope["path"]))
+        except Rejected as e:
+            retry_after = max(1, math.ceil(e.retry_after)) if math.isfinite(e.retry_after) else 60
+            body = json.dumps({"detail": str(e), "retry_after": retry_after}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(retry_after).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        if wait > 0:
+            await asyncio.sleep(wait)
+        await self.app(scope, receive, send)
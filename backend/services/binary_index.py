@@ -0,0 +1,205 @@
+"""
+Sign-bit binary index for broad candidate generation.
+
+Each 384-d embedding is reduced to its 384 sign bits (48 bytes, viewed as six
+uint64 words). A query is scored against every row with XOR + popcount, the
+closest ``rescore_candidates`` rows by Hamming distance are kept, and only
+those are rescored with exact cosine similarity against the stored
+normalized float32 vectors.
+
+Build from an NDJSON export or the artwork_embedding table:
+
+    python -m services.binary_index [--ndjson embeddings.ndjson]
+"""
+import argparse
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from services.embedding_store import (
+    EMBEDDING_DIM,
+    IndexedRows,
+    IndexNotReadyError,
+    load_from_source,
+    normalize_rows,
+    on_embedding_delete,
+    on_embedding_upsert,
+    parse_vector,
+    top_k,
+)
+from services.settings import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BINARY_PATH = Path(os.getenv("BINARY_INDEX_PATH", DATA_DIR / "binary_index.npz"))
+BINARY_RESCORE_CANDIDATES = int(os.getenv("BINARY_RESCORE_CANDIDATES", "2000"))
+
+CODE_BYTES = EMBEDDING_DIM // 8
+CODE_WORDS = CODE_BYTES // 8
+SCAN_BLOCK_ROWS = 1 << 18
+
+# Popcount per byte, used when NumPy has no native bitwise_count (NumPy < 2.0)
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def pack_sign_bits(vectors: np.ndarray) -> np.ndarray:
+    """Pack the sign of each dimension into uint64 words, shape (n, 6)"""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    packed = np.packbits(vectors > 0, axis=1)
+    return np.ascontiguousarray(packed).view(np.uint64)
+
+
+def hamming_distances(codes: np.ndarray, query_code: np.ndarray) -> np.ndarray:
+    """Hamming distance from ``query_code`` (6 words) to every row of ``codes``"""
+    distances = np.empty(codes.shape[0], dtype=np.uint16)
+    for start in range(0, codes.shape[0], SCAN_BLOCK_ROWS):
+        xor = np.bitwise_xor(codes[start:start + SCAN_BLOCK_ROWS], query_code)
+        if hasattr(np, "bitwise_count"):
+            counts = np.bitwise_count(xor).sum(axis=1, dtype=np.uint16)
+        else:
+            counts = _POPCOUNT_TABLE[xor.view(np.uint8)].sum(axis=1, dtype=np.uint16)
+        distances[start:start + xor.shape[0]] = counts
+    return distances
+
+
+class BinaryIndex:
+    """Hamming pre-filter over sign bits with exact cosine rescoring"""
+
+    def __init__(self, path: Path = DEFAULT_BINARY_PATH, rescore_candidates: int = BINARY_RESCORE_CANDIDATES):
+        self.path = Path(path)
+        self.rescore_candidates = rescore_candidates
+        self.rows = self._empty_rows()
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._built = False
+
+    @staticmethod
+    def _empty_rows() -> IndexedRows:
+        return IndexedRows({
+            "bits": ((CODE_WORDS,), np.uint64),
+            "vectors": ((EMBEDDING_DIM,), np.float32),
+        })
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def is_ready(self) -> bool:
+        self._ensure_loaded()
+        return self._built
+
+    def build(self, ids: List[str], artwork_ids: List[str], vectors: np.ndarray) -> None:
+        """Pack sign bits for all vectors"""
+        vectors = normalize_rows(vectors)
+        rows = self._empty_rows()
+        rows.reset(ids, artwork_ids, bits=pack_sign_bits(vectors), vectors=vectors)
+        with self._lock:
+            self.rows = rows
+            self._loaded = True
+            self._built = True
+        logger.info(f"Built binary index with {len(rows)} rows")
+
+    def upsert(self, embedding_id: str, artwork_id: str, vector: np.ndarray) -> None:
+        """Add or replace a single embedding"""
+        if not self.is_ready:
+            return
+        vector = normalize_rows(vector.reshape(1, -1))
+        with self._lock:
+            self.rows.upsert(embedding_id, artwork_id, bits=pack_sign_bits(vector)[0], vectors=vector[0])
+
+    def upsert_row(self, row: Dict[str, Any]) -> None:
+        """Embedding-store listener: index a freshly written artwork_embedding row"""
+        self.upsert(str(row["id"]), str(row["artwork_id"]), parse_vector(row["vector"]))
+
+    def remove(self, embedding_id: str) -> bool:
+        """Drop an embedding from the index"""
+        with self._lock:
+            return self.rows.remove(embedding_id) is not None
+
+    def search(self, query_vector, limit: int = 10, threshold: float = 0.0) -> List[Dict[str, Any]]:
+        """Hamming top-N candidates rescored with exact cosine similarity"""
+        if not self.is_ready:
+            raise IndexNotReadyError("Binary index is not available - build it with `python -m services.binary_index`")
+        query = normalize_rows(np.asarray(query_vector, dtype=np.float32).reshape(1, -1))[0]
+        query_code = pack_sign_bits(query)[0]
+        with self._lock:
+            distances = hamming_distances(self.rows.column("bits"), query_code)
+            pool = min(max(self.rescore_candidates, limit), distances.size)
+            if pool == 0:
+                return []
+            candidates = np.argpartition(distances, pool - 1)[:pool]
+            similarities = self.rows.column("vectors")[candidates] @ query
+            best = top_k(similarities, limit)
+            return [
+                {
+                    "id": self.rows.ids[candidates[i]],
+                    "artwork_id": self.rows.artwork_ids[candidates[i]],
+                    "similarity": float(similarities[i]),
+                }
+                for i in best
+                if similarities[i] >= threshold
+            ]
+
+    def save(self, path: Optional[Path] = None) -> Path:
+        """Persist bits, vectors and ids to a .npz file"""
+        path = Path(path or self.path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            np.savez(
+                path,
+                bits=self.rows.column("bits"),
+                vectors=self.rows.column("vectors"),
+                ids=np.asarray(self.rows.ids, dtype=str),
+                artwork_ids=np.asarray(self.rows.artwork_ids, dtype=str),
+            )
+        logger.info(f"Saved binary index to {path}")
+        return path
+
+    def load(self, path: Optional[Path] = None) -> None:
+        """Load a previously saved index"""
+        path = Path(path or self.path)
+        with np.load(path) as data:
+            rows = self._empty_rows()
+            rows.reset(list(data["ids"]), list(data["artwork_ids"]), bits=data["bits"], vectors=data["vectors"])
+        with self._lock:
+            self.rows = rows
+            self._loaded = True
+            self._built = True
+        logger.info(f"Loaded binary index with {len(rows)} rows from {path}")
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if self.path.exists():
+            try:
+                self.load()
+            except Exception as e:
+                logger.error(f"Failed to load binary index from {self.path}: {e}")
+
+
+# Global binary index instance
+binary_index = BinaryIndex()
+on_embedding_upsert(binary_index.upsert_row)
+on_embedding_delete(binary_index.remove)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the artwork embedding sign-bit index")
+    parser.add_argument("--ndjson", help="NDJSON export to build from (defaults to the artwork_embedding table)")
+    parser.add_argument("--out", default=str(DEFAULT_BINARY_PATH), help="Output .npz path")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    ids, artwork_ids, vectors = load_from_source(ndjson_path=args.ndjson)
+    index = BinaryIndex(path=Path(args.out))
+    index.build(ids, artwork_ids, vectors)
+    index.save()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+In-memory secondary indexes over artwork rows: price, style tags and brand.
+
+Catalog filters used to scan every row on every call. ``CatalogIndex`` keeps
+
+* a sorted list of ``(price, seq, id)`` entries, so a price range is two
+  ``bisect`` lookups (rows without a price are left out);
+* style tag -> ids and lowercased brand -> ids maps.
+
+``search`` evaluates each predicate to a candidate set, then walks the
+smallest one and checks the others by membership, so a query never looks at
+more rows than its most selective predicate matches (a price range is
+counted with bisect before anything is materialised). Results come back in
+insertion order, which is the order the list-based code returned.
+
+The index works over dict rows or plain objects: pass ``key_of``,
+``price_of``, ``tags_of`` and ``brand_of`` when the defaults (dict keys
+``id``, ``price``, ``style_tags``, ``brand``) don't fit. Rows may be
+mutated in place: the index remembers what each row was filed under, so
+calling ``add`` again after a change re-indexes it without moving it in the
+insertion order (``update`` does both for dict rows).
+
+Used by the catalog snapshot (services/snapshot.py), main_standalone.py and
+direct_crud_demo.py.
+"""
+import threading
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+
+def _dict_getter(field: str) -> Callable[[Any], Any]:
+    return lambda row: row.get(field)
+
+
+def as_price(value: Any) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class CatalogIndex:
+    """Sorted price index plus style-tag and brand indexes over rows keyed by id"""
+
+    def __init__(
+        self,
+        rows: Iterable[Any] = (),
+        key_of: Callable[[Any], Any] = _dict_getter("id"),
+        price_of: Callable[[Any], Any] = _dict_getter("price"),
+        tags_of: Callable[[Any], Optional[Iterable[str]]] = _dict_getter("style_tags"),
+        brand_of: Callable[[Any], Optional[str]] = _dict_getter("brand"),
+    ):
+        self.key_of = key_of
+        self.price_of = price_of
+        self.tags_of = tags_of
+        self.brand_of = brand_of
+        self._rows: Dict[str, Any] = {}
+        self._seq: Dict[str, int] = {}
+        self._next_seq = 0
+        # What each row was indexed under, so removal doesn't depend on the row's current fields
+        self._entries: Dict[str, Tuple[Optional[float], Tuple[str, ...], Optional[str]]] = {}
+        self._prices: List[Tuple[float, int, str]] = []
+        self._tags: Dict[str, Set[str]] = {}
+        self._brands: Dict[str, Set[str]] = {}
+        self._lock = threading.RLock()
+        for row in rows:
+            self.add(row)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, key: Any) -> bool:
+        return str(key) in self._rows
+
+    def get(self, key: Any) -> Optional[Any]:
+        return self._rows.get(str(key))
+
+    def add(self, row: Any) -> None:
+        """Index a row (re-indexing it if its id is already present, keeping its position)"""
+        key = str(self.key_of(row))
+        price = as_price(self.price_of(row))
+        tags = tuple(dict.fromkeys(self.tags_of(row) or ()))
+        brand = self.brand_of(row)
+        brand = brand.lower() if brand else None
+        with self._lock:
+            seq = self._seq.get(key)
+            if seq is not None:
+                self._unindex(key)
+            else:
+                seq = self._seq[key] = self._next_seq
+                self._next_seq += 1
+            self._rows[key] = row
+            self._entries[key] = (price, tags, brand)
+            if price is not None:
+                insort(self._prices, (price, seq, key))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            if brand is not None:
+                self._brands.setdefault(brand, set()).add(key)
+
+    def remove(self, key: Any) -> Optional[Any]:
+        """Drop a row from every index; returns it (None if it wasn't indexed)"""
+        key = str(key)
+        with self._lock:
+            if key not in self._rows:
+                return None
+            self._unindex(key)
+            del self._seq[key]
+            return self._rows.pop(key)
+
+    def update(self, key: Any, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Apply ``changes`` to a dict row in place and re-index it"""
+        with self._lock:
+            row = self._rows.get(str(key))
+            if row is None:
+                return None
+            row.update(changes)
+            self.add(row)
+            return row
+
+    def _unindex(self, key: str) -> None:
+        price, tags, brand = self._entries.pop(key)
+        if price is not None:
+            entry = (price, self._seq[key], key)
+            position = bisect_left(self._prices, entry)
+            del self._prices[position]
+        for tag in tags:
+            self._discard(self._tags, tag, key)
+        if brand is not None:
+            self._discard(self._brands, brand, key)
+
+    @staticmethod
+    def _discard(index: Dict[str, Set[str]], value: str, key: str) -> None:
+        keys = index.get(value)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del index[value]
+
+    # Lookups (ids)
+
+    def _price_bounds(self, min_price: Any, max_price: Any) -> Tuple[int, int]:
+        low = as_price(min_price)
+        high = as_price(max_price)
+        start = 0 if low is None else bisect_left(self._prices, (low, -1))
+        end = len(self._prices) if high is None else bisect_right(self._prices, (high, float("inf")))
+        return start, max(start, end)
+
+    def price_range_ids(self, min_price: Any = None, max_price: Any = None) -> List[str]:
+        """Ids with ``min_price <= price <= max_price``, cheapest first"""
+        with self._lock:
+            start, end = self._price_bounds(min_price, max_price)
+            return [key for _, _, key in self._prices[start:end]]
+
+    def tag_ids(self, style_tags: Iterable[str]) -> Set[str]:
+        """Ids having any of ``style_tags``"""
+        with self._lock:
+            matched: Set[str] = set()
+            for tag in style_tags:
+                matched |= self._tags.get(tag, set())
+            return matched
+
+    def brand_ids(self, brand: str, contains: bool = False) -> Set[str]:
+        """Ids of a brand (case-insensitive); ``contains`` matches substrings, one check per distinct brand"""
+        wanted = brand.lower()
+        with self._lock:
+            if not contains:
+                return set(self._brands.get(wanted, ()))
+            matched: Set[str] = set()
+            for name, keys in self._brands.items():
+                if wanted in name:
+                    matched |= keys
+            return matched
+
+    # Queries (rows, in insertion order)
+
+    def search(
+        self,
+        style_tags: Optional[Iterable[str]] = None,
+        brand: Optional[str] = None,
+        min_price: Any = None,
+        max_price: Any = None,
+        brand_contains: bool = False,
+    ) -> List[Any]:
+        """Rows matching every given predicate (any of the style tags, the brand, the price range)"""
+        with self._lock:
+            candidates: List[Set[str]] = []
+            if style_tags:
+                candidates.append(self.tag_ids(style_tags))
+            if brand:
+                candidates.append(self.brand_ids(brand, contains=brand_contains))
+            low, high = as_price(min_price), as_price(max_price)
+            priced = low is not None or high is not None
+            if priced:
+                start, end = self._price_bounds(low, high)
+            if priced and (not candidates or end - start < min(map(len, candidates))):
+                # The price range is the most selective predicate: walk it and probe the sets
+                keys = [key for _, _, key in self._prices[start:end] if all(key in others for others in candidates)]
+            elif candidates:
+                candidates.sort(key=len)
+                driver, others = candidates[0], candidates[1:]
+                keys = [key for key in driver if all(key in other for other in others)]
+                if priced:
+                    keys = [key for key in keys if self._in_price_range(key, low, high)]
+            else:
+                return list(self._rows.values())
+            keys.sort(key=self._seq.__getitem__)
+            return [self._rows[key] for key in keys]
+
+    def price_range(self, min_price: Any = None, max_price: Any = None) -> List[Any]:
+        return self.search(min_price=min_price, max_price=max_price)
+
+    def rows(self) -> List[Any]:
+        """Every row, in insertion order (re-indexing a row keeps its dict position)"""
+        with self._lock:
+            return list(self._rows.values())
+
+    def _in_price_range(self, key: str, low: Optional[float], high: Optional[float]) -> bool:
+        price = self._entries[key][0]
+        return price is not None and (low is None or price >= low) and (high is None or price <= high)
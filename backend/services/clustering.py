@@ -0,0 +1,273 @@
+"""
+Style clusters over artwork embeddings.
+
+Mini-batch k-means partitions the catalog into ``STYLE_CLUSTER_COUNT``
+aesthetic clusters. Each cluster keeps its own inverted list of member
+vectors, which serves two purposes:
+
+* browsing: ``GET /api/artworks/clusters`` lists clusters with the artworks
+  closest to each centroid;
+* coarse routing: ``mode="cluster"`` searches score the query against the
+  centroids first and only scan the members of the nearest ``n_probe``
+  clusters.
+
+New embeddings are assigned to their nearest centroid on write, nudging the
+centroid with a running mean and renormalising it so centroid scores stay
+cosines; a removed embedding's nudge is undone the same way. Rebalance
+periodically to re-fit centroids:
+
+    python -m services.clustering --rebalance
+"""
+import argparse
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from services.embedding_store import (
+    EMBEDDING_DIM,
+    IndexedRows,
+    IndexNotReadyError,
+    load_from_source,
+    normalize_rows,
+    on_embedding_delete,
+    on_embedding_upsert,
+    parse_vector,
+    top_k,
+)
+from services.kmeans import assign, minibatch_kmeans
+from services.settings import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CLUSTERS_PATH = Path(os.getenv("STYLE_CLUSTERS_PATH", DATA_DIR / "style_clusters.npz"))
+STYLE_CLUSTER_COUNT = int(os.getenv("STYLE_CLUSTER_COUNT", "64"))
+
+
+class StyleClusters:
+    """Centroids plus one inverted list of member vectors per cluster"""
+
+    def __init__(self, k: int = STYLE_CLUSTER_COUNT, path: Path = DEFAULT_CLUSTERS_PATH):
+        self.k = k
+        self.path = Path(path)
+        self.centroids: Optional[np.ndarray] = None
+        self.lists: List[IndexedRows] = []
+        self._counts = np.zeros(0, dtype=np.float64)
+        self._cluster_of: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    @staticmethod
+    def _empty_list() -> IndexedRows:
+        return IndexedRows({"vectors": ((EMBEDDING_DIM,), np.float32)})
+
+    def __len__(self) -> int:
+        return len(self._cluster_of)
+
+    @property
+    def is_ready(self) -> bool:
+        self._ensure_loaded()
+        return self.centroids is not None
+
+    def build(self, ids: List[str], artwork_ids: List[str], vectors: np.ndarray, init: Optional[np.ndarray] = None, **kmeans_kwargs) -> None:
+        """Fit centroids with mini-batch k-means and assign every vector"""
+        vectors = normalize_rows(vectors)
+        if vectors.shape[0] == 0:
+            raise ValueError("Cannot cluster an empty embedding catalog")
+        k = init.shape[0] if init is not None else self.k
+        centroids = normalize_rows(minibatch_kmeans(vectors, k, init=init, **kmeans_kwargs))
+        labels = assign(vectors, centroids)
+
+        lists = []
+        for cluster in range(k):
+            members = np.flatnonzero(labels == cluster)
+            rows = self._empty_list()
+            rows.reset([ids[i] for i in members], [artwork_ids[i] for i in members], vectors=vectors[members])
+            lists.append(rows)
+        with self._lock:
+            self.k = k
+            self.centroids = centroids
+            self.lists = lists
+            self._counts = np.bincount(labels, minlength=k).astype(np.float64)
+            self._cluster_of = {ids[i]: int(label) for i, label in enumerate(labels)}
+            self._loaded = True
+        logger.info(f"Built {k} style clusters over {vectors.shape[0]} embeddings")
+
+    def rebalance(self, **kmeans_kwargs) -> None:
+        """Re-fit centroids over the current members, warm-started from the existing centroids"""
+        if not self.is_ready:
+            raise IndexNotReadyError("Style clusters are not available - build them with `python -m services.clustering`")
+        with self._lock:
+            ids = [i for rows in self.lists for i in rows.ids]
+            artwork_ids = [a for rows in self.lists for a in rows.artwork_ids]
+            vectors = np.concatenate([rows.column("vectors") for rows in self.lists])
+            init = self.centroids.copy()
+        self.build(ids, artwork_ids, vectors, init=init, **kmeans_kwargs)
+
+    def upsert(self, embedding_id: str, artwork_id: str, vector: np.ndarray) -> None:
+        """Assign a single embedding to its nearest cluster"""
+        if not self.is_ready:
+            return
+        vector = normalize_rows(vector.reshape(1, -1))[0]
+        with self._lock:
+            self._remove_locked(embedding_id)
+            cluster = int(np.argmax(self.centroids @ vector))
+            self.lists[cluster].upsert(embedding_id, artwork_id, vectors=vector)
+            self._cluster_of[embedding_id] = cluster
+            # Running-mean update keeps the centroid tracking its members between rebalances
+            self._counts[cluster] += 1
+            self._set_centroid(cluster, self.centroids[cluster] + (vector - self.centroids[cluster]) / self._counts[cluster])
+
+    def upsert_row(self, row: Dict[str, Any]) -> None:
+        """Embedding-store listener: assign a freshly written artwork_embedding row"""
+        self.upsert(str(row["id"]), str(row["artwork_id"]), parse_vector(row["vector"]))
+
+    def remove(self, embedding_id: str) -> bool:
+        """Drop an embedding from its cluster"""
+        with self._lock:
+            return self._remove_locked(embedding_id)
+
+    def search(self, query_vector, limit: int = 10, threshold: float = 0.0, n_probe: int = 4) -> List[Dict[str, Any]]:
+        """Exact cosine search restricted to the ``n_probe`` clusters nearest the query"""
+        if not self.is_ready:
+            raise IndexNotReadyError("Style clusters are not available - build them with `python -m services.clustering`")
+        query = normalize_rows(np.asarray(query_vector, dtype=np.float32).reshape(1, -1))[0]
+        with self._lock:
+            probed = top_k(self.centroids @ query, n_probe)
+            hits = []
+            for cluster in probed:
+                rows = self.lists[cluster]
+                scores = rows.column("vectors") @ query
+                for i in top_k(scores, limit):
+                    if scores[i] >= threshold:
+                        hits.append({"id": rows.ids[i], "artwork_id": rows.artwork_ids[i], "similarity": float(scores[i]), "cluster_id": int(cluster)})
+        hits.sort(key=lambda hit: hit["similarity"], reverse=True)
+        return hits[:limit]
+
+    def describe(self, sample_size: int = 5) -> List[Dict[str, Any]]:
+        """Cluster summaries with the artworks closest to each centroid"""
+        if not self.is_ready:
+            raise IndexNotReadyError("Style clusters are not available - build them with `python -m services.clustering`")
+        with self._lock:
+            summaries = []
+            for cluster, rows in enumerate(self.lists):
+                closest = top_k(rows.column("vectors") @ self.centroids[cluster], sample_size)
+                summaries.append({
+                    "cluster_id": cluster,
+                    "size": len(rows),
+                    "sample_artwork_ids": [rows.artwork_ids[i] for i in closest],
+                })
+            return summaries
+
+    def members(self, cluster: int, limit: int = 20, offset: int = 0) -> Optional[List[str]]:
+        """Artwork ids of a cluster ordered by closeness to its centroid"""
+        if not self.is_ready:
+            raise IndexNotReadyError("Style clusters are not available - build them with `python -m services.clustering`")
+        with self._lock:
+            if not 0 <= cluster < len(self.lists):
+                return None
+            rows = self.lists[cluster]
+            order = top_k(rows.column("vectors") @ self.centroids[cluster], offset + limit)[offset:]
+            return [rows.artwork_ids[i] for i in order]
+
+    def save(self, path: Optional[Path] = None) -> Path:
+        """Persist centroids and cluster members atomically to a .npz file"""
+        path = Path(path or self.path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.stem + ".tmp.npz")
+        with self._lock:
+            np.savez(
+                tmp,
+                centroids=self.centroids,
+                counts=self._counts,
+                ids=np.asarray([i for rows in self.lists for i in rows.ids], dtype=str),
+                artwork_ids=np.asarray([a for rows in self.lists for a in rows.artwork_ids], dtype=str),
+                labels=np.concatenate([np.full(len(rows), c, dtype=np.int32) for c, rows in enumerate(self.lists)]),
+                vectors=np.concatenate([rows.column("vectors") for rows in self.lists]),
+            )
+        os.replace(tmp, path)
+        logger.info(f"Saved {self.k} style clusters to {path}")
+        return path
+
+    def load(self, path: Optional[Path] = None) -> None:
+        """Load previously saved clusters"""
+        path = Path(path or self.path)
+        with np.load(path) as data:
+            centroids = data["centroids"].astype(np.float32)
+            ids, artwork_ids = list(map(str, data["ids"])), list(map(str, data["artwork_ids"]))
+            labels, vectors = data["labels"], data["vectors"]
+            lists = []
+            for cluster in range(centroids.shape[0]):
+                members = np.flatnonzero(labels == cluster)
+                rows = self._empty_list()
+                rows.reset([ids[i] for i in members], [artwork_ids[i] for i in members], vectors=vectors[members])
+                lists.append(rows)
+            counts = data["counts"].astype(np.float64)
+        with self._lock:
+            self.k = centroids.shape[0]
+            self.centroids = centroids
+            self.lists = lists
+            self._counts = counts
+            self._cluster_of = {embedding_id: int(label) for embedding_id, label in zip(ids, labels)}
+            self._loaded = True
+        logger.info(f"Loaded {self.k} style clusters from {path}")
+
+    def _remove_locked(self, embedding_id: str) -> bool:
+        cluster = self._cluster_of.pop(embedding_id, None)
+        if cluster is None:
+            return False
+        rows = self.lists[cluster]
+        vector = rows.column("vectors")[rows.positions[embedding_id]].copy()
+        rows.remove(embedding_id)
+        count = self._counts[cluster]
+        if count > 1:
+            # Reverse of the running-mean nudge in upsert
+            self._set_centroid(cluster, (count * self.centroids[cluster] - vector) / (count - 1))
+        self._counts[cluster] = max(count - 1, 0)
+        return True
+
+    def _set_centroid(self, cluster: int, centroid: np.ndarray) -> None:
+        """Store a centroid at unit length (left as is if it collapses to zero)"""
+        norm = np.linalg.norm(centroid)
+        if norm > 0:
+            self.centroids[cluster] = centroid / norm
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if self.path.exists():
+            try:
+                self.load()
+            except Exception as e:
+                logger.error(f"Failed to load style clusters from {self.path}: {e}")
+
+
+# Global style cluster instance
+style_clusters = StyleClusters()
+on_embedding_upsert(style_clusters.upsert_row)
+on_embedding_delete(style_clusters.remove)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build or rebalance artwork style clusters")
+    parser.add_argument("--ndjson", help="NDJSON export to cluster (defaults to the artwork_embedding table)")
+    parser.add_argument("--k", type=int, default=STYLE_CLUSTER_COUNT, help="Number of clusters")
+    parser.add_argument("--rebalance", action="store_true", help="Re-fit the saved clusters instead of starting over")
+    parser.add_argument("--out", default=str(DEFAULT_CLUSTERS_PATH), help="Output .npz path")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    clusters = StyleClusters(k=args.k, path=Path(args.out))
+    if args.rebalance and clusters.is_ready:
+        clusters.rebalance()
+    else:
+        clusters.build(*load_from_source(ndjson_path=args.ndjson))
+    clusters.save()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Single-flight coalescing for identical concurrent reads.
+
+When many requests ask for the same popular artwork or run the same trending
+search at once, only the first (the leader) queries PostgREST; every
+concurrent caller with the same key awaits the leader's result instead of
+issuing its own request. Once the read finishes the key is released, so this
+is not a cache: the next request after completion goes to the database again.
+
+Usage on CRUD read methods::
+
+    _reads = SingleFlight("artwork")
+
+    class ArtworkCRUD:
+        @_reads.coalesce
+        async def get_artwork_by_id(self, artwork_id): ...
+
+        @_reads.invalidates
+        async def update_artwork(self, artwork_id, artwork_update): ...
+
+The Supabase client is synchronous, so a coalesced read runs in a worker
+thread (on its own short-lived event loop). That keeps the blocking HTTP call
+off the server's event loop, which is what lets concurrent requests overlap
+and join the same flight. Coalesced methods called from inside a worker, or
+from inside a write method, run directly. Results are shared between callers
+and must be treated as read-only.
+
+Writes wrapped with ``invalidates`` bump the flight generation when they
+finish, so reads issued after a write never join a flight that started
+before it. Set ``READ_COALESCING=0`` to disable coalescing entirely.
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+from pydantic import BaseModel
+
+from services import request_context
+
+logger = logging.getLogger(__name__)
+
+READ_COALESCING = os.getenv("READ_COALESCING", "1").lower() not in ("0", "false", "no")
+
+T = TypeVar("T")
+
+# Set inside worker threads and write methods: coalesced reads there run directly
+_passthrough: contextvars.ContextVar[bool] = contextvars.ContextVar("coalescing_passthrough", default=False)
+
+# Every SingleFlight by table name
+_flights: Dict[str, "SingleFlight"] = {}
+
+
+def freeze(value: Any) -> Hashable:
+    """Turn call arguments (models, lists, dicts, UUIDs) into a hashable key"""
+    if isinstance(value, BaseModel):
+        return (type(value).__name__, value.model_dump_json())
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = sorted(value, key=repr) if isinstance(value, (set, frozenset)) else value
+        return tuple(freeze(v) for v in items)
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+    return value
+
+
+def _run_in_worker(method: Callable[..., Awaitable[T]], args: Tuple, kwargs: Dict[str, Any]) -> T:
+    _passthrough.set(True)
+    return asyncio.run(method(*args, **kwargs))
+
+
+class SingleFlight:
+    """One in-flight future per read key, shared with every concurrent waiter"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.generation = 0
+        self.leaders = 0
+        self.joined = 0
+        self._inflight: Dict[Hashable, Tuple[asyncio.Future, Any]] = {}
+        self._lock = threading.Lock()
+        _flights[name] = self
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run ``fn`` unless an identical read is already in flight, then share its result"""
+        loop = asyncio.get_running_loop()
+        key = (self.generation, key)
+        with self._lock:
+            future, leader_metadata = self._inflight.get(key, (None, None))
+            if future is not None and future.get_loop() is loop:
+                self.joined += 1
+            else:
+                future, leader_metadata = asyncio.ensure_future(fn()), None
+                self._inflight[key] = (future, request_context.current())
+                future.add_done_callback(functools.partial(self._release, key))
+                self.leaders += 1
+        # Shield so one caller disconnecting doesn't cancel the read for everyone else
+        result = await asyncio.shield(future)
+        # Waiters inherit what the leader learned about the data (e.g. it came from a snapshot)
+        request_context.merge(leader_metadata)
+        return result
+
+    def invalidate(self) -> None:
+        """Make reads issued from now on start a fresh flight"""
+        with self._lock:
+            self.generation += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"in_flight": len(self._inflight), "leaders": self.leaders, "joined": self.joined}
+
+    def _release(self, key: Hashable, future: asyncio.Future) -> None:
+        with self._lock:
+            if self._inflight.get(key, (None,))[0] is future:
+                del self._inflight[key]
+        if not future.cancelled() and future.exception() is not None:
+            logger.debug(f"Coalesced {self.name} read failed: {future.exception()}")
+
+    def coalesce(self, method: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        """Decorate an async CRUD read method"""
+
+        @functools.wraps(method)
+        async def wrapper(*args, **kwargs) -> T:
+            if not READ_COALESCING or _passthrough.get():
+                return await method(*args, **kwargs)
+            # args[0] is the CRUD instance: one global per class, so it is left out of the key
+            key = (method.__name__, freeze(args[1:]), freeze(kwargs))
+            return await self.do(key, lambda: asyncio.to_thread(_run_in_worker, method, args, kwargs))
+
+        return wrapper
+
+    def invalidates(self, method: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        """Decorate an async CRUD write method so later reads don't join stale flights"""
+
+        @functools.wraps(method)
+        async def wrapper(*args, **kwargs) -> T:
+            # Re-reads inside the write (e.g. returning the updated row) must see the write
+            token = _passthrough.set(True)
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                _passthrough.reset(token)
+                self.invalidate()
+
+        return wrapper
+
+
+def invalidate_flights(name: str) -> None:
+    """Bump a table's generation for writes made outside its CRUD module (e.g. by a job worker)"""
+    flight = _flights.get(name)
+    if flight is not None:
+        flight.invalidate()
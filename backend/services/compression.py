@@ -0,0 +1,240 @@
+"""
+Response compression.
+
+Artwork lists and embedding reads are large, repetitive JSON (an embedding
+list of 100 rows is ~800 KB, mostly digits), so ``CompressionMiddleware``
+compresses responses with the best encoding both sides support:
+
+``zstd``
+    Needs the optional ``zstandard`` package.
+``br``
+    Needs the optional ``brotli`` package.
+``gzip``
+    Always available (zlib).
+
+Preference follows the client's ``Accept-Encoding`` q-values, then
+``COMPRESSION_ENCODINGS``. Only text-like media types (JSON, NDJSON, text,
+XML) are compressed: msgpack and octet-stream embedding frames are float32
+bytes that barely shrink, and images are compressed already. Bodies under
+``COMPRESSION_MIN_SIZE`` bytes go out as-is, since the framing overhead
+outweighs the savings. Bodies over ``COMPRESSION_THREAD_SIZE`` bytes are
+compressed in a worker thread (the codecs release the GIL), so one large
+export does not stall the event loop.
+
+Streamed responses (``StreamingResponse`` exports) are compressed chunk by
+chunk with one streaming compressor per response, flushed after every chunk
+so the client receives data as it is produced.
+
+Compare encodings on typical payloads with ``python bench_compression.py``.
+"""
+import asyncio
+import logging
+import os
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard is optional
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION = os.getenv("COMPRESSION", "1").lower() not in ("0", "false", "no")
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_THREAD_SIZE = int(os.getenv("COMPRESSION_THREAD_SIZE", "262144"))
+COMPRESSION_ENCODINGS = [e.strip() for e in os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip").split(",") if e.strip()]
+# Float-heavy embedding JSON gains little past level 1 but costs ~5x the CPU at level 5
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "1"))
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+
+_COMPRESSIBLE_PREFIXES = ("text/", "application/json", "application/x-ndjson", "application/xml", "application/javascript")
+
+
+class _Gzip:
+    def __init__(self):
+        self._codec = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._codec.compress(data) + self._codec.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._codec.flush(zlib.Z_FINISH)
+
+
+class _Brotli:
+    def __init__(self):
+        self._codec = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._codec.process(data) + self._codec.flush()
+
+    def finish(self) -> bytes:
+        return self._codec.finish()
+
+
+class _Zstd:
+    def __init__(self):
+        self._codec = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._codec.compress(data) + self._codec.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._codec.flush()
+
+
+def _compress_gzip(body: bytes) -> bytes:
+    codec = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return codec.compress(body) + codec.flush()
+
+
+# encoding -> (one-shot compressor, streaming compressor factory)
+CODECS: Dict[str, Tuple[Callable[[bytes], bytes], Callable[[], object]]] = {"gzip": (_compress_gzip, _Gzip)}
+if brotli is not None:
+    CODECS["br"] = (lambda body: brotli.compress(body, quality=BROTLI_QUALITY), _Brotli)
+if zstandard is not None:
+    CODECS["zstd"] = (lambda body: zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body), _Zstd)
+
+
+def available_encodings() -> List[str]:
+    """Encodings this server will produce, most preferred first"""
+    return [encoding for encoding in COMPRESSION_ENCODINGS if encoding in CODECS]
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick a content coding from an Accept-Encoding header (None = send identity)"""
+    if not accept_encoding:
+        return None
+    offered: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        offered[coding.strip().lower()] = q
+    best, best_q = None, 0.0
+    for encoding in available_encodings():
+        q = offered.get(encoding, offered.get("*", 0.0))
+        # Server preference order breaks ties
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    if not content_type:
+        return False
+    media = content_type.split(";")[0].strip().lower()
+    return media.startswith(_COMPRESSIBLE_PREFIXES) or media.endswith("+json")
+
+
+async def compress_body(encoding: str, body: bytes) -> bytes:
+    """Compress a complete body, off the event loop when it is large"""
+    compress = CODECS[encoding][0]
+    if len(body) >= COMPRESSION_THREAD_SIZE:
+        return await asyncio.to_thread(compress, body)
+    return compress(body)
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing text-like responses with zstd, brotli or gzip"""
+
+    def __init__(self, app: ASGIApp, min_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not COMPRESSION:
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressedResponse(send, encoding, self.min_size).run(self.app, scope, receive)
+
+
+class _CompressedResponse:
+    """Send wrapper for one response: decides on the first body message, then compresses or passes through"""
+
+    def __init__(self, send: Send, encoding: str, min_size: int):
+        self.send = send
+        self.encoding = encoding
+        self.min_size = min_size
+        self.start: Optional[Message] = None
+        self.stream = None
+        self.passthrough = False
+
+    async def run(self, app: ASGIApp, scope: Scope, receive: Receive) -> None:
+        await app(scope, receive, self.wrapped_send)
+
+    async def wrapped_send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            self.passthrough = (
+                message["status"] in (204, 304)
+                or "content-encoding" in headers
+                or not is_compressible(headers.get("content-type"))
+            )
+            if self.passthrough:
+                await self.send(message)
+            else:
+                # Held back until the first body chunk shows whether compressing pays off
+                self.start = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.start is not None:
+            start, self.start = self.start, None
+            if not more_body:
+                await self._send_whole(start, body)
+                return
+            self._set_encoding_headers(start)
+            await self.send(start)
+            self.stream = CODECS[self.encoding][1]()
+        if self.stream is None:
+            await self.send(message)
+            return
+        chunk = self.stream.chunk(body) if body else b""
+        if not more_body:
+            chunk += self.stream.finish()
+        if chunk or not more_body:
+            await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    async def _send_whole(self, start: Message, body: bytes) -> None:
+        if len(body) < self.min_size:
+            await self.send(start)
+            await self.send({"type": "http.response.body", "body": body})
+            return
+        compressed = await compress_body(self.encoding, body)
+        headers = self._set_encoding_headers(start)
+        headers["Content-Length"] = str(len(compressed))
+        await self.send(start)
+        await self.send({"type": "http.response.body", "body": compressed})
+
+    def _set_encoding_headers(self, start: Message) -> MutableHeaders:
+        headers = MutableHeaders(scope=start)
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if "content-length" in headers:
+            del headers["content-length"]
+        return headers
@@ -0,0 +1,345 @@
+"""
+Item-item co-selection graph from session history ("people who considered X chose Y").
+
+A session that ends in a choice says that every other artwork it showed
+(``topk_ids``) lost to the chosen one. Each such session adds one edge
+``considered -> chosen`` to a sparse directed graph. The graph is held as a CSR
+matrix over dense artwork slots: ``indptr`` row offsets, ``indices`` chosen
+slots and ``counts`` edge weights. Memory therefore grows with the number of
+distinct edges, never with N².
+
+* Building streams the session table page by page. Edges are packed into
+  int64 keys and compacted with ``np.unique`` in bounded chunks, so at most
+  one chunk of raw edges is held alongside the running CSR.
+* New, edited and deleted sessions (services/session_events.py) go to a
+  small per-row delta. The delta is merged into the CSR once it holds
+  ``COSELECTION_MERGE_EDGES`` edges, and again on save.
+* Lists are ranked by a popularity-damped score,
+  ``count / sqrt(considered(X) * chosen(Y))``: a cosine between X's
+  "considered" column and Y's "chosen" column, so artworks everyone picks do
+  not top every list. The raw ``confidence`` (the share of X's sessions that
+  ended on Y) is returned alongside.
+
+Rebuild and persist with:
+
+    python -m services.coselection
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from services.embedding_store import IndexNotReadyError, iter_ndjson_rows
+from services.session_events import SESSION_COLUMNS, on_session_change
+from services.session_stats import Vocabulary
+from services.settings import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COSELECTION_PATH = Path(os.getenv("COSELECTION_PATH", DATA_DIR / "coselection.npz"))
+# Pending incremental edges merged into the CSR arrays once the delta reaches this size
+COSELECTION_MERGE_EDGES = int(os.getenv("COSELECTION_MERGE_EDGES", "50000"))
+# Raw edges collected before each compaction while building
+BUILD_CHUNK_EDGES = 1_000_000
+_SLOT_BITS = 32
+_SLOT_MASK = (1 << _SLOT_BITS) - 1
+
+
+def iter_session_rows(client, page_size: int = 1000) -> Iterator[Dict[str, Any]]:
+    """Page through the session table (sessions without a choice are skipped server-side)"""
+    after = None
+    while True:
+        query = client.table("session").select(SESSION_COLUMNS).not_.is_("chosen_id", "null")
+        if after:
+            query = query.gt("id", after)
+        rows = query.order("id").limit(page_size).execute().data or []
+        yield from rows
+        if len(rows) < page_size:
+            break
+        after = rows[-1]["id"]
+
+
+def _compact(keys: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Sum the weights of duplicate keys; drop keys whose total is not positive"""
+    unique, inverse = np.unique(keys, return_inverse=True)
+    totals = np.bincount(inverse.ravel(), weights=weights, minlength=unique.size).astype(np.int64)
+    keep = totals > 0
+    return unique[keep], totals[keep]
+
+
+class CoSelectionGraph:
+    """Sparse considered -> chosen counts with incremental updates"""
+
+    def __init__(self, path: Path = DEFAULT_COSELECTION_PATH, merge_edges: int = COSELECTION_MERGE_EDGES):
+        self.path = Path(path)
+        self.merge_edges = merge_edges
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._reset()
+
+    def _reset(self) -> None:
+        self.built_at: Optional[float] = None
+        self._artworks = Vocabulary()
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.zeros(0, dtype=np.int32)
+        self._counts = np.zeros(0, dtype=np.int32)
+        # Sessions (with a choice) in which each artwork was shown / chosen
+        self._considered = np.zeros(0, dtype=np.int64)
+        self._chosen = np.zeros(0, dtype=np.int64)
+        # Row slot -> {chosen slot: count change} not yet merged into the CSR arrays
+        self._delta: Dict[int, Dict[int, int]] = {}
+        self._delta_edges = 0
+
+    def __len__(self) -> int:
+        return len(self._artworks)
+
+    @property
+    def is_ready(self) -> bool:
+        self._ensure_loaded()
+        return self.built_at is not None
+
+    @property
+    def nnz(self) -> int:
+        return int(self._indices.size)
+
+    @staticmethod
+    def _session_edges(row: Optional[Dict[str, Any]], artworks: Vocabulary) -> Optional[Tuple[List[int], int]]:
+        """(slots shown, chosen slot) of a session, or None if it has no choice"""
+        if not row or row.get("chosen_id") is None:
+            return None
+        chosen = artworks.slot(str(row["chosen_id"]))
+        shown = list(dict.fromkeys(artworks.slot(str(a)) for a in row.get("topk_ids") or ()))
+        return shown, chosen
+
+    # Build
+
+    def build(self, rows: Iterable[Dict[str, Any]], chunk_edges: int = BUILD_CHUNK_EDGES) -> None:
+        """Stream session rows into a fresh CSR graph, then swap it in"""
+        artworks = Vocabulary()
+        keys = np.zeros(0, dtype=np.int64)
+        weights = np.zeros(0, dtype=np.int64)
+        pending: List[int] = []
+        considered: List[int] = []
+        chosen: List[int] = []
+        sessions = 0
+        for row in rows:
+            edges = self._session_edges(row, artworks)
+            if edges is None:
+                continue
+            shown, choice = edges
+            sessions += 1
+            considered.extend(shown)
+            chosen.append(choice)
+            pending.extend((slot << _SLOT_BITS) | choice for slot in shown if slot != choice)
+            if len(pending) >= chunk_edges:
+                keys, weights = self._compact_pending(keys, weights, pending)
+                pending = []
+        keys, weights = self._compact_pending(keys, weights, pending)
+
+        size = len(artworks)
+        with self._lock:
+            self._reset()
+            self._artworks = artworks
+            self._set_csr(keys, weights)
+            self._considered = np.bincount(np.asarray(considered, dtype=np.int64), minlength=size)
+            self._chosen = np.bincount(np.asarray(chosen, dtype=np.int64), minlength=size)
+            self.built_at = time.time()
+            self._loaded = True
+        logger.info(f"Built co-selection graph from {sessions} sessions: {size} artworks, {self.nnz} edges")
+
+    @staticmethod
+    def _compact_pending(keys: np.ndarray, weights: np.ndarray, pending: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+        if not pending:
+            return keys, weights
+        batch = np.asarray(pending, dtype=np.int64)
+        return _compact(np.concatenate([keys, batch]), np.concatenate([weights, np.ones(batch.size, dtype=np.int64)]))
+
+    def _set_csr(self, keys: np.ndarray, weights: np.ndarray) -> None:
+        """Sorted (row << 32 | col) keys and their counts -> CSR arrays over all artwork slots"""
+        rows_of = keys >> _SLOT_BITS
+        self._indptr = np.concatenate([[0], np.cumsum(np.bincount(rows_of, minlength=len(self._artworks)))]).astype(np.int64)
+        self._indices = (keys & _SLOT_MASK).astype(np.int32)
+        self._counts = weights.astype(np.int32)
+
+    def rebuild(self, client=None, page_size: int = 1000) -> None:
+        """Rebuild from the session table"""
+        if client is None:
+            from database import db_connection
+            client = db_connection.client
+        self.build(iter_session_rows(client, page_size=page_size))
+
+    # Incremental updates
+
+    def apply_change(self, previous: Optional[Dict[str, Any]], current: Optional[Dict[str, Any]]) -> None:
+        """Session listener: replace a session's old edges with its new ones"""
+        if not self.is_ready:
+            return
+        with self._lock:
+            for row, sign in ((previous, -1), (current, 1)):
+                edges = self._session_edges(row, self._artworks)
+                if edges is None:
+                    continue
+                shown, choice = edges
+                size = len(self._artworks)
+                self._considered = self._grown(self._considered, size)
+                self._chosen = self._grown(self._chosen, size)
+                self._considered[shown] += sign
+                self._chosen[choice] += sign
+                for slot in shown:
+                    if slot != choice:
+                        row_delta = self._delta.setdefault(slot, {})
+                        row_delta[choice] = row_delta.get(choice, 0) + sign
+                        self._delta_edges += 1
+            if self._delta_edges >= self.merge_edges:
+                self._merge()
+
+    @staticmethod
+    def _grown(array: np.ndarray, size: int) -> np.ndarray:
+        if size <= array.size:
+            return array
+        grown = np.zeros(max(size, 2 * array.size, 64), dtype=array.dtype)
+        grown[:array.size] = array
+        return grown
+
+    def _merge(self) -> None:
+        """Fold the pending delta into the CSR arrays (caller holds the lock)"""
+        if not self._delta:
+            return
+        base_rows = np.repeat(np.arange(self._indptr.size - 1, dtype=np.int64), np.diff(self._indptr))
+        delta = [(row, col, change) for row, cols in self._delta.items() for col, change in cols.items() if change]
+        delta_keys = np.fromiter(((row << _SLOT_BITS) | col for row, col, _ in delta), dtype=np.int64, count=len(delta))
+        delta_weights = np.fromiter((change for _, _, change in delta), dtype=np.int64, count=len(delta))
+        keys, weights = _compact(
+            np.concatenate([(base_rows << _SLOT_BITS) | self._indices, delta_keys]),
+            np.concatenate([self._counts.astype(np.int64), delta_weights]),
+        )
+        self._set_csr(keys, weights)
+        self._delta = {}
+        self._delta_edges = 0
+
+    # Reads
+
+    def _row(self, slot: int) -> Dict[int, int]:
+        counts: Dict[int, int] = {}
+        if slot + 1 < self._indptr.size:
+            start, end = self._indptr[slot], self._indptr[slot + 1]
+            counts = dict(zip(self._indices[start:end].tolist(), self._counts[start:end].tolist()))
+        for col, change in self._delta.get(slot, {}).items():
+            counts[col] = counts.get(col, 0) + change
+        return counts
+
+    def co_selected(self, artwork_id, limit: int = 10, min_count: int = 1) -> Optional[List[Dict[str, Any]]]:
+        """Artworks chosen in sessions that showed this one, best first; None if it never was shown"""
+        if not self.is_ready:
+            raise IndexNotReadyError("Co-selection graph is not built - run `python -m services.coselection` or POST /api/jobs/reindex")
+        with self._lock:
+            slot = self._artworks.slots.get(str(artwork_id))
+            if slot is None or slot >= self._considered.size or self._considered[slot] <= 0:
+                return None
+            row = {col: count for col, count in self._row(slot).items() if count >= min_count}
+            if not row:
+                return []
+            cols = np.fromiter(row.keys(), dtype=np.int64, count=len(row))
+            counts = np.fromiter(row.values(), dtype=np.float64, count=len(row))
+            considered = float(self._considered[slot])
+            scores = counts / np.sqrt(considered * np.maximum(self._chosen[cols], 1))
+            # Ties broken by artwork id so lists don't depend on slot assignment order
+            order = sorted(range(len(row)), key=lambda i: (-scores[i], -counts[i], self._artworks.keys[cols[i]]))[:limit]
+            return [
+                {
+                    "artwork_id": self._artworks.keys[cols[i]],
+                    "score": round(float(scores[i]), 6),
+                    "count": int(counts[i]),
+                    "confidence": round(float(counts[i] / considered), 6),
+                }
+                for i in order
+            ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "artworks": len(self._artworks),
+                "edges": self.nnz,
+                "pending_edges": self._delta_edges,
+                "bytes": int(self._indptr.nbytes + self._indices.nbytes + self._counts.nbytes),
+                "built_at": self.built_at,
+            }
+
+    # Persistence
+
+    def save(self, path: Optional[Path] = None) -> Path:
+        """Merge pending edges and persist the CSR arrays atomically to a .npz file"""
+        path = Path(path or self.path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.stem + ".tmp.npz")
+        with self._lock:
+            self._merge()
+            size = len(self._artworks)
+            np.savez(
+                tmp,
+                built_at=np.float64(self.built_at or time.time()),
+                artwork_ids=np.asarray(self._artworks.keys, dtype=str),
+                indptr=self._indptr,
+                indices=self._indices,
+                counts=self._counts,
+                considered=self._grown(self._considered, size)[:size],
+                chosen=self._grown(self._chosen, size)[:size],
+            )
+        os.replace(tmp, path)
+        logger.info(f"Saved co-selection graph ({self.nnz} edges) to {path}")
+        return path
+
+    def load(self, path: Optional[Path] = None) -> None:
+        """Load a previously saved graph"""
+        path = Path(path or self.path)
+        with np.load(path) as data, self._lock:
+            self._reset()
+            self.built_at = float(data["built_at"])
+            self._artworks = Vocabulary(map(str, data["artwork_ids"]))
+            self._indptr = data["indptr"].astype(np.int64)
+            self._indices = data["indices"].astype(np.int32)
+            self._counts = data["counts"].astype(np.int32)
+            self._considered = data["considered"].astype(np.int64)
+            self._chosen = data["chosen"].astype(np.int64)
+            self._loaded = True
+        logger.info(f"Loaded co-selection graph ({self.nnz} edges) from {path}")
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if self.path.exists():
+            try:
+                self.load()
+            except Exception as e:
+                logger.error(f"Failed to load co-selection graph from {self.path}: {e}")
+
+
+# Global co-selection graph instance
+coselection_graph = CoSelectionGraph()
+on_session_change(coselection_graph.apply_change)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild the co-selection graph from session history")
+    parser.add_argument("--ndjson", help="NDJSON session export to build from (defaults to the session table)")
+    parser.add_argument("--out", default=str(DEFAULT_COSELECTION_PATH), help="Output .npz path")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    graph = CoSelectionGraph(path=Path(args.out))
+    if args.ndjson:
+        graph.build(iter_ndjson_rows(args.ndjson))
+    else:
+        graph.rebuild()
+    graph.save()
+    print(graph.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Near-duplicate artwork detection over the embedding catalog.
+
+The same print imported from several brands ends up with near-identical
+embeddings. Instead of comparing all N^2 pairs, rows are blocked with
+random-hyperplane LSH: each of ``tables`` hash tables keys a row by the signs
+of ``bits`` random projections, and exact cosine similarity is only computed
+inside each bucket. Pairs at or above the threshold are merged into clusters
+with union-find, and every cluster gets a representative: its lowest-priced
+artwork.
+
+Run the job (reads the flat index snapshot, falls back to the table):
+
+    python -m services.dedup --threshold 0.97
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from services.embedding_store import load_from_source, normalize_rows
+from services.flat_index import flat_index
+from services.settings import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DUPLICATES_PATH = Path(os.getenv("DUPLICATES_PATH", DATA_DIR / "duplicates.json"))
+DUPLICATE_THRESHOLD = float(os.getenv("DUPLICATE_THRESHOLD", "0.97"))
+BUCKET_BLOCK_ROWS = 2048
+
+
+def lsh_buckets(matrix: np.ndarray, bits: int = 16, tables: int = 4, seed: int = 0) -> Iterable[np.ndarray]:
+    """Yield the row indices of every LSH bucket holding at least two rows"""
+    rng = np.random.default_rng(seed)
+    weights = (1 << np.arange(bits, dtype=np.int64))
+    for _ in range(tables):
+        planes = rng.standard_normal((matrix.shape[1], bits)).astype(np.float32)
+        keys = ((matrix @ planes) > 0).astype(np.int64) @ weights
+        order = np.argsort(keys, kind="stable")
+        boundaries = np.flatnonzero(np.diff(keys[order])) + 1
+        for bucket in np.split(order, boundaries):
+            if bucket.size > 1:
+                yield bucket
+
+
+def find_duplicate_pairs(
+    matrix: np.ndarray,
+    threshold: float = DUPLICATE_THRESHOLD,
+    bits: int = 16,
+    tables: int = 4,
+    seed: int = 0,
+) -> Set[Tuple[int, int]]:
+    """Row-index pairs (i < j) whose cosine similarity is at least ``threshold``"""
+    matrix = normalize_rows(matrix)
+    pairs: Set[Tuple[int, int]] = set()
+    for bucket in lsh_buckets(matrix, bits=bits, tables=tables, seed=seed):
+        vectors = matrix[bucket]
+        for start in range(0, bucket.size, BUCKET_BLOCK_ROWS):
+            scores = vectors[start:start + BUCKET_BLOCK_ROWS] @ vectors.T
+            rows, cols = np.nonzero(scores >= threshold)
+            rows += start
+            keep = rows < cols
+            for i, j in zip(bucket[rows[keep]], bucket[cols[keep]]):
+                pairs.add((int(min(i, j)), int(max(i, j))))
+    return pairs
+
+
+def cluster_pairs(n: int, pairs: Iterable[Tuple[int, int]]) -> List[List[int]]:
+    """Connected components (size >= 2) of the duplicate graph via union-find"""
+    parent = np.arange(n)
+
+    def find(x: int) -> int:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for i, j in pairs:
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    groups: Dict[int, List[int]] = {}
+    for i in {index for pair in pairs for index in pair}:
+        groups.setdefault(find(i), []).append(i)
+    return [sorted(members) for members in groups.values()]
+
+
+def fetch_artwork_prices(client=None, page_size: int = 1000) -> Dict[str, Optional[float]]:
+    """Page through the artwork table collecting prices for representative selection"""
+    if client is None:
+        from database import db_connection
+        client = db_connection.client
+    prices: Dict[str, Optional[float]] = {}
+    offset = 0
+    while True:
+        result = client.table("artwork").select("id, price").order("id").range(offset, offset + page_size - 1).execute()
+        rows = result.data or []
+        for row in rows:
+            prices[str(row["id"])] = float(row["price"]) if row.get("price") is not None else None
+        if len(rows) < page_size:
+            break
+        offset += page_size
+    return prices
+
+
+class DuplicateIndex:
+    """Duplicate clusters with their best-priced representative"""
+
+    def __init__(self, path: Path = DEFAULT_DUPLICATES_PATH):
+        self.path = Path(path)
+        self.clusters: List[Dict[str, Any]] = []
+        self._cluster_of: Dict[str, int] = {}
+        self._prices: Dict[str, Optional[float]] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def __len__(self) -> int:
+        return len(self.clusters)
+
+    @property
+    def is_ready(self) -> bool:
+        self._ensure_loaded()
+        return bool(self.clusters)
+
+    def detect(
+        self,
+        artwork_ids: List[str],
+        matrix: np.ndarray,
+        prices: Dict[str, Optional[float]],
+        threshold: float = DUPLICATE_THRESHOLD,
+        **lsh_kwargs,
+    ) -> None:
+        """Find duplicate clusters among the given artworks"""
+        pairs = find_duplicate_pairs(matrix, threshold=threshold, **lsh_kwargs)
+        clusters = []
+        for members in cluster_pairs(len(artwork_ids), pairs):
+            member_ids = sorted({artwork_ids[i] for i in members})
+            if len(member_ids) < 2:
+                continue
+            clusters.append({
+                "representative": min(member_ids, key=lambda a: self._price_key(prices.get(a))),
+                "members": member_ids,
+            })
+        self._set_clusters(clusters, {a: prices.get(a) for c in clusters for a in c["members"]})
+        logger.info(f"Found {len(pairs)} duplicate pairs in {len(clusters)} clusters (threshold={threshold})")
+
+    def representative(self, artwork_id: str) -> str:
+        """Best-priced artwork of the cluster containing ``artwork_id`` (itself if unique)"""
+        self._ensure_loaded()
+        cluster = self._cluster_of.get(str(artwork_id))
+        return self.clusters[cluster]["representative"] if cluster is not None else str(artwork_id)
+
+    def collapse(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Keep one hit per duplicate cluster: the cheapest member among the hits, at the cluster's best rank"""
+        self._ensure_loaded()
+        if not self.clusters:
+            return results
+        with self._lock:
+            kept: List[Dict[str, Any]] = []
+            slot_of_cluster: Dict[Any, int] = {}
+            for row in results:
+                artwork_id = str(row.get("artwork_id", row.get("id")))
+                cluster = self._cluster_of.get(artwork_id, artwork_id)
+                slot = slot_of_cluster.get(cluster)
+                if slot is None:
+                    slot_of_cluster[cluster] = len(kept)
+                    kept.append(dict(row, duplicates=[]))
+                    continue
+                current = kept[slot]
+                current_id = str(current.get("artwork_id", current.get("id")))
+                if self._price_key(self._prices.get(artwork_id)) < self._price_key(self._prices.get(current_id)):
+                    # Cheaper duplicate takes over the slot (and the better rank's similarity)
+                    kept[slot] = dict(row, similarity=current.get("similarity"), duplicates=current["duplicates"] + [current_id])
+                else:
+                    current["duplicates"].append(artwork_id)
+            return kept
+
+    def save(self, path: Optional[Path] = None) -> Path:
+        """Persist clusters to a JSON file"""
+        path = Path(path or self.path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            payload = {"clusters": self.clusters, "prices": self._prices}
+        path.write_text(json.dumps(payload), encoding="utf-8")
+        logger.info(f"Saved {len(self.clusters)} duplicate clusters to {path}")
+        return path
+
+    def load(self, path: Optional[Path] = None) -> None:
+        """Load previously detected clusters"""
+        path = Path(path or self.path)
+        payload = json.loads(path.read_text(encoding="utf-8"))
+        self._set_clusters(payload.get("clusters", []), payload.get("prices", {}))
+        logger.info(f"Loaded {len(self.clusters)} duplicate clusters from {path}")
+
+    def _set_clusters(self, clusters: List[Dict[str, Any]], prices: Dict[str, Optional[float]]) -> None:
+        with self._lock:
+            self.clusters = clusters
+            self._prices = prices
+            self._cluster_of = {a: i for i, c in enumerate(clusters) for a in c["members"]}
+            self._loaded = True
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if self.path.exists():
+            try:
+                self.load()
+            except Exception as e:
+                logger.error(f"Failed to load duplicate clusters from {self.path}: {e}")
+
+    @staticmethod
+    def _price_key(price: Optional[float]) -> float:
+        return price if price is not None else float("inf")
+
+
+# Global duplicate index instance
+duplicate_index = DuplicateIndex()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Detect near-duplicate artworks from their embeddings")
+    parser.add_argument("--ndjson", help="NDJSON export to scan (defaults to the flat index snapshot or the table)")
+    parser.add_argument("--threshold", type=float, default=DUPLICATE_THRESHOLD, help="Minimum cosine similarity")
+    parser.add_argument("--bits", type=int, default=16, help="Random hyperplanes per LSH table")
+    parser.add_argument("--tables", type=int, default=4, help="Number of LSH tables")
+    parser.add_argument("--out", default=str(DEFAULT_DUPLICATES_PATH), help="Output JSON path")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.ndjson or not flat_index.is_ready:
+        _, artwork_ids, matrix = load_from_source(ndjson_path=args.ndjson)
+    else:
+        artwork_ids, matrix = list(flat_index.rows.artwork_ids), flat_index.rows.column("vectors")
+    index = DuplicateIndex(path=Path(args.out))
+    index.detect(artwork_ids, matrix, fetch_artwork_prices(), threshold=args.threshold, bits=args.bits, tables=args.tables)
+    index.save()
+
+
+if __name__ == "__main__":
+    main()
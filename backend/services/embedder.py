@@ -0,0 +1,400 @@
+"""
+Image embedding service with dynamic micro-batching.
+
+Models implement ``EmbeddingModel.embed_batch`` (decoded RGB batch in, one
+384-d unit vector per image out) and are registered by name; ``EMBEDDING_MODEL``
+picks one. The built-in ``reference`` model is a CPU-only, network-free
+colour/texture descriptor (Hellinger-normalised colour histogram, coarse
+colour layout and gradient-orientation histogram, projected to 384
+dimensions with a fixed random matrix). It is not DINOv2/CLIP quality, but it
+is deterministic and makes visually similar images land near each other, so
+the whole pipeline runs end to end. Heavier models register the same way.
+
+Requests never call the model per image. ``MicroBatcher`` collects
+concurrent submissions until ``EMBED_MAX_BATCH`` images are queued or
+``EMBED_MAX_WAIT_MS`` has passed since the first one, then runs the whole
+batch in a process pool (``EMBEDDER_WORKERS``; 0 runs in-process). Each
+worker loads the model once. Throughput is reported by ``stats()`` and by
+the benchmark:
+
+    python -m services.embedder --bench 512
+
+Images reached from requests are fetched with ``fetch_image``, which only
+accepts http(s) URLs, refuses hosts that resolve to private, loopback or
+link-local addresses (checked again on every redirect) and stops reading at
+``IMAGE_FETCH_MAX_BYTES``. Local files can only be read from the command line.
+"""
+import argparse
+import io
+import ipaddress
+import logging
+import multiprocessing
+import os
+import queue
+import socket
+import threading
+import time
+import urllib.parse
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Union
+
+import numpy as np
+
+from services.embedding_store import EMBEDDING_DIM, normalize_rows
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "reference")
+EMBEDDER_WORKERS = int(os.getenv("EMBEDDER_WORKERS", "2"))
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "32"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "10"))
+EMBED_IMAGE_SIZE = 64
+IMAGE_FETCH_TIMEOUT = float(os.getenv("IMAGE_FETCH_TIMEOUT", "10"))
+IMAGE_FETCH_MAX_BYTES = int(os.getenv("IMAGE_FETCH_MAX_BYTES", str(20 * 1024 * 1024)))
+IMAGE_FETCH_MAX_REDIRECTS = 3
+# Comma-separated hosts images may come from (empty = any public host)
+IMAGE_FETCH_ALLOWED_HOSTS = {host.strip().lower() for host in os.getenv("IMAGE_FETCH_ALLOWED_HOSTS", "").split(",") if host.strip()}
+# Allow hosts on private networks, e.g. a local Supabase storage in development
+IMAGE_FETCH_ALLOW_PRIVATE = os.getenv("IMAGE_FETCH_ALLOW_PRIVATE", "0").lower() in ("1", "true", "yes")
+
+ImageInput = Union[bytes, np.ndarray]
+
+
+def decode_image(image: ImageInput, size: int = EMBED_IMAGE_SIZE) -> np.ndarray:
+    """Encoded image bytes (or an HxWx3 array) to a size x size float32 RGB array in [0, 1]"""
+    if isinstance(image, np.ndarray):
+        array = image
+    else:
+        try:
+            from PIL import Image
+        except ImportError as e:
+            raise ImportError("Pillow is required to decode images: pip install Pillow") from e
+        with Image.open(io.BytesIO(image)) as img:
+            array = np.asarray(img.convert("RGB").resize((size, size)))
+    if array.shape[:2] != (size, size):
+        # Nearest-neighbour resample keeps pre-decoded arrays dependency-free
+        rows = np.arange(size) * array.shape[0] // size
+        cols = np.arange(size) * array.shape[1] // size
+        array = array[rows][:, cols]
+    if np.issubdtype(array.dtype, np.integer):
+        return array[..., :3].astype(np.float32) / 255.0
+    return array[..., :3].astype(np.float32)
+
+
+class ImageFetchError(ValueError):
+    """An image URL that may not be fetched, or a download over the size limit"""
+
+
+def _check_image_url(url: str) -> None:
+    parsed = urllib.parse.urlsplit(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ImageFetchError(f"Only http(s) image URLs are allowed: {url!r}")
+    host = parsed.hostname.lower()
+    if IMAGE_FETCH_ALLOWED_HOSTS and host not in IMAGE_FETCH_ALLOWED_HOSTS:
+        raise ImageFetchError(f"Image host {host} is not in IMAGE_FETCH_ALLOWED_HOSTS")
+    if IMAGE_FETCH_ALLOW_PRIVATE:
+        return
+    try:
+        addresses = socket.getaddrinfo(host, parsed.port or (443 if parsed.scheme == "https" else 80), proto=socket.IPPROTO_TCP)
+    except socket.gaierror as e:
+        raise ImageFetchError(f"Cannot resolve image host {host}: {e}") from e
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        address = getattr(address, "ipv4_mapped", None) or address
+        if not address.is_global or address.is_multicast:
+            raise ImageFetchError(f"Image host {host} resolves to a non-public address")
+
+
+def _read_limited(chunks, max_bytes: int) -> bytes:
+    body = bytearray()
+    for chunk in chunks:
+        body += chunk
+        if len(body) > max_bytes:
+            raise ImageFetchError(f"Image is larger than {max_bytes} bytes")
+    return bytes(body)
+
+
+def fetch_image(url: str, allow_local: bool = False, max_bytes: int = IMAGE_FETCH_MAX_BYTES) -> bytes:
+    """Download an image over http(s), at most ``max_bytes``; ``allow_local`` (CLI only) also reads local files"""
+    if allow_local and not url.startswith(("http://", "https://")):
+        with open(url, "rb") as f:
+            return _read_limited(iter(lambda: f.read(1 << 20), b""), max_bytes)
+    import httpx
+    with httpx.Client(timeout=IMAGE_FETCH_TIMEOUT, follow_redirects=False) as client:
+        # Redirects are followed by hand so every hop's host is checked
+        for _ in range(IMAGE_FETCH_MAX_REDIRECTS + 1):
+            _check_image_url(url)
+            with client.stream("GET", url) as response:
+                if response.is_redirect:
+                    url = str(response.url.join(response.headers["location"]))
+                    continue
+                response.raise_for_status()
+                length = response.headers.get("content-length", "")
+                if length.isdigit() and int(length) > max_bytes:
+                    raise ImageFetchError(f"Image is larger than {max_bytes} bytes")
+                return _read_limited(response.iter_bytes(), max_bytes)
+    raise ImageFetchError(f"Too many redirects fetching {url}")
+
+
+class EmbeddingModel:
+    """Interface for image embedding models"""
+
+    name = "base"
+    dim = EMBEDDING_DIM
+
+    def embed_batch(self, images: np.ndarray) -> np.ndarray:
+        """(n, size, size, 3) float32 RGB in [0, 1] -> (n, dim) float32 unit vectors"""
+        raise NotImplementedError
+
+
+class ReferenceEmbedder(EmbeddingModel):
+    """CPU-only colour/texture descriptor projected to 384 dimensions"""
+
+    name = "reference"
+    color_bins = 8
+    grid = 4
+    orientations = 8
+
+    def __init__(self, seed: int = 0):
+        features = self.color_bins ** 3 + self.grid * self.grid * (3 + self.orientations)
+        rng = np.random.default_rng(seed)
+        self.projection = (rng.standard_normal((features, self.dim)) / np.sqrt(self.dim)).astype(np.float32)
+
+    def embed_batch(self, images: np.ndarray) -> np.ndarray:
+        n, size = images.shape[0], images.shape[1]
+        cell = size // self.grid
+
+        # Global colour histogram (8x8x8 RGB bins)
+        bins = self.color_bins
+        quantized = np.minimum((images * bins).astype(np.int64), bins - 1)
+        index = (quantized[..., 0] * bins + quantized[..., 1]) * bins + quantized[..., 2]
+        index = index.reshape(n, -1) + (np.arange(n) * bins ** 3)[:, None]
+        color_hist = np.bincount(index.ravel(), minlength=n * bins ** 3).reshape(n, -1).astype(np.float32)
+        color_hist /= size * size
+
+        # Coarse colour layout: mean RGB per grid cell
+        layout = images[:, :cell * self.grid, :cell * self.grid].reshape(n, self.grid, cell, self.grid, cell, 3).mean(axis=(2, 4))
+
+        # Gradient-orientation histogram per grid cell, weighted by magnitude
+        gray = images @ np.asarray([0.299, 0.587, 0.114], dtype=np.float32)
+        gx = np.zeros_like(gray)
+        gy = np.zeros_like(gray)
+        gx[:, :, 1:-1] = gray[:, :, 2:] - gray[:, :, :-2]
+        gy[:, 1:-1, :] = gray[:, 2:, :] - gray[:, :-2, :]
+        magnitude = np.hypot(gx, gy)
+        orientation = np.minimum((np.mod(np.arctan2(gy, gx), np.pi) / np.pi * self.orientations).astype(np.int64), self.orientations - 1)
+        cell_row = np.minimum(np.arange(size) // cell, self.grid - 1)
+        cell_index = cell_row[:, None] * self.grid + cell_row[None, :]
+        slots = self.grid * self.grid * self.orientations
+        index = (cell_index[None] * self.orientations + orientation).reshape(n, -1) + (np.arange(n) * slots)[:, None]
+        texture = np.bincount(index.ravel(), weights=magnitude.ravel(), minlength=n * slots).reshape(n, -1).astype(np.float32)
+        texture /= texture.sum(axis=1, keepdims=True) + 1e-6
+
+        features = np.concatenate([np.sqrt(color_hist), layout.reshape(n, -1), np.sqrt(texture)], axis=1)
+        features -= features.mean(axis=1, keepdims=True)
+        return normalize_rows(features @ self.projection)
+
+
+_MODELS: Dict[str, Callable[[], EmbeddingModel]] = {"reference": ReferenceEmbedder}
+
+
+def register_model(name: str, factory: Callable[[], EmbeddingModel]) -> None:
+    """Make a model selectable through ``EMBEDDING_MODEL``"""
+    _MODELS[name] = factory
+
+
+def create_model(name: str = EMBEDDING_MODEL) -> EmbeddingModel:
+    if name not in _MODELS:
+        raise ValueError(f"Unknown embedding model '{name}' (available: {', '.join(sorted(_MODELS))})")
+    return _MODELS[name]()
+
+
+# Per-process model, loaded once by the pool initializer (or lazily in-process)
+_worker_model: Optional[EmbeddingModel] = None
+
+
+def _init_worker(model_name: str) -> None:
+    global _worker_model
+    _worker_model = create_model(model_name)
+
+
+def _embed_in_worker(images: List[ImageInput], model_name: str) -> np.ndarray:
+    if _worker_model is None:
+        _init_worker(model_name)
+    batch = np.stack([decode_image(image) for image in images])
+    return _worker_model.embed_batch(batch)
+
+
+class MicroBatcher:
+    """Collects concurrent embedding requests into batches for a process pool"""
+
+    def __init__(
+        self,
+        model_name: str = EMBEDDING_MODEL,
+        workers: int = EMBEDDER_WORKERS,
+        max_batch: int = EMBED_MAX_BATCH,
+        max_wait_ms: float = EMBED_MAX_WAIT_MS,
+    ):
+        self.model_name = model_name
+        self.workers = workers
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._in_flight = threading.BoundedSemaphore(max(1, workers) * 2)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.images = 0
+        self.batches = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self._first_submit: Optional[float] = None
+
+    def submit(self, image: ImageInput) -> "Future[np.ndarray]":
+        """Queue one image; the future resolves to its 384-d vector"""
+        self._start()
+        future: "Future[np.ndarray]" = Future()
+        with self._lock:
+            if self._first_submit is None:
+                self._first_submit = time.monotonic()
+        self._queue.put((image, future))
+        return future
+
+    def embed(self, images: List[ImageInput]) -> np.ndarray:
+        """Blocking helper: embed several images through the batcher"""
+        futures = [self.submit(image) for image in images]
+        return np.stack([future.result() for future in futures]) if futures else np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+
+    def embed_url(self, url: str, allow_local: bool = False) -> np.ndarray:
+        """Fetch an image by URL (or, with ``allow_local``, path) and embed it (blocking)"""
+        return self.submit(fetch_image(url, allow_local=allow_local)).result()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            elapsed = time.monotonic() - self._first_submit if self._first_submit else 0.0
+            return {
+                "model": self.model_name,
+                "workers": self.workers,
+                "images": self.images,
+                "batches": self.batches,
+                "failed": self.failed,
+                "mean_batch_size": round(self.images / self.batches, 2) if self.batches else 0.0,
+                "images_per_second": round(self.images / elapsed, 1) if elapsed else 0.0,
+                "model_images_per_second": round(self.images / self.busy_seconds, 1) if self.busy_seconds else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _start(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            if self.workers > 0:
+                # spawn: the server process has threads, which fork would copy in an unknown state
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.model_name,),
+                )
+            self._thread = threading.Thread(target=self._collect, name="embed-batcher", daemon=True)
+            self._thread.start()
+
+    def _collect(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._in_flight.acquire()
+            self._dispatch(batch)
+
+    def _dispatch(self, batch: List[tuple]) -> None:
+        images = [image for image, _ in batch]
+        futures = [future for _, future in batch]
+        started = time.monotonic()
+
+        def finish(result: Optional[np.ndarray], error: Optional[BaseException]) -> None:
+            self._in_flight.release()
+            with self._lock:
+                self.batches += 1
+                self.busy_seconds += time.monotonic() - started
+                if error is None:
+                    self.images += len(futures)
+                else:
+                    self.failed += len(futures)
+            for i, future in enumerate(futures):
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result[i])
+
+        if self._pool is None:
+            try:
+                finish(_embed_in_worker(images, self.model_name), None)
+            except Exception as e:
+                finish(None, e)
+            return
+        try:
+            pool_future = self._pool.submit(_embed_in_worker, images, self.model_name)
+        except Exception as e:
+            finish(None, e)
+            return
+        pool_future.add_done_callback(lambda f: finish(f.result() if f.exception() is None else None, f.exception()))
+
+
+# Global embedder instance
+embedder = MicroBatcher()
+
+
+def synthetic_images(count: int, seed: int = 0) -> List[np.ndarray]:
+    """Random smooth colour fields for benchmarking without image files"""
+    rng = np.random.default_rng(seed)
+    base = rng.random((count, 8, 8, 3), dtype=np.float32)
+    return [np.kron(image, np.ones((EMBED_IMAGE_SIZE // 8, EMBED_IMAGE_SIZE // 8, 1), dtype=np.float32)) for image in base]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Embed images or benchmark the embedding pipeline")
+    parser.add_argument("images", nargs="*", help="Image files or URLs to embed")
+    parser.add_argument("--bench", type=int, default=0, help="Benchmark with this many synthetic images")
+    parser.add_argument("--workers", type=int, default=EMBEDDER_WORKERS)
+    parser.add_argument("--max-batch", type=int, default=EMBED_MAX_BATCH)
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    batcher = MicroBatcher(model_name=args.model, workers=args.workers, max_batch=args.max_batch)
+    if args.bench:
+        images = synthetic_images(args.bench)
+        batcher.embed(images[:args.max_batch])  # warm up the worker processes
+        single_start = time.perf_counter()
+        model = create_model(args.model)
+        for image in images[:64]:
+            model.embed_batch(decode_image(image)[None])
+        single_rate = min(64, len(images)) / (time.perf_counter() - single_start)
+        start = time.perf_counter()
+        batcher.embed(images)
+        rate = len(images) / (time.perf_counter() - start)
+        print(f"one call per image : {single_rate:8.1f} images/sec")
+        print(f"micro-batched      : {rate:8.1f} images/sec ({args.workers} workers, batch <= {args.max_batch})")
+        print(batcher.stats())
+    for path in args.images:
+        vector = batcher.embed_url(path, allow_local=True)
+        print(f"{path}: {np.array2string(vector[:8], precision=4)} ...")
+    batcher.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Compact wire formats for artwork embeddings.
+
+Besides JSON, the embedding routes negotiate two binary formats:
+
+``application/msgpack``
+    The same objects as the JSON API, except ``vector`` is a msgpack ``bin``
+    holding little-endian float32 values (1536 bytes). A plain array of
+    floats is also accepted on input. Requires the optional ``msgpack``
+    package.
+
+``application/octet-stream``
+    A fixed-layout little-endian frame::
+
+        header  : magic b"AEMB" | version u8 | reserved u8 | dim u16 | count u32
+        record  : id 16B (UUID bytes) | artwork_id 16B | created_at i64 (µs since epoch, 0 = unset)
+                  | vector float32[dim]
+
+    Reads return ``count`` records; ``POST``/``PUT`` bodies carry exactly one
+    record (``id`` and ``created_at`` are ignored, ``artwork_id`` is ignored
+    on ``PUT``).
+"""
+import json
+import struct
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+from uuid import UUID
+
+import numpy as np
+from fastapi import HTTPException, Request, Response
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+
+from services.embedding_store import EMBEDDING_DIM, parse_vector
+from services.serialization import FastJSONResponse
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack is optional
+    msgpack = None
+
+MEDIA_JSON = "application/json"
+MEDIA_MSGPACK = "application/msgpack"
+MEDIA_OCTET = "application/octet-stream"
+_MSGPACK_ALIASES = {MEDIA_MSGPACK, "application/x-msgpack"}
+
+FRAME_MAGIC = b"AEMB"
+FRAME_VERSION = 1
+_HEADER = struct.Struct("<4sBBHI")
+_RECORD_PREFIX = struct.Struct("<16s16sq")
+_VECTOR_DTYPE = np.dtype("<f4")
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+# OpenAPI request body description for routes that accept all three formats
+def request_body_openapi(schema_name: str) -> Dict[str, Any]:
+    schema = {"$ref": f"#/components/schemas/{schema_name}"}
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                MEDIA_JSON: {"schema": schema},
+                MEDIA_MSGPACK: {"schema": schema},
+                MEDIA_OCTET: {"schema": {"type": "string", "format": "binary"}},
+            },
+        }
+    }
+
+
+class UnsupportedMediaType(ValueError):
+    """Raised when a request body uses a content type that cannot be decoded"""
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """Pick the response media type from an Accept header (JSON unless a binary type wins)"""
+    if not accept:
+        return MEDIA_JSON
+    best, best_q = MEDIA_JSON, 0.0
+    for part in accept.split(","):
+        media, _, params = part.strip().partition(";")
+        media = media.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if media in _MSGPACK_ALIASES and msgpack is not None:
+            candidate = MEDIA_MSGPACK
+        elif media == MEDIA_OCTET:
+            candidate = MEDIA_OCTET
+        elif media in (MEDIA_JSON, "*/*", "application/*"):
+            candidate = MEDIA_JSON
+        else:
+            continue
+        # Prefer JSON on ties so generic "*/*" clients keep getting JSON
+        if q > best_q or (q == best_q and candidate == MEDIA_JSON):
+            best, best_q = candidate, q
+    return best
+
+
+def _field(item: Any, name: str) -> Any:
+    return item.get(name) if isinstance(item, dict) else getattr(item, name, None)
+
+
+def _uuid_bytes(value: Any) -> bytes:
+    return UUID(str(value)).bytes if value else bytes(16)
+
+
+def _micros(value: Any) -> int:
+    if not value:
+        return 0
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def _vector_bytes(vector: Any) -> bytes:
+    return np.asarray(parse_vector(vector), dtype=_VECTOR_DTYPE).tobytes()
+
+
+def encode_frame(items: Iterable[Any]) -> bytes:
+    """Encode embeddings into an octet-stream frame"""
+    records = [
+        _RECORD_PREFIX.pack(_uuid_bytes(_field(item, "id")), _uuid_bytes(_field(item, "artwork_id")), _micros(_field(item, "created_at")))
+        + _vector_bytes(_field(item, "vector"))
+        for item in items
+    ]
+    return _HEADER.pack(FRAME_MAGIC, FRAME_VERSION, 0, EMBEDDING_DIM, len(records)) + b"".join(records)
+
+
+def decode_frame(body: bytes) -> List[Dict[str, Any]]:
+    """Decode an octet-stream frame into dicts with a float32 ``vector`` array"""
+    if len(body) < _HEADER.size:
+        raise ValueError("Embedding frame is shorter than its header")
+    magic, version, _, dim, count = _HEADER.unpack_from(body)
+    if magic != FRAME_MAGIC or version != FRAME_VERSION:
+        raise ValueError("Not an artwork embedding frame (bad magic or version)")
+    record_size = _RECORD_PREFIX.size + 4 * dim
+    if len(body) != _HEADER.size + count * record_size:
+        raise ValueError(f"Embedding frame length does not match {count} records of {dim} dimensions")
+    records = []
+    for i in range(count):
+        offset = _HEADER.size + i * record_size
+        raw_id, raw_artwork_id, micros = _RECORD_PREFIX.unpack_from(body, offset)
+        vector = np.frombuffer(body, dtype=_VECTOR_DTYPE, count=dim, offset=offset + _RECORD_PREFIX.size)
+        records.append({
+            "id": UUID(bytes=raw_id) if any(raw_id) else None,
+            "artwork_id": UUID(bytes=raw_artwork_id) if any(raw_artwork_id) else None,
+            "created_at": (_EPOCH + micros * _MICROSECOND) if micros else None,
+            "vector": vector,
+        })
+    return records
+
+
+def _msgpack_item(item: Any) -> Dict[str, Any]:
+    created_at = _field(item, "created_at")
+    return {
+        "id": str(_field(item, "id")) if _field(item, "id") else None,
+        "artwork_id": str(_field(item, "artwork_id")) if _field(item, "artwork_id") else None,
+        "created_at": created_at.isoformat() if isinstance(created_at, datetime) else created_at,
+        "vector": _vector_bytes(_field(item, "vector")),
+    }
+
+
+def encode_msgpack(content: Any) -> bytes:
+    """Encode one embedding or a list of embeddings as msgpack with binary vectors"""
+    if isinstance(content, list):
+        return msgpack.packb([_msgpack_item(item) for item in content], use_bin_type=True)
+    return msgpack.packb(_msgpack_item(content), use_bin_type=True)
+
+
+def embedding_response(request: Request, content: Any, status_code: int = 200) -> Response:
+    """Render one embedding or a list of embeddings in the format the client accepts"""
+    media = negotiate(request.headers.get("accept"))
+    if media == MEDIA_MSGPACK:
+        return Response(content=encode_msgpack(content), status_code=status_code, media_type=MEDIA_MSGPACK)
+    if media == MEDIA_OCTET:
+        items = content if isinstance(content, list) else [content]
+        return Response(content=encode_frame(items), status_code=status_code, media_type=MEDIA_OCTET)
+    return FastJSONResponse(content=content, status_code=status_code)
+
+
+async def decode_embedding_body(request: Request) -> Dict[str, Any]:
+    """Decode a POST/PUT body into a dict with ``vector`` (and ``artwork_id`` when present)"""
+    media = request.headers.get("content-type", MEDIA_JSON).split(";")[0].strip().lower()
+    body = await request.body()
+    if media == MEDIA_OCTET:
+        records = decode_frame(body)
+        if len(records) != 1:
+            raise ValueError(f"Expected exactly one embedding record, got {len(records)}")
+        record = records[0]
+        return {"artwork_id": record["artwork_id"], "vector": record["vector"]}
+    if media in _MSGPACK_ALIASES:
+        if msgpack is None:
+            raise UnsupportedMediaType("msgpack support is not installed on this server")
+        data = msgpack.unpackb(body, raw=False)
+        if isinstance(data, dict) and isinstance(data.get("vector"), (bytes, bytearray)):
+            data["vector"] = np.frombuffer(data["vector"], dtype=_VECTOR_DTYPE)
+        return data
+    if media in (MEDIA_JSON, ""):
+        return json.loads(body or b"null")
+    raise UnsupportedMediaType(f"Unsupported content type: {media}")
+
+
+def body_parser(model_cls):
+    """Build a FastAPI dependency that parses a JSON, msgpack or octet-stream embedding body"""
+
+    async def parse(request: Request):
+        try:
+            data = await decode_embedding_body(request)
+        except UnsupportedMediaType as e:
+            raise HTTPException(status_code=415, detail=str(e))
+        except (ValueError, TypeError) as e:
+            raise RequestValidationError([{"type": "value_error", "loc": ("body",), "msg": str(e), "input": None}])
+        if not isinstance(data, dict):
+            raise RequestValidationError([{"type": "dict_type", "loc": ("body",), "msg": "Request body must be an object", "input": None}])
+        vector = data.get("vector")
+        if isinstance(vector, np.ndarray):
+            # Binary vectors arrive as float32 arrays; reject bad shapes and NaN/inf before the model sees them
+            if vector.shape != (EMBEDDING_DIM,):
+                raise RequestValidationError([{"type": "value_error", "loc": ("body", "vector"), "msg": f"Vector must have exactly {EMBEDDING_DIM} dimensions, got {vector.size}", "input": None}])
+            if not np.isfinite(vector).all():
+                raise RequestValidationError([{"type": "value_error", "loc": ("body", "vector"), "msg": "Vector contains non-finite values", "input": None}])
+            data["vector"] = vector.astype(float).tolist()
+        try:
+            return model_cls.model_validate(data)
+        except ValidationError as e:
+            raise RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)])
+
+    return parse
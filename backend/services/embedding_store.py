@@ -0,0 +1,224 @@
+"""
+Shared helpers for loading artwork_embedding vectors into NumPy matrices.
+
+Index builders (PQ, binary, clustering, ...) read vectors either straight from
+the ``artwork_embedding`` table or from an NDJSON export with one
+``{"id", "artwork_id", "vector"}`` object per line. Live indexes subscribe to
+embedding changes so they stay current as rows are written through the CRUD.
+"""
+import json
+import logging
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIM = 384
+EMBEDDING_TABLE = "artwork_embedding"
+
+
+class IndexNotReadyError(RuntimeError):
+    """Raised when an in-memory index is queried before it has been built or loaded"""
+
+
+_upsert_listeners: List[Callable[[Dict[str, Any]], None]] = []
+_delete_listeners: List[Callable[[str], None]] = []
+_listeners_muted = False
+
+
+def parse_vector(raw: Any) -> np.ndarray:
+    """Convert a vector as returned by PostgREST (list or "[...]" string) to float32"""
+    if isinstance(raw, str):
+        raw = json.loads(raw)
+    vector = np.asarray(raw, dtype=np.float32)
+    if vector.shape != (EMBEDDING_DIM,):
+        raise ValueError(f"Vector must have exactly {EMBEDDING_DIM} dimensions, got {vector.size}")
+    return vector
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row so inner product equals cosine similarity"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def iter_table_rows(client, page_size: int = 1000) -> Iterator[Dict[str, Any]]:
+    """Page through the artwork_embedding table"""
+    offset = 0
+    while True:
+        result = (
+            client.table(EMBEDDING_TABLE)
+            .select("id, artwork_id, vector")
+            .order("id")
+            .range(offset, offset + page_size - 1)
+            .execute()
+        )
+        rows = result.data or []
+        yield from rows
+        if len(rows) < page_size:
+            break
+        offset += page_size
+
+
+def iter_ndjson_rows(path) -> Iterator[Dict[str, Any]]:
+    """Read embedding rows from an NDJSON export"""
+    with Path(path).open("r", encoding="utf-8") as handle:
+        for line_number, line in enumerate(handle, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.warning(f"Skipping malformed NDJSON line {line_number} in {path}: {e}")
+
+
+def load_embedding_matrix(rows: Iterable[Dict[str, Any]]) -> Tuple[List[str], List[str], np.ndarray]:
+    """Collect rows into (embedding ids, artwork ids, float32 matrix of shape (n, 384))"""
+    ids: List[str] = []
+    artwork_ids: List[str] = []
+    vectors: List[np.ndarray] = []
+    for row in rows:
+        try:
+            vectors.append(parse_vector(row["vector"]))
+        except (KeyError, ValueError, TypeError) as e:
+            logger.warning(f"Skipping embedding {row.get('id')}: {e}")
+            continue
+        ids.append(str(row["id"]))
+        artwork_ids.append(str(row["artwork_id"]))
+
+    if not vectors:
+        return ids, artwork_ids, np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+    return ids, artwork_ids, np.vstack(vectors)
+
+
+def load_from_source(client=None, ndjson_path: Optional[str] = None, page_size: int = 1000):
+    """Load the embedding matrix from an NDJSON export if given, else from the table"""
+    if ndjson_path:
+        rows = iter_ndjson_rows(ndjson_path)
+    else:
+        if client is None:
+            from database import db_connection
+            client = db_connection.client
+        rows = iter_table_rows(client, page_size=page_size)
+    return load_embedding_matrix(rows)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, best first, without a full sort"""
+    k = min(k, scores.size)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+class IndexedRows:
+    """Embedding ids plus parallel NumPy columns with O(1) upsert and swap-remove.
+
+    Columns are declared as ``name -> (row shape, dtype)`` and grow together by
+    doubling. Callers are responsible for locking.
+    """
+
+    def __init__(self, columns: Dict[str, Tuple[Tuple[int, ...], Any]]):
+        self._specs = columns
+        self.ids: List[str] = []
+        self.artwork_ids: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self._arrays = {name: np.empty((0, *shape), dtype=dtype) for name, (shape, dtype) in columns.items()}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def column(self, name: str) -> np.ndarray:
+        """View of the populated rows of a column"""
+        return self._arrays[name][:len(self.ids)]
+
+    def reset(self, ids: List[str], artwork_ids: List[str], **arrays: np.ndarray) -> None:
+        """Replace the whole contents with bulk-built arrays"""
+        self.ids = [str(i) for i in ids]
+        self.artwork_ids = [str(i) for i in artwork_ids]
+        self.positions = {embedding_id: i for i, embedding_id in enumerate(self.ids)}
+        for name, (shape, dtype) in self._specs.items():
+            self._arrays[name] = np.ascontiguousarray(arrays[name], dtype=dtype).reshape(len(self.ids), *shape)
+
+    def upsert(self, embedding_id: str, artwork_id: str, **values: np.ndarray) -> int:
+        """Insert or overwrite one row and return its position"""
+        position = self.positions.get(embedding_id)
+        if position is None:
+            position = len(self.ids)
+            self._grow(position + 1)
+            self.ids.append(embedding_id)
+            self.artwork_ids.append(artwork_id)
+            self.positions[embedding_id] = position
+        else:
+            self.artwork_ids[position] = artwork_id
+        for name, value in values.items():
+            self._arrays[name][position] = value
+        return position
+
+    def remove(self, embedding_id: str) -> Optional[int]:
+        """Remove a row by moving the last row into its slot; returns the freed position"""
+        position = self.positions.pop(embedding_id, None)
+        if position is None:
+            return None
+        last = len(self.ids) - 1
+        if position != last:
+            for array in self._arrays.values():
+                array[position] = array[last]
+            self.ids[position] = self.ids[last]
+            self.artwork_ids[position] = self.artwork_ids[last]
+            self.positions[self.ids[position]] = position
+        self.ids.pop()
+        self.artwork_ids.pop()
+        return position
+
+    def _grow(self, capacity: int) -> None:
+        for name, array in self._arrays.items():
+            if capacity <= array.shape[0]:
+                continue
+            grown = np.empty((max(capacity, 2 * array.shape[0], 1024), *array.shape[1:]), dtype=array.dtype)
+            grown[:len(self.ids)] = array[:len(self.ids)]
+            self._arrays[name] = grown
+
+
+def on_embedding_upsert(callback: Callable[[Dict[str, Any]], None]) -> None:
+    """Register a callback invoked with the stored row after an embedding is created or updated"""
+    _upsert_listeners.append(callback)
+
+
+def on_embedding_delete(callback: Callable[[str], None]) -> None:
+    """Register a callback invoked with the embedding id after an embedding is deleted"""
+    _delete_listeners.append(callback)
+
+
+def mute_listeners() -> None:
+    """Stop forwarding writes in this process (job workers, whose indexes are never queried)"""
+    global _listeners_muted
+    _listeners_muted = True
+
+
+def notify_embedding_upsert(row: Dict[str, Any]) -> None:
+    """Forward a written embedding row to all registered indexes"""
+    if _listeners_muted:
+        return
+    for callback in _upsert_listeners:
+        try:
+            callback(row)
+        except Exception as e:
+            logger.error(f"Embedding upsert listener {callback.__qualname__} failed: {e}")
+
+
+def notify_embedding_delete(embedding_id: str) -> None:
+    """Forward an embedding deletion to all registered indexes"""
+    if _listeners_muted:
+        return
+    for callback in _delete_listeners:
+        try:
+            callback(str(embedding_id))
+        except Exception as e:
+            logger.error(f"Embedding delete listener {callback.__qualname__} failed: {e}")
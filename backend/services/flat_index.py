@@ -0,0 +1,203 @@
+"""
+Exact in-memory embedding matrix with blocked multi-query scoring.
+
+Holds every artwork embedding as a normalized float32 row so many queries can
+be answered with one ``(Q x d) @ (d x N)`` matrix product. The catalog is
+scanned in row blocks sized so that the ``Q x block`` score matrix stays under
+``BATCH_SCORE_BUDGET_BYTES``; a running top-k per query is merged after each
+block, so memory does not grow with the catalog size.
+
+Snapshot the matrix with:
+
+    python -m services.flat_index [--ndjson embeddings.ndjson]
+"""
+import argparse
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.embedding_store import (
+    EMBEDDING_DIM,
+    IndexedRows,
+    IndexNotReadyError,
+    load_from_source,
+    normalize_rows,
+    on_embedding_delete,
+    on_embedding_upsert,
+    parse_vector,
+)
+from services.settings import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLAT_PATH = Path(os.getenv("FLAT_INDEX_PATH", DATA_DIR / "flat_index.npz"))
+BATCH_SCORE_BUDGET_BYTES = int(os.getenv("BATCH_SCORE_BUDGET_BYTES", str(64 * 1024 * 1024)))
+
+
+def blocked_top_k(
+    queries: np.ndarray,
+    matrix: np.ndarray,
+    k: int,
+    budget_bytes: int = BATCH_SCORE_BUDGET_BYTES,
+    exclude: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k inner products of each query against ``matrix`` rows.
+
+    ``queries`` and ``matrix`` are expected to be L2-normalized. ``exclude``
+    optionally gives, per query, one matrix row to ignore (e.g. the query's
+    own row), or -1 for none. Returns (indices, scores), both of shape
+    (Q, min(k, N)) and sorted best first.
+    """
+    n_queries, n_rows = queries.shape[0], matrix.shape[0]
+    k = min(k, n_rows)
+    best_scores = np.full((n_queries, k), -np.inf, dtype=np.float32)
+    best_indices = np.full((n_queries, k), -1, dtype=np.int64)
+    if k == 0 or n_queries == 0:
+        return best_indices, best_scores
+
+    block_rows = max(k, budget_bytes // (4 * n_queries))
+    for start in range(0, n_rows, block_rows):
+        block = matrix[start:start + block_rows]
+        scores = queries @ block.T
+        if exclude is not None:
+            local = exclude - start
+            hit = (local >= 0) & (local < block.shape[0])
+            scores[np.nonzero(hit)[0], local[hit]] = -np.inf
+
+        merged_scores = np.concatenate([best_scores, scores], axis=1)
+        block_indices = np.broadcast_to(np.arange(start, start + block.shape[0]), scores.shape)
+        merged_indices = np.concatenate([best_indices, block_indices], axis=1)
+        keep = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(merged_scores, keep, axis=1)
+        best_indices = np.take_along_axis(merged_indices, keep, axis=1)
+
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    return np.take_along_axis(best_indices, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+class FlatIndex:
+    """Exact normalized embedding matrix, kept current on insert"""
+
+    def __init__(self, path: Path = DEFAULT_FLAT_PATH):
+        self.path = Path(path)
+        self.rows = self._empty_rows()
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._built = False
+
+    @staticmethod
+    def _empty_rows() -> IndexedRows:
+        return IndexedRows({"vectors": ((EMBEDDING_DIM,), np.float32)})
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def is_ready(self) -> bool:
+        self._ensure_loaded()
+        return self._built
+
+    def build(self, ids: List[str], artwork_ids: List[str], vectors: np.ndarray) -> None:
+        """Replace the matrix with the given vectors"""
+        rows = self._empty_rows()
+        rows.reset(ids, artwork_ids, vectors=normalize_rows(vectors))
+        with self._lock:
+            self.rows = rows
+            self._loaded = True
+            self._built = True
+        logger.info(f"Built flat index with {len(rows)} rows")
+
+    def upsert(self, embedding_id: str, artwork_id: str, vector: np.ndarray) -> None:
+        """Add or replace a single embedding"""
+        if not self.is_ready:
+            return
+        with self._lock:
+            self.rows.upsert(embedding_id, artwork_id, vectors=normalize_rows(vector.reshape(1, -1))[0])
+
+    def upsert_row(self, row: Dict[str, Any]) -> None:
+        """Embedding-store listener: index a freshly written artwork_embedding row"""
+        self.upsert(str(row["id"]), str(row["artwork_id"]), parse_vector(row["vector"]))
+
+    def remove(self, embedding_id: str) -> bool:
+        """Drop an embedding from the matrix"""
+        with self._lock:
+            return self.rows.remove(embedding_id) is not None
+
+    def batch_search(self, query_vectors, limit: int = 10, threshold: float = 0.0) -> List[List[Dict[str, Any]]]:
+        """Exact top-k lists for many query vectors at once"""
+        if not self.is_ready:
+            raise IndexNotReadyError("Flat index is not available - build it with `python -m services.flat_index`")
+        queries = normalize_rows(np.asarray(query_vectors, dtype=np.float32).reshape(-1, EMBEDDING_DIM))
+        with self._lock:
+            indices, scores = blocked_top_k(queries, self.rows.column("vectors"), limit)
+            return [
+                [
+                    {"id": self.rows.ids[i], "artwork_id": self.rows.artwork_ids[i], "similarity": float(score)}
+                    for i, score in zip(row_indices, row_scores)
+                    if i >= 0 and score >= threshold
+                ]
+                for row_indices, row_scores in zip(indices, scores)
+            ]
+
+    def save(self, path: Optional[Path] = None) -> Path:
+        """Persist the matrix and ids to a .npz file"""
+        path = Path(path or self.path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            np.savez(
+                path,
+                vectors=self.rows.column("vectors"),
+                ids=np.asarray(self.rows.ids, dtype=str),
+                artwork_ids=np.asarray(self.rows.artwork_ids, dtype=str),
+            )
+        logger.info(f"Saved flat index to {path}")
+        return path
+
+    def load(self, path: Optional[Path] = None) -> None:
+        """Load a previously saved matrix"""
+        path = Path(path or self.path)
+        with np.load(path) as data:
+            rows = self._empty_rows()
+            rows.reset(list(data["ids"]), list(data["artwork_ids"]), vectors=data["vectors"])
+        with self._lock:
+            self.rows = rows
+            self._loaded = True
+            self._built = True
+        logger.info(f"Loaded flat index with {len(rows)} rows from {path}")
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if self.path.exists():
+            try:
+                self.load()
+            except Exception as e:
+                logger.error(f"Failed to load flat index from {self.path}: {e}")
+
+
+# Global flat index instance
+flat_index = FlatIndex()
+on_embedding_upsert(flat_index.upsert_row)
+on_embedding_delete(flat_index.remove)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Snapshot the exact artwork embedding matrix")
+    parser.add_argument("--ndjson", help="NDJSON export to build from (defaults to the artwork_embedding table)")
+    parser.add_argument("--out", default=str(DEFAULT_FLAT_PATH), help="Output .npz path")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    ids, artwork_ids, vectors = load_from_source(ndjson_path=args.ndjson)
+    index = FlatIndex(path=Path(args.out))
+    index.build(ids, artwork_ids, vectors)
+    index.save()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Conditional HTTP caching for catalog reads.
+
+Artwork and embedding reads carry validators so clients and proxies can
+revalidate instead of downloading the same body again:
+
+* a single row gets a weak ETag derived from its id and ``updated_at`` (or,
+  for embeddings, which have no ``updated_at``, its id, ``created_at`` and a
+  checksum of the vector) plus ``Last-Modified`` when the row has one;
+* a list gets a weak ETag combining the validators of its rows, in order;
+  a count gets one derived from the count.
+
+Every validator is computed from the data alone, never from process state,
+so all API processes and replicas agree on it and a write made anywhere (any
+process, the SQL console) changes it. A 304 therefore still costs the query,
+but saves serializing and sending the body. ``If-None-Match`` always wins
+over ``If-Modified-Since`` (RFC 9110). Responses served from the catalog
+snapshot or the stale-read cache carry no validators at all, so a client
+never pins degraded data.
+
+Route usage::
+
+    artworks = await artwork_crud.get_all_artworks(...)
+    return conditional_response(
+        request, list_etag(artworks), lambda: FastJSONResponse(content=artworks), cache_control=HTTP_CACHE_LIST_CONTROL
+    )
+"""
+import hashlib
+import os
+import zlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Callable, Iterable, Optional
+
+import numpy as np
+from fastapi import Request, Response
+
+from services import request_context
+
+HTTP_CACHE = os.getenv("HTTP_CACHE", "1").lower() not in ("0", "false", "no")
+# Clients may store responses but must revalidate before reuse (a 304 is cheap)
+HTTP_CACHE_CONTROL = os.getenv("HTTP_CACHE_CONTROL", "public, no-cache")
+HTTP_CACHE_LIST_CONTROL = os.getenv("HTTP_CACHE_LIST_CONTROL", HTTP_CACHE_CONTROL)
+
+
+def _weak(*parts: Any) -> str:
+    digest = hashlib.blake2b("|".join(str(part) for part in parts).encode(), digest_size=8).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _timestamp(value: Any) -> Optional[datetime]:
+    """Rows from trusted models may hold ``updated_at`` as the raw ISO string"""
+    if not value:
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _field(item: Any, name: str) -> Any:
+    return item.get(name) if isinstance(item, dict) else getattr(item, name, None)
+
+
+def item_etag(item: Any, *variant: Any) -> str:
+    """Weak ETag for one artwork-like row: id + updated_at (+ e.g. the negotiated media type)"""
+    return _weak(_field(item, "id"), _timestamp(_field(item, "updated_at")), *variant)
+
+
+def embedding_etag(item: Any, *variant: Any) -> str:
+    """Weak ETag for one embedding row; vectors change in place, so they are checksummed"""
+    vector = _field(item, "vector")
+    if isinstance(vector, str):
+        checksum = zlib.crc32(vector.encode())
+    else:
+        checksum = zlib.crc32(np.asarray(vector, dtype=np.float32).tobytes())
+    return _weak(_field(item, "id"), _timestamp(_field(item, "created_at")), checksum, *variant)
+
+
+def list_etag(items: Iterable[Any], *variant: Any, validator: Callable[[Any], str] = item_etag) -> str:
+    """Weak ETag for a list of rows: the rows' own validators in order (plus e.g. the media type)"""
+    return _weak("list", *(validator(item) for item in items), *variant)
+
+
+def count_etag(count: int) -> str:
+    """Weak ETag for a row count"""
+    return _weak("count", count)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison against an If-None-Match list"""
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in header.split(","))
+
+
+def _degraded() -> bool:
+    """Whether this request's data came from the catalog snapshot or the stale-read cache"""
+    metadata = request_context.current()
+    return bool(metadata) and "data_source" in metadata
+
+
+def _headers(etag: Optional[str], last_modified: Optional[datetime], cache_control: str, vary: Optional[str]) -> dict:
+    headers = {"Cache-Control": cache_control}
+    if etag:
+        headers["ETag"] = etag
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+    if vary:
+        headers["Vary"] = vary
+    return headers
+
+
+def not_modified(
+    request: Request,
+    etag: str,
+    last_modified: Any = None,
+    cache_control: str = HTTP_CACHE_LIST_CONTROL,
+    vary: Optional[str] = None,
+) -> Optional[Response]:
+    """A 304 response if the client's validators still match, else None"""
+    if not HTTP_CACHE or _degraded():
+        return None
+    last_modified = _timestamp(last_modified)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        matched = _etag_matches(if_none_match, etag)
+    elif last_modified is not None and request.headers.get("if-modified-since"):
+        try:
+            since = parsedate_to_datetime(request.headers["if-modified-since"])
+        except (TypeError, ValueError):
+            return None
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        # HTTP dates have one-second resolution
+        matched = last_modified.replace(microsecond=0) <= since
+    else:
+        return None
+    if not matched:
+        return None
+    return Response(status_code=304, headers=_headers(etag, last_modified, cache_control, vary))
+
+
+def cacheable(
+    response: Response,
+    etag: str,
+    last_modified: Any = None,
+    cache_control: str = HTTP_CACHE_LIST_CONTROL,
+    vary: Optional[str] = None,
+) -> Response:
+    """Attach validators to a rendered 200 response (skipped when it was served from degraded data)"""
+    if not HTTP_CACHE or _degraded():
+        return response
+    response.headers.update(_headers(etag, _timestamp(last_modified), cache_control, vary))
+    return response
+
+
+def conditional_response(
+    request: Request,
+    etag: str,
+    render: Callable[[], Response],
+    last_modified: Any = None,
+    cache_control: str = HTTP_CACHE_CONTROL,
+    vary: Optional[str] = None,
+) -> Response:
+    """304 if the client's copy is current, otherwise ``render()`` (serialization happens only then)"""
+    unchanged = not_modified(request, etag, last_modified, cache_control, vary)
+    if unchanged is not None:
+        return unchanged
+    return cacheable(render(), etag, last_modified, cache_control, vary)
@@ -0,0 +1,198 @@
+"""
+Background job handlers.
+
+Each ``@job_handler`` runs inside a job worker process (see services/jobs.py).
+The matching ``@on_job_complete`` hook runs in the API process afterwards,
+to load into its in-memory indexes whatever the worker wrote to the
+database or to disk.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from crud.artwork_embedding_crud import artwork_embedding_crud
+from database import db_connection
+from services.binary_index import binary_index
+from services.clustering import style_clusters
+from services.coalescing import invalidate_flights
+from services.coselection import coselection_graph
+from services.dedup import duplicate_index, fetch_artwork_prices
+from services.embedder import embedder
+from services.embedding_store import load_from_source, notify_embedding_upsert
+from services.flat_index import flat_index
+from services.jobs import PRIORITY_BATCH, JobContext, batch_job_handler, job_handler, job_queue, on_job_complete
+from services.neighbours import neighbour_table
+from services.pq_index import pq_index
+from services.room_analysis import DEFAULT_BACKFILL_STEPS, analyze_uploads, validate_steps
+from services.room_analysis import backfill as room_analysis_backfill
+from services.session_stats import session_stats
+from services.snapshot import catalog_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+@batch_job_handler("embed_artwork")
+def embed_artworks(jobs: List[JobContext]) -> List[Any]:
+    """Embed a batch of artworks' images in one model call and store each vector in artwork_embedding"""
+    for job in jobs:
+        job.report(0.0, f"embedding image (batch of {len(jobs)})")
+    embeddings = asyncio.run(artwork_embedding_crud.embed_artwork_images(
+        [(UUID(job.payload["artwork_id"]), job.payload["image_url"]) for job in jobs]
+    ))
+    return [
+        embedding if isinstance(embedding, Exception)
+        else {"embedding_id": str(embedding.id), "artwork_id": str(embedding.artwork_id), "model": embedder.model_name}
+        for embedding in embeddings
+    ]
+
+
+@on_job_complete("embed_artwork")
+def index_artwork_embedding(job: Dict[str, Any]) -> None:
+    """Add the worker's new embedding to the API process's indexes"""
+    # The worker's write bypassed this process's CRUD layer
+    invalidate_flights("artwork_embedding")
+    result = (
+        db_connection.client.table("artwork_embedding")
+        .select("id, artwork_id, vector")
+        .eq("id", job["result"]["embedding_id"])
+        .execute()
+    )
+    for row in result.data or []:
+        notify_embedding_upsert(row)
+
+
+@batch_job_handler("analyze_room_upload")
+def analyze_room_uploads(jobs: List[JobContext]) -> List[Any]:
+    """Decode each room photo once and fill its embedding, palette and lighting (or the requested steps); embeddings share one model call"""
+    for job in jobs:
+        job.report(0.0, f"analysing photo (batch of {len(jobs)})")
+    return asyncio.run(analyze_uploads(
+        [(UUID(job.payload["upload_id"]), job.payload["image_url"], job.payload.get("steps")) for job in jobs]
+    ))
+
+
+def enqueue_room_analysis_backfill(steps: Optional[List[str]] = None, overwrite: bool = False, limit: Optional[int] = None) -> Dict[str, Any]:
+    """Queue a backfill; a request matching one still waiting returns that job"""
+    steps = validate_steps(steps or DEFAULT_BACKFILL_STEPS)
+    return job_queue.enqueue(
+        "backfill_room_analysis",
+        {"steps": steps, "overwrite": overwrite, "limit": limit},
+        priority=PRIORITY_BATCH,
+        dedupe_key=f"backfill_room_analysis:{','.join(steps)}",
+    )
+
+
+@job_handler("backfill_room_analysis")
+def backfill_room_analysis(job: JobContext) -> Dict[str, int]:
+    """Fill palette/lighting (or other step) columns for existing room uploads"""
+    limit = job.payload.get("limit")
+
+    def report(updated: int, failed: int) -> None:
+        job.report((updated + failed) / limit if limit else 0.0, f"{updated} updated, {failed} failed")
+
+    return asyncio.run(room_analysis_backfill(
+        job.payload["steps"], overwrite=job.payload.get("overwrite", False), limit=limit, progress=report
+    ))
+
+
+def _rebuild_flat(matrix) -> None:
+    flat_index.build(*matrix)
+    flat_index.save()
+
+
+def _rebuild_binary(matrix) -> None:
+    binary_index.build(*matrix)
+    binary_index.save()
+
+
+def _rebuild_pq(matrix) -> None:
+    pq_index.build(*matrix)
+    pq_index.save()
+
+
+def _rebuild_clusters(matrix) -> None:
+    style_clusters.build(*matrix)
+    style_clusters.save()
+
+
+def _rebuild_neighbours(matrix) -> None:
+    if not flat_index.is_ready:
+        flat_index.build(*matrix)
+    neighbour_table.rebuild()
+    neighbour_table.save()
+
+
+def _rebuild_duplicates(matrix) -> None:
+    _, artwork_ids, vectors = matrix
+    duplicate_index.detect(artwork_ids, vectors, fetch_artwork_prices())
+    duplicate_index.save()
+
+
+def _rebuild_snapshot(matrix) -> None:
+    catalog_snapshot.refresh()
+
+
+def _rebuild_coselection(matrix) -> None:
+    coselection_graph.rebuild()
+    coselection_graph.save()
+
+
+def _rebuild_session_stats(matrix) -> None:
+    session_stats.rebuild()
+    session_stats.save()
+
+
+# Rebuilt in this order (neighbours read the flat index) and reloaded by the API afterwards
+REINDEX_TARGETS = {
+    "flat": (_rebuild_flat, flat_index),
+    "binary": (_rebuild_binary, binary_index),
+    "pq": (_rebuild_pq, pq_index),
+    "clusters": (_rebuild_clusters, style_clusters),
+    "neighbours": (_rebuild_neighbours, neighbour_table),
+    "duplicates": (_rebuild_duplicates, duplicate_index),
+    "snapshot": (_rebuild_snapshot, catalog_snapshot),
+    "session_stats": (_rebuild_session_stats, session_stats),
+    "coselection": (_rebuild_coselection, coselection_graph),
+}
+# Targets rebuilt from other tables, which don't need the embedding matrix
+TABLE_TARGETS = {"snapshot", "session_stats", "coselection"}
+
+
+def enqueue_reindex(targets: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Queue an index rebuild; a request matching one still waiting returns that job"""
+    unknown = set(targets or ()) - set(REINDEX_TARGETS)
+    if unknown:
+        raise ValueError(f"Unknown reindex targets: {', '.join(sorted(unknown))}")
+    targets = sorted(targets) if targets else None
+    return job_queue.enqueue(
+        "reindex",
+        {"targets": targets},
+        priority=PRIORITY_BATCH,
+        dedupe_key=f"reindex:{','.join(targets or ['all'])}",
+    )
+
+
+@job_handler("reindex")
+def reindex(job: JobContext) -> Dict[str, Any]:
+    """Rebuild the requested in-memory indexes (default: all) from the artwork_embedding table"""
+    requested = job.payload.get("targets") or list(REINDEX_TARGETS)
+    unknown = set(requested) - set(REINDEX_TARGETS)
+    if unknown:
+        raise ValueError(f"Unknown reindex targets: {', '.join(sorted(unknown))}")
+    targets = [name for name in REINDEX_TARGETS if name in requested]
+
+    job.report(0.0, "loading embeddings")
+    matrix = load_from_source() if set(targets) - TABLE_TARGETS else None
+    for n, name in enumerate(targets):
+        job.report(n / len(targets), f"rebuilding {name}")
+        REINDEX_TARGETS[name][0](matrix)
+    return {"rebuilt": targets, "embeddings": len(matrix[0]) if matrix else None}
+
+
+@on_job_complete("reindex")
+def reload_indexes(job: Dict[str, Any]) -> None:
+    """Swap the API process's indexes for the ones the worker just saved"""
+    for name in job["result"]["rebuilt"]:
+        REINDEX_TARGETS[name][1].load()
+    logger.info(f"Reloaded rebuilt indexes: {', '.join(job['result']['rebuilt'])}")
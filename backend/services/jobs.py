@@ -0,0 +1,660 @@
+"""
+Persistent background job queue and worker pool.
+
+CPU-heavy work (image embedding, room photo analysis, index rebuilds) is kept
+out of request handlers: routes enqueue a job into a SQLite database under
+DATA_DIR and return straight away. Worker processes claim jobs highest
+priority first, report progress, and retry failures with exponential backoff.
+Job state survives restarts. A job whose worker died goes back on the queue
+once its lease expires (or straight away when the pool sees the worker exit),
+and fails for good once it is out of attempts. Dead workers are respawned.
+
+Handlers are registered with ``@job_handler(kind)`` in ``services/job_tasks.py``.
+They run in the worker processes. Kinds registered with ``@batch_job_handler``
+instead are claimed up to ``JOB_BATCH_SIZE`` at a time and handled in one
+call (e.g. one model call for many images); each job still completes or
+fails on its own. ``@on_job_complete(kind)`` hooks run in the
+API process after a job succeeds, so in-memory state there (indexes, caches)
+can catch up with what the worker wrote. A job whose hooks never ran (it
+finished while no API process was up) has them replayed when the pool starts.
+
+Run workers outside the API with ``python -m services.jobs worker``.
+"""
+import argparse
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from services.resilience import backoff_delay
+from services.settings import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOB_QUEUE_PATH = Path(os.getenv("JOB_QUEUE_PATH", DATA_DIR / "jobs.sqlite3"))
+# Worker processes started with the API (0 = run `python -m services.jobs worker` separately)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BASE_DELAY = float(os.getenv("JOB_RETRY_BASE_DELAY", "5"))
+JOB_RETRY_MAX_DELAY = float(os.getenv("JOB_RETRY_MAX_DELAY", "300"))
+# A running job whose worker has not reported for this long is handed to another worker
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "600"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))
+# Most jobs of a batch-handled kind claimed together (defaults to the embedder's batch size)
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", os.getenv("EMBED_MAX_BATCH", "32")))
+# A worker that exits sooner than this after starting is respawned with a growing delay
+JOB_WORKER_STABLE_SECONDS = 60.0
+# Finished jobs are deleted after this many days
+JOB_RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", "7"))
+
+# Module whose import registers every handler and completion hook
+JOB_TASK_MODULE = "services.job_tasks"
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+JOB_STATUSES = (QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED)
+
+# Higher runs first: interactive work ahead of backfills and rebuilds
+PRIORITY_INTERACTIVE = 10
+PRIORITY_NORMAL = 0
+PRIORITY_BATCH = -10
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    result TEXT,
+    error TEXT,
+    dedupe_key TEXT,
+    worker TEXT,
+    run_after REAL NOT NULL,
+    lease_expires REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    hooks_ran_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, priority DESC, run_after, created_at);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at);
+CREATE INDEX IF NOT EXISTS jobs_dedupe ON jobs (kind, dedupe_key, status);
+"""
+
+_TIMESTAMPS = ("run_after", "lease_expires", "created_at", "updated_at", "started_at", "finished_at", "hooks_ran_at")
+
+
+class JobContext:
+    """What a handler sees: the job's payload plus a way to report progress"""
+
+    def __init__(self, queue: "JobQueue", job: Dict[str, Any], worker_id: str):
+        self.queue = queue
+        self.id = job["id"]
+        self.kind = job["kind"]
+        self.payload = job["payload"]
+        self.attempt = job["attempts"]
+        self.worker_id = worker_id
+
+    def report(self, progress: float, message: Optional[str] = None) -> None:
+        """Record progress (0.0-1.0); this also renews the job's lease"""
+        self.queue.progress(self.id, self.worker_id, progress, message)
+
+
+_handlers: Dict[str, Callable[[JobContext], Any]] = {}
+_batch_handlers: Dict[str, Callable[[List[JobContext]], List[Any]]] = {}
+_completion_hooks: Dict[str, List[Callable[[Dict[str, Any]], None]]] = {}
+
+
+def job_handler(kind: str):
+    """Register the function that runs jobs of this kind in a worker process"""
+    def register(fn: Callable[[JobContext], Any]):
+        _handlers[kind] = fn
+        return fn
+    return register
+
+
+def batch_job_handler(kind: str):
+    """Register a function that runs several jobs of this kind at once.
+
+    It gets a list of job contexts and returns one entry per job, in order:
+    the job's result, or the exception that failed it.
+    """
+    def register(fn: Callable[[List[JobContext]], List[Any]]):
+        _batch_handlers[kind] = fn
+        return fn
+    return register
+
+
+def on_job_complete(kind: str):
+    """Register a callback run in the API process after a job of this kind succeeds"""
+    def register(fn: Callable[[Dict[str, Any]], None]):
+        _completion_hooks.setdefault(kind, []).append(fn)
+        return fn
+    return register
+
+
+class JobQueue:
+    """SQLite-backed priority queue; safe to share between threads and processes"""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path or DEFAULT_JOB_QUEUE_PATH)
+        self._local = threading.local()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode: claims take an explicit write lock with BEGIN IMMEDIATE
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(_SCHEMA)
+                    self._migrate(conn)
+                    self._initialized = True
+        return conn
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection) -> None:
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if "hooks_ran_at" not in columns:
+            # Queues from before hook tracking: whether their hooks ran is unknown, so don't replay them
+            conn.execute("ALTER TABLE jobs ADD COLUMN hooks_ran_at REAL")
+            conn.execute("UPDATE jobs SET hooks_ran_at = finished_at WHERE status = ?", (SUCCEEDED,))
+
+    @staticmethod
+    def _to_job(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        for field in _TIMESTAMPS:
+            if job[field] is not None:
+                job[field] = datetime.fromtimestamp(job[field], tz=timezone.utc)
+        return job
+
+    def enqueue(
+        self,
+        kind: str,
+        payload: Optional[Dict[str, Any]] = None,
+        priority: int = PRIORITY_NORMAL,
+        max_attempts: Optional[int] = None,
+        dedupe_key: Optional[str] = None,
+        delay: float = 0.0,
+    ) -> Dict[str, Any]:
+        """Add a job; with ``dedupe_key``, an identical job still waiting is returned instead"""
+        conn = self._connect()
+        now = time.time()
+        job_id = str(uuid.uuid4())
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if dedupe_key is not None:
+                existing = conn.execute(
+                    "SELECT * FROM jobs WHERE kind = ? AND dedupe_key = ? AND status = ?",
+                    (kind, dedupe_key, QUEUED),
+                ).fetchone()
+                if existing is not None:
+                    conn.execute("COMMIT")
+                    return self._to_job(existing)
+            conn.execute(
+                """INSERT INTO jobs (id, kind, payload, priority, status, max_attempts, dedupe_key,
+                                     run_after, created_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (job_id, kind, json.dumps(payload or {}, default=str), priority, QUEUED,
+                 max_attempts or JOB_MAX_ATTEMPTS, dedupe_key, now + delay, now, now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        logger.info(f"Enqueued {kind} job {job_id} (priority {priority})")
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (str(job_id),)).fetchone()
+        return self._to_job(row)
+
+    def list(self, status: Optional[str] = None, kind: Optional[str] = None, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """Most recent jobs first, optionally filtered by status and kind"""
+        clauses, params = [], []
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if kind:
+            clauses.append("kind = ?")
+            params.append(kind)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connect().execute(
+            f"SELECT * FROM jobs {where} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+            (*params, limit, offset),
+        ).fetchall()
+        return [self._to_job(row) for row in rows]
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """Number of jobs per kind and status"""
+        counts: Dict[str, Dict[str, int]] = {}
+        for kind, status, n in self._connect().execute("SELECT kind, status, COUNT(*) FROM jobs GROUP BY kind, status"):
+            counts.setdefault(kind, {})[status] = n
+        return counts
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a job that has not started; running and finished jobs are left alone"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if job["status"] != QUEUED:
+            raise ValueError(f"Only queued jobs can be cancelled (job is {job['status']})")
+        now = time.time()
+        self._connect().execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, updated_at = ? WHERE id = ? AND status = ?",
+            (CANCELLED, now, now, str(job_id), QUEUED),
+        )
+        return self.get(job_id)
+
+    def retry(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Put a failed or cancelled job back on the queue with a fresh attempt budget"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if job["status"] not in (FAILED, CANCELLED):
+            raise ValueError(f"Only failed or cancelled jobs can be retried (job is {job['status']})")
+        now = time.time()
+        self._connect().execute(
+            """UPDATE jobs SET status = ?, attempts = 0, progress = 0, error = NULL, message = NULL,
+                              run_after = ?, finished_at = NULL, updated_at = ? WHERE id = ?""",
+            (QUEUED, now, now, str(job_id)),
+        )
+        return self.get(job_id)
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Atomically take the next runnable job, re-queuing any whose lease has expired"""
+        jobs = self.claim_batch(worker_id)
+        return jobs[0] if jobs else None
+
+    def claim_batch(self, worker_id: str, kind: Optional[str] = None, limit: int = 1) -> List[Dict[str, Any]]:
+        """Atomically take up to ``limit`` runnable jobs (of ``kind``, if given), highest priority first"""
+        conn = self._connect()
+        now = time.time()
+        kind_clause, params = ("AND kind = ? ", (kind,)) if kind else ("", ())
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._release(conn, now, "lease_expires < ?", (now,), "lease expired")
+            ids = [row["id"] for row in conn.execute(
+                f"SELECT id FROM jobs WHERE status = ? AND run_after <= ? {kind_clause}"
+                "ORDER BY priority DESC, run_after, created_at LIMIT ?",
+                (QUEUED, now, *params, limit),
+            )]
+            jobs = []
+            for job_id in ids:
+                conn.execute(
+                    """UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, lease_expires = ?,
+                                      started_at = ?, updated_at = ? WHERE id = ?""",
+                    (RUNNING, worker_id, now + JOB_LEASE_SECONDS, now, now, job_id),
+                )
+                jobs.append(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [self._to_job(job) for job in jobs]
+
+    def release_worker(self, worker_id: str) -> None:
+        """Re-queue (or fail, if out of attempts) the jobs held by a worker that has exited"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._release(conn, time.time(), "worker = ?", (worker_id,), "worker exited")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _release(conn: sqlite3.Connection, now: float, where: str, params: Tuple, reason: str) -> None:
+        """Take running jobs matching ``where`` away from their worker, with the same attempt budget as ``fail``"""
+        conn.execute(
+            f"""UPDATE jobs SET status = ?, worker = NULL, lease_expires = NULL, message = ?, updated_at = ?
+                WHERE status = ? AND attempts < max_attempts AND {where}""",
+            (QUEUED, reason, now, RUNNING, *params),
+        )
+        conn.execute(
+            f"""UPDATE jobs SET status = ?, worker = NULL, lease_expires = NULL, error = ? || ' on attempt ' || attempts,
+                                finished_at = ?, updated_at = ? WHERE status = ? AND {where}""",
+            (FAILED, reason, now, now, RUNNING, *params),
+        )
+
+    def progress(self, job_id: str, worker_id: str, progress: float, message: Optional[str] = None) -> None:
+        now = time.time()
+        self._connect().execute(
+            "UPDATE jobs SET progress = ?, message = COALESCE(?, message), lease_expires = ?, updated_at = ? "
+            "WHERE id = ? AND worker = ? AND status = ?",
+            (min(max(float(progress), 0.0), 1.0), message, now + JOB_LEASE_SECONDS, now, job_id, worker_id, RUNNING),
+        )
+
+    def complete(self, job_id: str, worker_id: str, result: Any = None) -> None:
+        now = time.time()
+        self._connect().execute(
+            """UPDATE jobs SET status = ?, progress = 1, result = ?, error = NULL, lease_expires = NULL,
+                              finished_at = ?, updated_at = ? WHERE id = ? AND worker = ? AND status = ?""",
+            (SUCCEEDED, json.dumps(result, default=str), now, now, job_id, worker_id, RUNNING),
+        )
+
+    def fail(self, job_id: str, worker_id: str, error: str, retryable: bool = True) -> str:
+        """Record a failure; the job is re-queued with backoff while attempts remain"""
+        conn = self._connect()
+        now = time.time()
+        job = conn.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if job is None:
+            return FAILED
+        if retryable and job["attempts"] < job["max_attempts"]:
+            delay = backoff_delay(job["attempts"], base=JOB_RETRY_BASE_DELAY, cap=JOB_RETRY_MAX_DELAY)
+            status, run_after, finished_at = QUEUED, now + delay, None
+        else:
+            status, run_after, finished_at = FAILED, now, now
+        conn.execute(
+            """UPDATE jobs SET status = ?, error = ?, run_after = ?, lease_expires = NULL, worker = NULL,
+                              finished_at = ?, updated_at = ? WHERE id = ? AND worker = ? AND status = ?""",
+            (status, error, run_after, finished_at, now, job_id, worker_id, RUNNING),
+        )
+        return status
+
+    def succeeded_since(self, since: float) -> List[Tuple[float, Dict[str, Any]]]:
+        """(finished_at epoch, job) for jobs that succeeded after ``since``, oldest first"""
+        rows = self._connect().execute(
+            "SELECT * FROM jobs WHERE status = ? AND finished_at > ? ORDER BY finished_at",
+            (SUCCEEDED, since),
+        ).fetchall()
+        return [(row["finished_at"], self._to_job(row)) for row in rows]
+
+    def hooks_pending(self, before: float) -> List[Dict[str, Any]]:
+        """Jobs that succeeded before ``before`` without their completion hooks having run, oldest first"""
+        rows = self._connect().execute(
+            "SELECT * FROM jobs WHERE status = ? AND hooks_ran_at IS NULL AND finished_at <= ? ORDER BY finished_at",
+            (SUCCEEDED, before),
+        ).fetchall()
+        return [self._to_job(row) for row in rows]
+
+    def mark_hooks_ran(self, job_id: str) -> None:
+        self._connect().execute("UPDATE jobs SET hooks_ran_at = ? WHERE id = ?", (time.time(), job_id))
+
+    def purge(self, older_than_days: float = JOB_RETENTION_DAYS) -> int:
+        """Delete finished jobs older than the retention period"""
+        cursor = self._connect().execute(
+            "DELETE FROM jobs WHERE status IN (?, ?, ?) AND finished_at < ?",
+            (SUCCEEDED, FAILED, CANCELLED, time.time() - older_than_days * 86400),
+        )
+        return cursor.rowcount
+
+
+def _finish(queue: JobQueue, job: Dict[str, Any], worker_id: str, result: Any, started: float) -> str:
+    """Record a job's outcome (a result, or the exception that failed it) and return its new status"""
+    if isinstance(result, Exception):
+        # ValueError means bad input (missing row, malformed payload): retrying will not help
+        status = queue.fail(job["id"], worker_id, f"{type(result).__name__}: {result}", retryable=not isinstance(result, ValueError))
+        logger.error(f"{job['kind']} job {job['id']} failed on attempt {job['attempts']} ({status}): {result}")
+        return status
+    queue.complete(job["id"], worker_id, result)
+    logger.info(f"{job['kind']} job {job['id']} succeeded in {time.monotonic() - started:.2f}s")
+    return SUCCEEDED
+
+
+def run_job(queue: JobQueue, job: Dict[str, Any], worker_id: str) -> str:
+    """Run one claimed job to completion or failure and return its new status"""
+    if job["kind"] in _batch_handlers:
+        return run_jobs(queue, [job], worker_id)[0]
+    handler = _handlers.get(job["kind"])
+    if handler is None:
+        logger.error(f"No handler registered for {job['kind']} job {job['id']}")
+        return queue.fail(job["id"], worker_id, f"Unknown job kind: {job['kind']}", retryable=False)
+    started = time.monotonic()
+    try:
+        result = handler(JobContext(queue, job, worker_id))
+    except Exception as e:
+        result = e
+    return _finish(queue, job, worker_id, result, started)
+
+
+def run_jobs(queue: JobQueue, jobs: List[Dict[str, Any]], worker_id: str) -> List[str]:
+    """Run claimed jobs of one batch-handled kind in a single handler call; returns each job's new status"""
+    handler = _batch_handlers[jobs[0]["kind"]]
+    started = time.monotonic()
+    try:
+        results = handler([JobContext(queue, job, worker_id) for job in jobs])
+        if len(results) != len(jobs):
+            raise RuntimeError(f"Batch handler returned {len(results)} results for {len(jobs)} jobs")
+    except Exception as e:
+        results = [e] * len(jobs)
+    return [_finish(queue, job, worker_id, result, started) for job, result in zip(jobs, results)]
+
+
+def run_worker(queue: JobQueue, stop_event, worker_id: Optional[str] = None) -> None:
+    """Claim and run jobs until ``stop_event`` is set"""
+    worker_id = worker_id or f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    logger.info(f"Job worker {worker_id} started")
+    while not stop_event.is_set():
+        try:
+            job = queue.claim(worker_id)
+        except sqlite3.Error as e:
+            logger.error(f"Job worker {worker_id} could not claim a job: {e}")
+            job = None
+        if job is None:
+            stop_event.wait(JOB_POLL_INTERVAL)
+            continue
+        if job["kind"] in _batch_handlers and JOB_BATCH_SIZE > 1:
+            # Take whatever else of this kind is waiting, so it shares the handler call
+            try:
+                batch = [job, *queue.claim_batch(worker_id, job["kind"], JOB_BATCH_SIZE - 1)]
+            except sqlite3.Error as e:
+                logger.error(f"Job worker {worker_id} could not claim a batch: {e}")
+                batch = [job]
+            run_jobs(queue, batch, worker_id)
+        else:
+            run_job(queue, job, worker_id)
+    logger.info(f"Job worker {worker_id} stopped")
+
+
+def _worker_process(path: Path, stop_event, worker_id: str) -> None:
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    # Each job worker already is a separate process; the embedder must not spawn a pool of its own
+    os.environ["EMBEDDER_WORKERS"] = "0"
+    from services.embedding_store import mute_listeners
+    # This process's copies of the indexes are never queried; the API process catches up via completion hooks
+    mute_listeners()
+    importlib.import_module(JOB_TASK_MODULE)
+    run_worker(JobQueue(path), stop_event, worker_id)
+
+
+class JobWorkerPool:
+    """Worker processes plus a thread in the API process that runs completion hooks and respawns dead workers"""
+
+    def __init__(self, queue: JobQueue):
+        self.queue = queue
+        self._processes: List[multiprocessing.Process] = []
+        self._worker_ids: List[str] = []
+        self._started: List[float] = []
+        self._crashes: List[int] = []
+        self._respawn_at: List[Optional[float]] = []
+        self._context = multiprocessing.get_context("spawn")
+        # One stop event per worker: a worker killed while waiting on a shared event could leave its lock held
+        self._stops: List[Any] = []
+        self._monitor: Optional[threading.Thread] = None
+        self._monitor_stop = threading.Event()
+        self._since = time.time()
+        self.hooks_run = 0
+        self.restarts = 0
+
+    def start(self, workers: int = JOB_WORKERS) -> None:
+        """Start ``workers`` processes (possibly 0) and the completion monitor"""
+        importlib.import_module(JOB_TASK_MODULE)
+        self.queue.purge()
+        for n in range(workers):
+            self._processes.append(None)
+            self._stops.append(None)
+            self._worker_ids.append("")
+            self._started.append(0.0)
+            self._crashes.append(0)
+            self._respawn_at.append(None)
+            self._spawn(n)
+        self._monitor = threading.Thread(target=self._monitor_loop, name="job-completions", daemon=True)
+        self._monitor.start()
+        logger.info(f"Started {workers} job worker process(es) on {self.queue.path}")
+
+    def _spawn(self, n: int) -> None:
+        worker_id = f"{os.getpid()}-w{n}" + (f"-r{self.restarts}" if self.restarts else "")
+        self._stops[n] = self._context.Event()
+        process = self._context.Process(
+            target=_worker_process,
+            args=(self.queue.path, self._stops[n], worker_id),
+            name=f"job-worker-{n}",
+            daemon=True,
+        )
+        process.start()
+        self._processes[n] = process
+        self._worker_ids[n] = worker_id
+        self._started[n] = time.monotonic()
+        self._respawn_at[n] = None
+
+    def _monitor_loop(self) -> None:
+        try:
+            self.replay_completion_hooks()
+        except Exception as e:
+            logger.error(f"Replaying job completion hooks failed: {e}")
+        while not self._monitor_stop.wait(JOB_POLL_INTERVAL):
+            try:
+                self.supervise()
+                self.run_completion_hooks()
+            except Exception as e:
+                logger.error(f"Job completion monitor failed: {e}")
+
+    def supervise(self) -> None:
+        """Respawn worker processes that exited, handing their jobs back to the queue first"""
+        if self._monitor_stop.is_set():
+            return
+        now = time.monotonic()
+        for n, process in enumerate(self._processes):
+            if process.is_alive():
+                continue
+            if self._respawn_at[n] is None:
+                self.queue.release_worker(self._worker_ids[n])
+                self._crashes[n] = self._crashes[n] + 1 if now - self._started[n] < JOB_WORKER_STABLE_SECONDS else 0
+                self._respawn_at[n] = now + backoff_delay(self._crashes[n], base=1.0, cap=JOB_RETRY_MAX_DELAY)
+                logger.error(
+                    f"Job worker {self._worker_ids[n]} exited with code {process.exitcode}; "
+                    f"restarting it in {self._respawn_at[n] - now:.1f}s"
+                )
+            if now >= self._respawn_at[n]:
+                self.restarts += 1
+                self._spawn(n)
+
+    def run_completion_hooks(self) -> None:
+        """Run API-side hooks for every job that succeeded since the last check"""
+        for finished_at, job in self.queue.succeeded_since(self._since):
+            self._since = finished_at
+            self._run_hooks(job)
+
+    def replay_completion_hooks(self) -> None:
+        """Run the hooks of jobs that succeeded before this pool started and were never handled"""
+        jobs = self.queue.hooks_pending(self._since)
+        if jobs:
+            logger.info(f"Replaying completion hooks for {len(jobs)} job(s) finished while no API process was running")
+        for job in jobs:
+            self._run_hooks(job)
+
+    def _run_hooks(self, job: Dict[str, Any]) -> None:
+        for hook in _completion_hooks.get(job["kind"], ()):
+            try:
+                hook(job)
+                self.hooks_run += 1
+            except Exception as e:
+                logger.error(f"Completion hook {hook.__qualname__} for job {job['id']} failed: {e}")
+        # Recorded once any API process has handled the job; others see its effects when they load from disk
+        self.queue.mark_hooks_ran(job["id"])
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._monitor_stop.set()
+        if self._monitor is not None:
+            # So it cannot respawn a worker that is being stopped
+            self._monitor.join(timeout)
+        for stop, process in zip(self._stops, self._processes):
+            if process.is_alive():
+                stop.set()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        self._stops = []
+        self._worker_ids = []
+        self._started, self._crashes, self._respawn_at = [], [], []
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self._processes),
+            "alive": sum(process.is_alive() for process in self._processes),
+            "restarts": self.restarts,
+            "completion_hooks_run": self.hooks_run,
+            "jobs": self.queue.counts(),
+        }
+
+
+# Global job queue and worker pool instances
+job_queue = JobQueue()
+job_workers = JobWorkerPool(job_queue)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run background job workers or inspect the job queue")
+    commands = parser.add_subparsers(dest="command", required=True)
+    worker = commands.add_parser("worker", help="Run job workers in the foreground")
+    worker.add_argument("--workers", type=int, default=max(JOB_WORKERS, 1), help="Worker processes")
+    reindex = commands.add_parser("reindex", help="Enqueue a full re-index job")
+    reindex.add_argument("targets", nargs="*", help="Indexes to rebuild (default: all)")
+    commands.add_parser("status", help="Print job counts per kind and status")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "worker":
+        context = multiprocessing.get_context("spawn")
+        stop = context.Event()
+        processes = [
+            context.Process(target=_worker_process, args=(job_queue.path, stop, f"{os.getpid()}-w{n}"))
+            for n in range(args.workers)
+        ]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            stop.set()
+            for process in processes:
+                process.join()
+    elif args.command == "reindex":
+        job = importlib.import_module(JOB_TASK_MODULE).enqueue_reindex(args.targets or None)
+        print(job["id"])
+    else:
+        print(json.dumps(job_queue.counts(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Vectorized k-means used by the index builders
+"""
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def squared_distances(points: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Pairwise squared Euclidean distances, shape (n_points, n_centroids)"""
+    points_sq = np.einsum("ij,ij->i", points, points)[:, None]
+    centroids_sq = np.einsum("ij,ij->i", centroids, centroids)[None, :]
+    distances = points_sq - 2.0 * (points @ centroids.T) + centroids_sq
+    np.maximum(distances, 0.0, out=distances)
+    return distances
+
+
+def kmeans_plus_plus(points: np.ndarray, k: int, rng: np.random.Generator, weights: Optional[np.ndarray] = None) -> np.ndarray:
+    """Pick k initial centroids with k-means++ seeding (optionally weighting each point)"""
+    n = points.shape[0]
+    centroids = np.empty((k, points.shape[1]), dtype=points.dtype)
+    centroids[0] = points[rng.choice(n, p=weights / weights.sum()) if weights is not None else rng.integers(n)]
+    closest = squared_distances(points, centroids[:1])[:, 0]
+    for i in range(1, k):
+        mass = closest if weights is None else closest * weights
+        total = mass.sum()
+        if total <= 0:
+            centroids[i:] = points[rng.integers(n, size=k - i)]
+            break
+        index = rng.choice(n, p=mass / total)
+        centroids[i] = points[index]
+        np.minimum(closest, squared_distances(points, centroids[i:i + 1])[:, 0], out=closest)
+    return centroids
+
+
+def kmeans(
+    points: np.ndarray,
+    k: int,
+    max_iter: int = 25,
+    tol: float = 1e-4,
+    seed: Optional[int] = 0,
+    weights: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Lloyd's k-means with k-means++ init and early stopping.
+
+    Returns (centroids, labels). When there are fewer points than clusters the
+    points themselves are used as centroids and the remaining slots are padded
+    with repeats so callers always get exactly k rows.
+    """
+    points = np.asarray(points, dtype=np.float32)
+    n = points.shape[0]
+    if n == 0:
+        raise ValueError("Cannot run k-means on an empty point set")
+    rng = np.random.default_rng(seed)
+
+    if n <= k:
+        centroids = points[np.arange(k) % n].copy()
+        return centroids, np.arange(n)
+
+    centroids = kmeans_plus_plus(points, k, rng, weights)
+    labels = np.zeros(n, dtype=np.int64)
+    for iteration in range(max_iter):
+        labels = squared_distances(points, centroids).argmin(axis=1)
+        counts = np.bincount(labels, weights=weights, minlength=k).astype(np.float32)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, points if weights is None else points * weights[:, None])
+        empty = counts == 0
+        new_centroids = sums / np.maximum(counts, 1e-12)[:, None]
+        # Re-seed empty clusters from random points instead of letting them collapse
+        if empty.any():
+            new_centroids[empty] = points[rng.integers(n, size=int(empty.sum()))]
+        shift = float(np.square(new_centroids - centroids).sum())
+        centroids = new_centroids.astype(np.float32)
+        if shift <= tol:
+            logger.debug(f"k-means converged after {iteration + 1} iterations")
+            break
+    labels = squared_distances(points, centroids).argmin(axis=1)
+    return centroids, labels
+
+
+def minibatch_kmeans(
+    points: np.ndarray,
+    k: int,
+    batch_size: int = 4096,
+    max_iter: int = 100,
+    tol: float = 1e-5,
+    seed: Optional[int] = 0,
+    init: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Mini-batch k-means (Sculley, 2010) for catalogs too large for full Lloyd passes.
+
+    Each step assigns a random batch to its nearest centroids and moves every
+    centroid towards its batch members with a per-centroid learning rate of
+    1 / (points seen so far). ``init`` warm-starts from existing centroids.
+    Returns the centroids; assign labels with ``assign``.
+    """
+    points = np.asarray(points, dtype=np.float32)
+    n = points.shape[0]
+    if n == 0:
+        raise ValueError("Cannot run k-means on an empty point set")
+    rng = np.random.default_rng(seed)
+    if init is not None:
+        centroids = np.array(init, dtype=np.float32)
+    elif n <= k:
+        return points[np.arange(k) % n].copy()
+    else:
+        sample = points[rng.choice(n, size=min(n, max(batch_size, 10 * k)), replace=False)]
+        centroids = kmeans_plus_plus(sample, k, rng)
+
+    counts = np.zeros(k, dtype=np.float64)
+    for iteration in range(max_iter):
+        batch = points[rng.integers(n, size=min(batch_size, n))]
+        labels = squared_distances(batch, centroids).argmin(axis=1)
+        previous = centroids.copy()
+        batch_counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, batch)
+        counts += batch_counts
+        touched = batch_counts > 0
+        rate = (batch_counts[touched] / counts[touched]).astype(np.float32)[:, None]
+        centroids[touched] = (1 - rate) * centroids[touched] + rate * (sums[touched] / batch_counts[touched][:, None])
+        if float(np.square(centroids - previous).sum()) <= tol:
+            logger.debug(f"Mini-batch k-means converged after {iteration + 1} iterations")
+            break
+    return centroids
+
+
+def assign(points: np.ndarray, centroids: np.ndarray, batch_size: int = 65536) -> np.ndarray:
+    """Nearest-centroid labels, computed in batches to bound memory"""
+    labels = np.empty(points.shape[0], dtype=np.int64)
+    for start in range(0, points.shape[0], batch_size):
+        labels[start:start + batch_size] = squared_distances(points[start:start + batch_size], centroids).argmin(axis=1)
+    return labels
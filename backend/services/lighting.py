@@ -0,0 +1,143 @@
+"""
+Lighting estimation for room photos.
+
+Fills room_upload.lighting_json (LightingData) from the photo itself, working
+on the same downscaled copy as palette extraction. Every step is a
+whole-array NumPy operation.
+
+- brightness: mean CIE lightness L* / 100. A luminance histogram, contrast,
+  and shadow and highlight shares are reported alongside it.
+- temperature: a grey-world white-balance estimate over the mid-to-bright,
+  unclipped pixels, converted to a correlated colour temperature (McCamy).
+  sRGB's own white (D65, about 6500 K) means no colour cast, so the bands sit
+  around it: below WARM_BELOW_K is warm, above COOL_ABOVE_K is cool.
+- natural_light: a heuristic score built from four signals. Windows and
+  daylit surfaces show up as sizeable near-white highlights, those
+  highlights are daylight-coloured, they sit in the upper part of the
+  frame, and the overall contrast is high.
+
+Benchmark with ``python -m services.lighting --bench``.
+"""
+import argparse
+import logging
+import os
+import time
+from typing import Any, Dict
+
+import numpy as np
+
+from services.embedder import fetch_image
+from services.photo import ImageInput, RGB_TO_XYZ, benchmark_inputs, decode_photo, lightness, linear_to_xyz, srgb_to_linear
+
+logger = logging.getLogger(__name__)
+
+# Longest side, in pixels, that photos are reduced to before analysis
+LIGHTING_SAMPLE_SIDE = int(os.getenv("LIGHTING_SAMPLE_SIDE", "128"))
+LIGHTING_HISTOGRAM_BINS = 16
+WARM_BELOW_K = float(os.getenv("LIGHTING_WARM_BELOW_K", "5600"))
+COOL_ABOVE_K = float(os.getenv("LIGHTING_COOL_ABOVE_K", "7000"))
+# L* at or above which a pixel counts as a highlight (window, sunlit wall); at or below, a shadow
+HIGHLIGHT_LIGHTNESS = 90.0
+SHADOW_LIGHTNESS = 10.0
+# Correlated colour temperature of daylight-lit highlights
+DAYLIGHT_K = 5000.0
+NATURAL_LIGHT_THRESHOLD = 0.6
+
+
+def correlated_color_temperature(xyz: np.ndarray) -> float:
+    """CIE XYZ -> correlated colour temperature in kelvin (McCamy's approximation)"""
+    total = float(np.sum(xyz))
+    if total <= 0:
+        return 6500.0
+    x, y = xyz[0] / total, xyz[1] / total
+    n = (x - 0.3320) / (0.1858 - y)
+    return float(np.clip(449 * n ** 3 + 3525 * n ** 2 + 6823.3 * n + 5520.33, 1000.0, 25000.0))
+
+
+def classify_temperature(kelvin: float) -> str:
+    if kelvin < WARM_BELOW_K:
+        return "warm"
+    if kelvin > COOL_ABOVE_K:
+        return "cool"
+    return "neutral"
+
+
+def analyze_lighting(image: ImageInput, max_side: int = LIGHTING_SAMPLE_SIDE) -> Dict[str, Any]:
+    """Lighting of a photo in lighting_json form (LightingData fields plus the measurements behind them)"""
+    rgb = decode_photo(image, max_side=max_side)
+    if rgb.size == 0:
+        raise ValueError("Image has no pixels")
+    linear = srgb_to_linear(rgb)
+    lstar = lightness(linear @ RGB_TO_XYZ[1])
+
+    histogram = np.bincount(
+        np.minimum((lstar * (LIGHTING_HISTOGRAM_BINS / 100.0)).astype(np.int64), LIGHTING_HISTOGRAM_BINS - 1).ravel(),
+        minlength=LIGHTING_HISTOGRAM_BINS,
+    ) / lstar.size
+    p5, p50, p95 = np.percentile(lstar, [5, 50, 95])
+    contrast = (p95 - p5) / 100.0
+
+    # Grey world over mid-to-bright pixels: shadows are noisy and clipped pixels have lost their colour
+    unclipped = rgb.max(axis=-1) < 0.98
+    balance = (lstar >= p50) & unclipped
+    if balance.sum() < 16:
+        balance = np.ones_like(lstar, dtype=bool)
+    kelvin = correlated_color_temperature(linear_to_xyz(linear[balance].mean(axis=0)))
+
+    highlights = lstar >= HIGHLIGHT_LIGHTNESS
+    highlight_share = float(highlights.mean())
+    if highlights.sum() >= 16:
+        highlight_kelvin = correlated_color_temperature(linear_to_xyz(linear[highlights].mean(axis=0)))
+        upper_share = float(highlights[: highlights.shape[0] * 2 // 3].sum() / highlights.sum())
+    else:
+        highlight_kelvin, upper_share = kelvin, 0.0
+    score = (
+        0.45 * min(highlight_share / 0.05, 1.0)
+        + 0.25 * float(highlight_kelvin >= DAYLIGHT_K)
+        + 0.15 * float(upper_share >= 0.6)
+        + 0.15 * min(contrast / 0.6, 1.0)
+    )
+
+    return {
+        "brightness": round(float(np.clip(lstar.mean() / 100.0, 0.0, 1.0)), 3),
+        "temperature": classify_temperature(kelvin),
+        "natural_light": bool(score >= NATURAL_LIGHT_THRESHOLD),
+        "color_temperature_k": int(round(kelvin)),
+        "natural_light_score": round(float(score), 3),
+        "contrast": round(float(contrast), 3),
+        "highlights": round(highlight_share, 4),
+        "shadows": round(float((lstar <= SHADOW_LIGHTNESS).mean()), 4),
+        "histogram": [round(float(v), 4) for v in histogram],
+    }
+
+
+def analyze_lighting_url(image_url: str, allow_local: bool = False, **kwargs) -> Dict[str, Any]:
+    return analyze_lighting(fetch_image(image_url, allow_local=allow_local), **kwargs)
+
+
+def _benchmark(runs: int) -> None:
+    for name, image in benchmark_inputs():
+        analyze_lighting(image)
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            analyze_lighting(image)
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"{name:>5} 12 MP: median {np.median(timings):.1f} ms, p95 {np.percentile(timings, 95):.1f} ms over {runs} runs")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Estimate room photo lighting")
+    parser.add_argument("images", nargs="*", help="Image files or URLs")
+    parser.add_argument("--bench", type=int, default=0, help="Benchmark with this many runs on a synthetic 12 MP photo")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.bench:
+        _benchmark(args.bench)
+    for image in args.images:
+        print(image, analyze_lighting_url(image, allow_local=True))
+
+
+if __name__ == "__main__":
+    main()
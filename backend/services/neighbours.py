@@ -0,0 +1,299 @@
+"""
+Precomputed "more like this" neighbour lists per artwork.
+
+For every artwork the top ``NEIGHBOUR_COUNT`` most similar artworks (by cosine
+similarity of their embeddings) are stored in fixed-width arrays, so serving a
+list is a dict lookup plus a slice. The full table is computed in blocked
+batches over the exact embedding matrix (``services.flat_index``). After that
+it is refreshed incrementally:
+
+* a new or changed embedding gets its own list computed with one
+  matrix-vector product, and is inserted into every other list whose current
+  worst neighbour it beats;
+* lists that referenced a deleted or changed artwork are recomputed.
+
+Rebuild and persist the full table with:
+
+    python -m services.neighbours
+"""
+import argparse
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+
+from services.embedding_store import (
+    IndexNotReadyError,
+    load_from_source,
+    on_embedding_delete,
+    on_embedding_upsert,
+)
+from services.flat_index import blocked_top_k, flat_index
+from services.settings import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NEIGHBOURS_PATH = Path(os.getenv("NEIGHBOURS_PATH", DATA_DIR / "neighbours.npz"))
+NEIGHBOUR_COUNT = int(os.getenv("NEIGHBOUR_COUNT", "20"))
+REBUILD_QUERY_BLOCK = 1024
+
+
+class NeighbourTable:
+    """Top-k similar artworks per artwork with O(1) lookup and incremental refresh"""
+
+    def __init__(self, k: int = NEIGHBOUR_COUNT, path: Path = DEFAULT_NEIGHBOURS_PATH):
+        self.k = k
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._reset(0)
+
+    def _reset(self, capacity: int) -> None:
+        # Slots are stable per artwork; deleted artworks leave a tombstone (None)
+        self._artwork_ids: List[Optional[str]] = []
+        self._slots: Dict[str, int] = {}
+        self._neighbours = np.full((capacity, self.k), -1, dtype=np.int32)
+        self._scores = np.full((capacity, self.k), -np.inf, dtype=np.float32)
+        self._referenced_by: Dict[int, Set[int]] = {}
+        self._embedding_artwork: Dict[str, str] = {}
+        self._flat_rows = None
+        self._flat_slots = np.empty(0, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    @property
+    def is_ready(self) -> bool:
+        self._ensure_loaded()
+        return len(self._slots) > 0
+
+    def get_similar(self, artwork_id: str, limit: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+        """Precomputed neighbours of an artwork, or None if it has no list"""
+        self._ensure_loaded()
+        with self._lock:
+            slot = self._slots.get(str(artwork_id))
+            if slot is None:
+                return None
+            neighbours = self._neighbours[slot, :limit or self.k]
+            scores = self._scores[slot, :limit or self.k]
+            return [
+                {"artwork_id": self._artwork_ids[n], "similarity": float(score)}
+                for n, score in zip(neighbours, scores)
+                if n >= 0
+            ]
+
+    def rebuild(self) -> None:
+        """Compute every neighbour list from the exact embedding matrix"""
+        if not flat_index.is_ready:
+            raise IndexNotReadyError("Flat index is not available - build it with `python -m services.flat_index`")
+        with flat_index._lock:
+            matrix = flat_index.rows.column("vectors").copy()
+            artwork_ids = list(flat_index.rows.artwork_ids)
+            embedding_ids = list(flat_index.rows.ids)
+
+        with self._lock:
+            self._reset(len(artwork_ids))
+            slots = np.array([self._slot_for(a) for a in artwork_ids], dtype=np.int32)
+            self._embedding_artwork = dict(zip(embedding_ids, artwork_ids))
+            for start in range(0, matrix.shape[0], REBUILD_QUERY_BLOCK):
+                queries = matrix[start:start + REBUILD_QUERY_BLOCK]
+                own = np.arange(start, start + queries.shape[0])
+                indices, scores = blocked_top_k(queries, matrix, self.k, exclude=own)
+                for row, position in enumerate(own):
+                    valid = (indices[row] >= 0) & np.isfinite(scores[row])
+                    self._set_row(slots[position], slots[indices[row][valid]], scores[row][valid])
+        logger.info(f"Rebuilt neighbour lists for {len(self._slots)} artworks (k={self.k})")
+
+    def refresh_embedding(self, row: Dict[str, Any]) -> None:
+        """Embedding-store listener: refresh only the lists affected by a written embedding"""
+        if not self.is_ready or not flat_index.is_ready:
+            return
+        embedding_id, artwork_id = str(row["id"]), str(row["artwork_id"])
+        with flat_index._lock, self._lock:
+            position = flat_index.rows.positions.get(embedding_id)
+            if position is None:
+                return
+            matrix = flat_index.rows.column("vectors")
+            flat_slots = self._slots_for_flat_rows()
+            slot = flat_slots[position]
+            self._embedding_artwork[embedding_id] = artwork_id
+
+            # Lists that pointed at the old vector may no longer be valid
+            dirty = set(self._referenced_by.get(slot, ()))
+
+            similarities = matrix @ matrix[position]
+            similarities[position] = -np.inf
+            indices, scores = blocked_top_k(matrix[position:position + 1], matrix, self.k, exclude=np.array([position]))
+            valid = (indices[0] >= 0) & np.isfinite(scores[0])
+            self._set_row(slot, flat_slots[indices[0][valid]], scores[0][valid])
+
+            # Insert into every list whose worst neighbour this artwork now beats
+            floors = self._scores[flat_slots, self.k - 1]
+            for other in np.nonzero(similarities > floors)[0]:
+                other_slot = flat_slots[other]
+                if other_slot not in dirty:
+                    self._insert_neighbour(other_slot, slot, float(similarities[other]))
+
+            dirty.discard(slot)
+            self._recompute(dirty, matrix, flat_slots)
+
+    def remove_embedding(self, embedding_id: str) -> None:
+        """Embedding-store listener: drop an artwork and recompute lists that referenced it"""
+        if not self.is_ready:
+            return
+        with flat_index._lock, self._lock:
+            artwork_id = self._embedding_artwork.pop(str(embedding_id), None)
+            slot = self._slots.pop(artwork_id, None) if artwork_id else None
+            if slot is None:
+                return
+            self._artwork_ids[slot] = None
+            self._clear_row(slot)
+            dirty = self._referenced_by.pop(slot, set())
+            self._flat_rows = None
+            if flat_index.is_ready:
+                self._recompute(dirty, flat_index.rows.column("vectors"), self._slots_for_flat_rows())
+
+    def save(self, path: Optional[Path] = None) -> Path:
+        """Persist the neighbour arrays to a .npz file"""
+        path = Path(path or self.path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            size = len(self._artwork_ids)
+            np.savez(
+                path,
+                artwork_ids=np.asarray([a or "" for a in self._artwork_ids], dtype=str),
+                neighbours=self._neighbours[:size],
+                scores=self._scores[:size],
+                embedding_ids=np.asarray(list(self._embedding_artwork.keys()), dtype=str),
+                embedding_artwork_ids=np.asarray(list(self._embedding_artwork.values()), dtype=str),
+            )
+        logger.info(f"Saved neighbour lists to {path}")
+        return path
+
+    def load(self, path: Optional[Path] = None) -> None:
+        """Load previously saved neighbour arrays"""
+        path = Path(path or self.path)
+        with np.load(path) as data, self._lock:
+            neighbours = data["neighbours"]
+            self.k = neighbours.shape[1]
+            self._reset(0)
+            self._artwork_ids = [str(a) or None for a in data["artwork_ids"]]
+            self._slots = {a: i for i, a in enumerate(self._artwork_ids) if a}
+            self._neighbours = neighbours.astype(np.int32)
+            self._scores = data["scores"].astype(np.float32)
+            self._embedding_artwork = dict(zip(map(str, data["embedding_ids"]), map(str, data["embedding_artwork_ids"])))
+            for slot, row in enumerate(self._neighbours):
+                for neighbour in row[row >= 0]:
+                    self._referenced_by.setdefault(int(neighbour), set()).add(slot)
+            self._loaded = True
+        logger.info(f"Loaded neighbour lists for {len(self._slots)} artworks from {path}")
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if self.path.exists():
+            try:
+                self.load()
+            except Exception as e:
+                logger.error(f"Failed to load neighbour lists from {self.path}: {e}")
+
+    def _slot_for(self, artwork_id: str) -> int:
+        slot = self._slots.get(artwork_id)
+        if slot is None:
+            slot = len(self._artwork_ids)
+            self._artwork_ids.append(artwork_id)
+            self._slots[artwork_id] = slot
+            if slot >= self._neighbours.shape[0]:
+                capacity = max(slot + 1, 2 * self._neighbours.shape[0], 1024)
+                neighbours = np.full((capacity, self.k), -1, dtype=np.int32)
+                scores = np.full((capacity, self.k), -np.inf, dtype=np.float32)
+                neighbours[:slot] = self._neighbours[:slot]
+                scores[:slot] = self._scores[:slot]
+                self._neighbours, self._scores = neighbours, scores
+        return slot
+
+    def _slots_for_flat_rows(self) -> np.ndarray:
+        """Map flat-index row positions to neighbour slots (cached; extended on append)"""
+        rows = flat_index.rows
+        cached = self._flat_slots
+        if self._flat_rows is rows and cached.size == len(rows):
+            return cached
+        if self._flat_rows is rows and cached.size == len(rows) - 1:
+            self._flat_slots = np.append(cached, np.int32(self._slot_for(rows.artwork_ids[-1])))
+        else:
+            self._flat_slots = np.fromiter((self._slot_for(a) for a in rows.artwork_ids), dtype=np.int32, count=len(rows))
+            self._flat_rows = rows
+        return self._flat_slots
+
+    def _set_row(self, slot: int, neighbour_slots: np.ndarray, scores: np.ndarray) -> None:
+        self._clear_row(slot)
+        count = min(len(neighbour_slots), self.k)
+        self._neighbours[slot, :count] = neighbour_slots[:count]
+        self._scores[slot, :count] = scores[:count]
+        for neighbour in neighbour_slots[:count]:
+            self._referenced_by.setdefault(int(neighbour), set()).add(slot)
+
+    def _clear_row(self, slot: int) -> None:
+        for neighbour in self._neighbours[slot]:
+            if neighbour >= 0:
+                self._referenced_by.get(int(neighbour), set()).discard(slot)
+        self._neighbours[slot] = -1
+        self._scores[slot] = -np.inf
+
+    def _insert_neighbour(self, slot: int, neighbour: int, score: float) -> None:
+        row_neighbours, row_scores = self._neighbours[slot], self._scores[slot]
+        existing = np.nonzero(row_neighbours == neighbour)[0]
+        if existing.size:
+            return
+        position = int(np.searchsorted(-row_scores, -score, side="right"))
+        evicted = int(row_neighbours[-1])
+        if evicted >= 0:
+            self._referenced_by.get(evicted, set()).discard(slot)
+        row_neighbours[position + 1:] = row_neighbours[position:-1].copy()
+        row_scores[position + 1:] = row_scores[position:-1].copy()
+        row_neighbours[position] = neighbour
+        row_scores[position] = score
+        self._referenced_by.setdefault(neighbour, set()).add(slot)
+
+    def _recompute(self, dirty: Set[int], matrix: np.ndarray, flat_slots: np.ndarray) -> None:
+        """Recompute the lists of the given slots in one blocked batch"""
+        if not dirty:
+            return
+        slot_to_position = {int(s): p for p, s in enumerate(flat_slots)}
+        positions = np.array([slot_to_position[s] for s in dirty if s in slot_to_position], dtype=np.int64)
+        if positions.size == 0:
+            return
+        indices, scores = blocked_top_k(matrix[positions], matrix, self.k, exclude=positions)
+        for row, position in enumerate(positions):
+            valid = (indices[row] >= 0) & np.isfinite(scores[row])
+            self._set_row(int(flat_slots[position]), flat_slots[indices[row][valid]], scores[row][valid])
+        logger.info(f"Recomputed {positions.size} neighbour lists")
+
+
+# Global neighbour table instance (registered after flat_index so it sees fresh vectors)
+neighbour_table = NeighbourTable()
+on_embedding_upsert(neighbour_table.refresh_embedding)
+on_embedding_delete(neighbour_table.remove_embedding)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild precomputed artwork neighbour lists")
+    parser.add_argument("--ndjson", help="NDJSON export to build from (defaults to the flat index snapshot or the table)")
+    parser.add_argument("--k", type=int, default=NEIGHBOUR_COUNT, help="Neighbours stored per artwork")
+    parser.add_argument("--out", default=str(DEFAULT_NEIGHBOURS_PATH), help="Output .npz path")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.ndjson or not flat_index.is_ready:
+        flat_index.build(*load_from_source(ndjson_path=args.ndjson))
+    table = NeighbourTable(k=args.k, path=Path(args.out))
+    table.rebuild()
+    table.save()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Dominant-colour palette extraction for room photos.
+
+The photo is downsampled (see services/photo.py), converted to CIELAB and
+binned. A weighted k-means over the occupied bins then finds the dominant
+colours, each weighted by its share of the pixels, and clusters the eye
+could not tell apart are merged. Distances in Lab track
+perceived colour difference, so clusters match what a person would call
+"the same colour" far better than RGB clusters do.
+
+The clusters are mapped onto the PaletteData roles:
+
+- primary: the largest share
+- accent: the most saturated of the rest
+- neutral: the least saturated of the rest
+- secondary: the largest of what is left
+
+All clusters are also returned under ``colors``.
+
+Benchmark with ``python -m services.palette --bench``. Existing uploads are
+backfilled through services/room_analysis.py.
+"""
+import argparse
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from services.embedder import fetch_image
+from services.kmeans import kmeans
+from services.photo import ImageInput, benchmark_inputs, decode_photo, lab_to_srgb, srgb_to_lab, to_hex
+
+logger = logging.getLogger(__name__)
+
+PALETTE_COLORS = int(os.getenv("PALETTE_COLORS", "5"))
+# Longest side, in pixels, that photos are reduced to before clustering
+PALETTE_SAMPLE_SIDE = int(os.getenv("PALETTE_SAMPLE_SIDE", "128"))
+# Lab bin width: pixels closer than this are clustered as one weighted point
+PALETTE_BIN_SIZE = float(os.getenv("PALETTE_BIN_SIZE", "2.0"))
+# Clusters below this Lab chroma count as neutrals (greys, whites, beiges)
+NEUTRAL_CHROMA = 12.0
+# Clusters closer than this (CIE76 delta E) are merged: the eye cannot tell them apart in a palette
+MERGE_DELTA_E = 8.0
+# Clusters smaller than this share of the photo are never picked as the accent
+MIN_ACCENT_SHARE = 0.02
+
+
+def _bin_colors(lab: np.ndarray, bin_size: float):
+    """Collapse pixels into occupied Lab bins -> (bin means, pixel counts)"""
+    keys = np.floor(lab / bin_size).astype(np.int32)
+    # L in [0, 100], a/b roughly within [-128, 128]: pack the three bin indices into one integer
+    packed = (keys[:, 0].astype(np.int64) << 20) | ((keys[:, 1] + 512).astype(np.int64) << 10) | (keys[:, 2] + 512)
+    _, inverse, counts = np.unique(packed, return_inverse=True, return_counts=True)
+    sums = np.zeros((counts.size, 3), dtype=np.float64)
+    np.add.at(sums, inverse.ravel(), lab)
+    return (sums / counts[:, None]).astype(np.float32), counts.astype(np.float32)
+
+
+def merge_similar(lab: np.ndarray, shares: np.ndarray, delta_e: float = MERGE_DELTA_E):
+    """Fold each cluster into a larger one within ``delta_e``, keeping share-weighted means"""
+    lab, shares = lab.astype(np.float64), shares.astype(np.float64)
+    keep: List[int] = []
+    for i in np.argsort(-shares, kind="stable"):
+        target = next((j for j in keep if np.linalg.norm(lab[i] - lab[j]) < delta_e), None)
+        if target is None:
+            keep.append(int(i))
+            continue
+        total = shares[target] + shares[i]
+        lab[target] = (lab[target] * shares[target] + lab[i] * shares[i]) / total
+        shares[target] = total
+    return lab[keep].astype(np.float32), shares[keep]
+
+
+def assign_roles(lab: np.ndarray, shares: np.ndarray) -> Dict[str, Optional[int]]:
+    """Map clusters onto the PaletteData roles (indices into ``lab``)"""
+    chroma = np.hypot(lab[:, 1], lab[:, 2])
+    order = [int(i) for i in np.argsort(-shares, kind="stable")]
+    roles: Dict[str, Optional[int]] = {"primary": order[0], "secondary": None, "accent": None, "neutral": None}
+    rest = order[1:]
+
+    saturated = [i for i in rest if shares[i] >= MIN_ACCENT_SHARE and chroma[i] >= NEUTRAL_CHROMA]
+    if saturated:
+        roles["accent"] = max(saturated, key=lambda i: chroma[i])
+        rest.remove(roles["accent"])
+    if rest:
+        roles["neutral"] = min(rest, key=lambda i: chroma[i])
+        if chroma[roles["neutral"]] >= NEUTRAL_CHROMA and chroma[order[0]] < NEUTRAL_CHROMA:
+            # Nothing else is neutral but the dominant colour (a white wall, say) is
+            roles["neutral"] = order[0]
+        else:
+            rest.remove(roles["neutral"])
+    if rest:
+        roles["secondary"] = rest[0]
+    return roles
+
+
+def extract_palette(
+    image: ImageInput,
+    k: int = PALETTE_COLORS,
+    max_side: int = PALETTE_SAMPLE_SIDE,
+    bin_size: float = PALETTE_BIN_SIZE,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """Dominant colours of a photo in palette_json form (PaletteData roles plus ``colors``)"""
+    lab = srgb_to_lab(decode_photo(image, max_side=max_side).reshape(-1, 3))
+    if lab.shape[0] == 0:
+        raise ValueError("Image has no pixels")
+    points, counts = _bin_colors(lab, bin_size)
+    k = min(k, points.shape[0])
+    centroids, labels = kmeans(points, k, max_iter=30, tol=1e-2, seed=seed, weights=counts)
+    shares = np.bincount(labels, weights=counts, minlength=k) / counts.sum()
+
+    centroids, shares = merge_similar(centroids[shares > 0], shares[shares > 0])
+    hexes = [to_hex(rgb) for rgb in lab_to_srgb(centroids)]
+    roles = assign_roles(centroids, shares)
+
+    palette: Dict[str, Any] = {role: hexes[i] if i is not None else None for role, i in roles.items()}
+    palette["colors"] = [
+        {"hex": hexes[i], "share": round(float(shares[i]), 4), "lab": [round(float(v), 2) for v in centroids[i]]}
+        for i in np.argsort(-shares, kind="stable")
+    ]
+    return palette
+
+
+def extract_palette_url(image_url: str, allow_local: bool = False, **kwargs) -> Dict[str, Any]:
+    return extract_palette(fetch_image(image_url, allow_local=allow_local), **kwargs)
+
+
+def _benchmark(runs: int) -> None:
+    for name, image in benchmark_inputs():
+        extract_palette(image)
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            extract_palette(image)
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"{name:>5} 12 MP: median {np.median(timings):.1f} ms, p95 {np.percentile(timings, 95):.1f} ms over {runs} runs")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Extract room photo palettes")
+    parser.add_argument("images", nargs="*", help="Image files or URLs")
+    parser.add_argument("--bench", type=int, default=0, help="Benchmark with this many runs on a synthetic 12 MP photo")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.bench:
+        _benchmark(args.bench)
+    for image in args.images:
+        print(image, extract_palette_url(image, allow_local=True))
+
+
+if __name__ == "__main__":
+    main()
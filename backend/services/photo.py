@@ -0,0 +1,121 @@
+"""
+Decoding and colour-space helpers shared by the room photo analysers.
+
+A room photo is decoded once, straight to a small copy: JPEGs use Pillow's
+draft mode (DCT scaling), so a 12-megapixel upload is never held at full
+size. Palette, lighting and embedding steps then all work from that copy.
+"""
+import io
+import os
+from typing import List, Tuple, Union
+
+import numpy as np
+
+# Longest side, in pixels, of the copy every room analysis step works from
+ANALYSIS_SIDE = int(os.getenv("ROOM_ANALYSIS_SIDE", "256"))
+
+ImageInput = Union[bytes, np.ndarray]
+
+# sRGB (D65) -> CIE XYZ
+RGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+], dtype=np.float32)
+D65_WHITE = np.array([0.95047, 1.0, 1.08883], dtype=np.float32)
+# Scaled by the white point so Lab's f() sees X/Xn, Y/Yn, Z/Zn directly
+_RGB_TO_XYZN = (RGB_TO_XYZ / D65_WHITE[:, None]).T
+_XYZN_TO_RGB = np.linalg.inv(_RGB_TO_XYZN).astype(np.float32)
+_EPSILON = 216 / 24389
+_KAPPA = 24389 / 27
+
+
+def decode_photo(image: ImageInput, max_side: int = ANALYSIS_SIDE) -> np.ndarray:
+    """Encoded bytes or an HxWx3 array -> float32 sRGB in [0, 1], at most max_side on the long edge"""
+    if isinstance(image, np.ndarray):
+        array = image
+        # Strided sampling: O(output pixels), no full-resolution pass over a 12 MP array
+        step = max(1, int(np.ceil(max(array.shape[:2]) / max_side)))
+        array = array[::step, ::step, :3]
+    else:
+        try:
+            from PIL import Image
+        except ImportError as e:
+            raise ImportError("Pillow is required to decode images: pip install Pillow") from e
+        with Image.open(io.BytesIO(image)) as img:
+            # JPEGs are decoded straight at 1/2, 1/4 or 1/8 scale
+            img.draft("RGB", (max_side, max_side))
+            img = img.convert("RGB")
+            img.thumbnail((max_side, max_side), Image.Resampling.BILINEAR)
+            array = np.asarray(img)
+    if np.issubdtype(array.dtype, np.integer):
+        return array.astype(np.float32) / 255.0
+    return array.astype(np.float32)
+
+
+def srgb_to_linear(rgb: np.ndarray) -> np.ndarray:
+    rgb = np.asarray(rgb, dtype=np.float32)
+    return np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+
+
+def linear_to_srgb(linear: np.ndarray) -> np.ndarray:
+    linear = np.clip(linear, 0.0, 1.0)
+    return np.where(linear <= 0.0031308, 12.92 * linear, 1.055 * linear ** (1 / 2.4) - 0.055)
+
+
+def linear_to_xyz(linear: np.ndarray) -> np.ndarray:
+    return linear @ RGB_TO_XYZ.T
+
+
+def srgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """(..., 3) sRGB in [0, 1] -> (..., 3) CIELAB (D65)"""
+    xyz = srgb_to_linear(rgb) @ _RGB_TO_XYZN
+    f = np.where(xyz > _EPSILON, np.cbrt(xyz), (_KAPPA * xyz + 16) / 116)
+    lab = np.empty_like(f)
+    lab[..., 0] = 116 * f[..., 1] - 16
+    lab[..., 1] = 500 * (f[..., 0] - f[..., 1])
+    lab[..., 2] = 200 * (f[..., 1] - f[..., 2])
+    return lab
+
+
+def lab_to_srgb(lab: np.ndarray) -> np.ndarray:
+    """(..., 3) CIELAB (D65) -> (..., 3) sRGB clipped to [0, 1]"""
+    lab = np.asarray(lab, dtype=np.float32)
+    fy = (lab[..., 0] + 16) / 116
+    f = np.stack([fy + lab[..., 1] / 500, fy, fy - lab[..., 2] / 200], axis=-1)
+    xyz = np.where(f ** 3 > _EPSILON, f ** 3, (116 * f - 16) / _KAPPA)
+    return linear_to_srgb(xyz @ _XYZN_TO_RGB)
+
+
+def lightness(luminance: np.ndarray) -> np.ndarray:
+    """Relative luminance Y in [0, 1] -> CIE L* in [0, 100]"""
+    return np.where(luminance > _EPSILON, 116 * np.cbrt(luminance) - 16, _KAPPA * luminance)
+
+
+def to_hex(rgb: np.ndarray) -> str:
+    r, g, b = np.clip(np.rint(np.asarray(rgb) * 255), 0, 255).astype(int)
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def synthetic_photo(height: int = 3000, width: int = 4000, seed: int = 0) -> np.ndarray:
+    """A 12 MP uint8 'room': a few flat colour regions plus sensor noise"""
+    rng = np.random.default_rng(seed)
+    colors = rng.integers(0, 256, size=(6, 3))
+    regions = rng.integers(0, 6, size=(6, 8))
+    photo = colors[np.kron(regions, np.ones((height // 6, width // 8), dtype=np.int64))]
+    noise = rng.integers(-8, 9, size=photo.shape)
+    return np.clip(photo + noise, 0, 255).astype(np.uint8)
+
+
+def benchmark_inputs() -> List[Tuple[str, ImageInput]]:
+    """A synthetic 12 MP photo as an array, plus as a JPEG when Pillow is installed"""
+    photo = synthetic_photo()
+    inputs: List[Tuple[str, ImageInput]] = [("array", photo)]
+    try:
+        from PIL import Image
+    except ImportError:
+        return inputs
+    buffer = io.BytesIO()
+    Image.fromarray(photo).save(buffer, format="JPEG", quality=90)
+    inputs.append(("jpeg", buffer.getvalue()))
+    return inputs
@@ -0,0 +1,241 @@
+"""
+Product-quantization (PQ) index for artwork_embedding vectors.
+
+Each 384-d vector is L2-normalized, split into ``m`` sub-vectors and every
+sub-vector is replaced by the id of its nearest centroid in a 256-entry
+codebook, so a vector is stored as ``m`` bytes. Queries are scored with
+asymmetric distance computation (ADC): the query stays in float32, a
+``(m, 256)`` lookup table of sub-vector inner products is built once per
+query, and each stored code is scored with ``m`` table lookups.
+
+Train offline from an NDJSON export or straight from the table:
+
+    python -m services.pq_index --ndjson embeddings.ndjson --m 48
+"""
+import argparse
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from services.embedding_store import (
+    EMBEDDING_DIM,
+    IndexedRows,
+    IndexNotReadyError,
+    load_from_source,
+    normalize_rows,
+    on_embedding_delete,
+    on_embedding_upsert,
+    parse_vector,
+    top_k,
+)
+from services.kmeans import kmeans
+from services.settings import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PQ_PATH = Path(os.getenv("PQ_INDEX_PATH", DATA_DIR / "pq_index.npz"))
+
+
+class ProductQuantizer:
+    """Per-subspace k-means codebooks with 1-byte codes"""
+
+    def __init__(self, dim: int = EMBEDDING_DIM, m: int = 48, ksub: int = 256):
+        if dim % m != 0:
+            raise ValueError(f"Dimension {dim} is not divisible into {m} sub-spaces")
+        if not 1 <= ksub <= 256:
+            raise ValueError("ksub must be between 1 and 256 to fit in one byte")
+        self.dim = dim
+        self.m = m
+        self.ksub = ksub
+        self.dsub = dim // m
+        self.codebooks: Optional[np.ndarray] = None  # (m, ksub, dsub)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.codebooks is not None
+
+    def train(self, vectors: np.ndarray, sample_size: int = 65536, max_iter: int = 20, seed: int = 0) -> None:
+        """Learn one codebook per sub-space from (a sample of) the vectors"""
+        vectors = normalize_rows(vectors)
+        if vectors.shape[0] == 0:
+            raise ValueError("Cannot train a product quantizer without vectors")
+        rng = np.random.default_rng(seed)
+        if vectors.shape[0] > sample_size:
+            vectors = vectors[rng.choice(vectors.shape[0], sample_size, replace=False)]
+
+        codebooks = np.empty((self.m, self.ksub, self.dsub), dtype=np.float32)
+        for j in range(self.m):
+            sub = vectors[:, j * self.dsub:(j + 1) * self.dsub]
+            codebooks[j], _ = kmeans(sub, self.ksub, max_iter=max_iter, seed=seed + j)
+        self.codebooks = codebooks
+        logger.info(f"Trained PQ codebooks: m={self.m}, ksub={self.ksub} on {vectors.shape[0]} vectors")
+
+    def encode(self, vectors: np.ndarray, batch_size: int = 8192) -> np.ndarray:
+        """Encode vectors to uint8 codes of shape (n, m)"""
+        self._require_trained()
+        vectors = normalize_rows(np.atleast_2d(vectors))
+        codes = np.empty((vectors.shape[0], self.m), dtype=np.uint8)
+        for start in range(0, vectors.shape[0], batch_size):
+            block = vectors[start:start + batch_size].reshape(-1, self.m, self.dsub)
+            for j in range(self.m):
+                sub = block[:, j, :]
+                book = self.codebooks[j]
+                distances = (book * book).sum(axis=1)[None, :] - 2.0 * (sub @ book.T)
+                codes[start:start + block.shape[0], j] = distances.argmin(axis=1)
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        """Reconstruct approximate (normalized) vectors from codes"""
+        self._require_trained()
+        codes = np.atleast_2d(codes)
+        parts = [self.codebooks[j][codes[:, j]] for j in range(self.m)]
+        return np.concatenate(parts, axis=1)
+
+    def lookup_tables(self, query: np.ndarray) -> np.ndarray:
+        """Inner product of each query sub-vector with every centroid, shape (m, ksub)"""
+        self._require_trained()
+        query = normalize_rows(query.reshape(1, -1))[0].reshape(self.m, self.dsub)
+        return np.einsum("jkd,jd->jk", self.codebooks, query)
+
+    def score(self, tables: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Approximate cosine similarity of the query behind ``tables`` to each code"""
+        scores = np.zeros(codes.shape[0], dtype=np.float32)
+        for j in range(self.m):
+            scores += tables[j][codes[:, j]]
+        return scores
+
+    def _require_trained(self) -> None:
+        if self.codebooks is None:
+            raise RuntimeError("Product quantizer has not been trained")
+
+
+class PQIndex:
+    """In-memory PQ codes for every artwork embedding, kept current on insert"""
+
+    def __init__(self, quantizer: Optional[ProductQuantizer] = None, path: Path = DEFAULT_PQ_PATH):
+        self.quantizer = quantizer or ProductQuantizer()
+        self.path = Path(path)
+        self.rows = IndexedRows({"codes": ((self.quantizer.m,), np.uint8)})
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def is_ready(self) -> bool:
+        self._ensure_loaded()
+        return self.quantizer.is_trained
+
+    def build(self, ids: List[str], artwork_ids: List[str], vectors: np.ndarray, **train_kwargs) -> None:
+        """Train codebooks on the vectors and encode all of them"""
+        self.quantizer.train(vectors, **train_kwargs)
+        codes = self.quantizer.encode(vectors)
+        with self._lock:
+            self.rows = IndexedRows({"codes": ((self.quantizer.m,), np.uint8)})
+            self.rows.reset(ids, artwork_ids, codes=codes)
+            self._loaded = True
+        logger.info(f"Built PQ index with {len(self.rows)} codes ({codes.nbytes / 1e6:.1f} MB)")
+
+    def upsert(self, embedding_id: str, artwork_id: str, vector: np.ndarray) -> None:
+        """Encode and store (or replace) a single embedding"""
+        if not self.is_ready:
+            return
+        code = self.quantizer.encode(vector)[0]
+        with self._lock:
+            self.rows.upsert(embedding_id, artwork_id, codes=code)
+
+    def upsert_row(self, row: Dict[str, Any]) -> None:
+        """Embedding-store listener: index a freshly written artwork_embedding row"""
+        self.upsert(str(row["id"]), str(row["artwork_id"]), parse_vector(row["vector"]))
+
+    def remove(self, embedding_id: str) -> bool:
+        """Drop an embedding from the index"""
+        with self._lock:
+            return self.rows.remove(embedding_id) is not None
+
+    def search(self, query_vector, limit: int = 10, threshold: float = 0.0) -> List[Dict[str, Any]]:
+        """Top-k artworks by approximate cosine similarity (ADC)"""
+        if not self.is_ready:
+            raise IndexNotReadyError("PQ index is not available - train it with `python -m services.pq_index`")
+        tables = self.quantizer.lookup_tables(np.asarray(query_vector, dtype=np.float32))
+        with self._lock:
+            scores = self.quantizer.score(tables, self.rows.column("codes"))
+            top = top_k(scores, limit)
+            return [
+                {"id": self.rows.ids[i], "artwork_id": self.rows.artwork_ids[i], "similarity": float(scores[i])}
+                for i in top
+                if scores[i] >= threshold
+            ]
+
+    def save(self, path: Optional[Path] = None) -> Path:
+        """Persist codebooks, codes and ids to a .npz file"""
+        self.quantizer._require_trained()
+        path = Path(path or self.path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            np.savez(
+                path,
+                codebooks=self.quantizer.codebooks,
+                codes=self.rows.column("codes"),
+                ids=np.asarray(self.rows.ids, dtype=str),
+                artwork_ids=np.asarray(self.rows.artwork_ids, dtype=str),
+            )
+        logger.info(f"Saved PQ index to {path}")
+        return path
+
+    def load(self, path: Optional[Path] = None) -> None:
+        """Load a previously saved index"""
+        path = Path(path or self.path)
+        with np.load(path) as data:
+            codebooks = data["codebooks"]
+            m, ksub, dsub = codebooks.shape
+            quantizer = ProductQuantizer(dim=m * dsub, m=m, ksub=ksub)
+            quantizer.codebooks = codebooks.astype(np.float32)
+            rows = IndexedRows({"codes": ((m,), np.uint8)})
+            rows.reset(list(data["ids"]), list(data["artwork_ids"]), codes=data["codes"])
+        with self._lock:
+            self.quantizer = quantizer
+            self.rows = rows
+            self._loaded = True
+        logger.info(f"Loaded PQ index with {len(rows)} codes from {path}")
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if self.path.exists():
+            try:
+                self.load()
+            except Exception as e:
+                logger.error(f"Failed to load PQ index from {self.path}: {e}")
+
+
+# Global PQ index instance
+pq_index = PQIndex()
+on_embedding_upsert(pq_index.upsert_row)
+on_embedding_delete(pq_index.remove)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Train the artwork embedding PQ index")
+    parser.add_argument("--ndjson", help="NDJSON export to train from (defaults to the artwork_embedding table)")
+    parser.add_argument("--m", type=int, default=48, help="Number of sub-spaces (must divide 384)")
+    parser.add_argument("--sample-size", type=int, default=65536, help="Vectors sampled for codebook training")
+    parser.add_argument("--iterations", type=int, default=20, help="k-means iterations per sub-space")
+    parser.add_argument("--out", default=str(DEFAULT_PQ_PATH), help="Output .npz path")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    ids, artwork_ids, vectors = load_from_source(ndjson_path=args.ndjson)
+    index = PQIndex(ProductQuantizer(m=args.m), path=Path(args.out))
+    index.build(ids, artwork_ids, vectors, sample_size=args.sample_size, max_iter=args.iterations)
+    index.save()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Per-request response metadata.
+
+Deep layers (the resilience stale cache, the catalog snapshot) need to tell
+the HTTP layer that a response was built from old data, but CRUD reads run
+in worker threads and return plain models. The middleware in ``main.py``
+starts a metadata dict for each request; because context variables are
+copied by reference into worker threads and tasks, anything annotated
+further down lands in that same dict and is turned into response headers.
+"""
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+_metadata: ContextVar[Optional[Dict[str, Any]]] = ContextVar("response_metadata", default=None)
+
+
+def begin() -> Dict[str, Any]:
+    """Start collecting metadata for the current request"""
+    metadata: Dict[str, Any] = {}
+    _metadata.set(metadata)
+    return metadata
+
+
+def current() -> Optional[Dict[str, Any]]:
+    return _metadata.get()
+
+
+def note_data_age(seconds: float, source: str) -> None:
+    """Record that part of the response came from data ``seconds`` old (the oldest source wins)"""
+    metadata = _metadata.get()
+    if metadata is None:
+        return
+    if seconds >= metadata.get("data_age", -1.0):
+        metadata["data_age"] = seconds
+        metadata["data_source"] = source
+
+
+def merge(other: Optional[Dict[str, Any]]) -> None:
+    """Copy data-age metadata from another request (e.g. the leader of a coalesced read)"""
+    if other and "data_age" in other:
+        note_data_age(other["data_age"], other["data_source"])
@@ -0,0 +1,407 @@
+"""
+Resilient execution of Supabase table and RPC calls.
+
+``DatabaseConnection.client`` wraps the Supabase client in ``ResilientClient``:
+query builders work exactly as before, but every ``.execute()`` goes through
+``ResilientExecutor``, which adds
+
+* per-operation timeouts (``DB_READ_TIMEOUT`` / ``DB_WRITE_TIMEOUT``);
+* bounded retries for idempotent reads (GET requests and RPCs) with
+  exponential backoff and full jitter, on transient errors only: timeouts,
+  transport errors, 502/503/504/52x responses and PostgREST connection
+  errors;
+* a circuit breaker that opens after ``DB_BREAKER_FAILURES`` consecutive
+  transient failures and fails fast for ``DB_BREAKER_RESET`` seconds before
+  letting a single probe through;
+* a stale cache of recent read responses, served when the breaker is open
+  or retries are exhausted, so reads keep working during database blips
+  (bounded by entries and by approximate bytes, so embedding pages cannot
+  grow it without limit);
+* hedged reads for latency-critical operations (``DB_HEDGED``): when the
+  first attempt is slower than the operation's recent p90 latency, a second
+  identical request is sent and whichever answers first wins.
+
+Writes are never retried or hedged. When no stale data is available the
+caller gets ``DatabaseUnavailableError``, which the API maps to 503.
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Deque, Dict, Hashable, Optional, Tuple
+
+from services import request_context
+
+logger = logging.getLogger(__name__)
+
+DB_READ_TIMEOUT = float(os.getenv("DB_READ_TIMEOUT", "5"))
+DB_WRITE_TIMEOUT = float(os.getenv("DB_WRITE_TIMEOUT", "10"))
+DB_READ_RETRIES = int(os.getenv("DB_READ_RETRIES", "2"))
+DB_RETRY_BASE_DELAY = float(os.getenv("DB_RETRY_BASE_DELAY", "0.1"))
+DB_RETRY_MAX_DELAY = float(os.getenv("DB_RETRY_MAX_DELAY", "2"))
+DB_BREAKER_FAILURES = int(os.getenv("DB_BREAKER_FAILURES", "5"))
+DB_BREAKER_RESET = float(os.getenv("DB_BREAKER_RESET", "15"))
+DB_HEDGED = {op.strip() for op in os.getenv("DB_HEDGED", "artwork,artwork_embedding,rpc/match_artworks").split(",") if op.strip()}
+DB_HEDGE_MIN_DELAY = float(os.getenv("DB_HEDGE_MIN_DELAY", "0.05"))
+DB_STALE_ENTRIES = int(os.getenv("DB_STALE_ENTRIES", "2048"))
+DB_STALE_MAX_AGE = float(os.getenv("DB_STALE_MAX_AGE", "3600"))
+DB_STALE_MAX_ROWS = int(os.getenv("DB_STALE_MAX_ROWS", "500"))
+# Approximate in-memory size of all stale entries together; one entry may use at most an eighth of it
+DB_STALE_MAX_BYTES = int(os.getenv("DB_STALE_MAX_BYTES", str(64 * 1024 * 1024)))
+DB_MAX_CONCURRENCY = int(os.getenv("DB_MAX_CONCURRENCY", "32"))
+
+_TRANSIENT_STATUS = {"502", "503", "504", "520", "521", "522", "523", "524"}
+# PostgREST connection errors, plus Postgres statement timeout
+_TRANSIENT_CODES = {"PGRST000", "PGRST001", "PGRST002", "PGRST003", "57014"}
+
+
+class DatabaseUnavailableError(RuntimeError):
+    """Raised when the database is unhealthy and no stale data can be served"""
+
+    def __init__(self, message: str, retry_after: float = DB_BREAKER_RESET):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueryTimeoutError(TimeoutError):
+    """Raised when a single attempt exceeds its per-operation timeout"""
+
+
+def is_transient(error: BaseException) -> bool:
+    """Whether a failed attempt is worth retrying and counts against the breaker"""
+    # Imported here so importing this module doesn't pull in the HTTP stack before a client exists
+    import httpx
+    from postgrest.exceptions import APIError
+
+    if isinstance(error, (TimeoutError, httpx.TransportError)):
+        return True
+    if isinstance(error, APIError):
+        code = str(error.code or "")
+        return code in _TRANSIENT_STATUS or code in _TRANSIENT_CODES
+    return False
+
+
+def backoff_delay(attempt: int, base: float = DB_RETRY_BASE_DELAY, cap: float = DB_RETRY_MAX_DELAY) -> float:
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open single probe -> closed"""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = DB_BREAKER_FAILURES, reset_timeout: float = DB_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def retry_after(self) -> float:
+        with self._lock:
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def allow(self) -> bool:
+        """Whether a request may go to the database right now"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            if self._probing:
+                return False
+            self._state, self._probing = self.HALF_OPEN, True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("Database circuit closed")
+            self._state, self.failures, self._probing = self.CLOSED, 0, False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self._state == self.HALF_OPEN or (self._state == self.CLOSED and self.failures >= self.failure_threshold):
+                self._state, self._opened_at = self.OPEN, time.monotonic()
+                logger.warning(f"Database circuit opened after {self.failures} consecutive failures")
+
+
+class LatencyTracker:
+    """Rolling per-operation latencies used to decide when to hedge"""
+
+    def __init__(self, window: int = 200, percentile: float = 0.9, min_delay: float = DB_HEDGE_MIN_DELAY):
+        self.window = window
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, operation: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(operation, deque(maxlen=self.window)).append(seconds)
+
+    def hedge_delay(self, operation: str) -> float:
+        with self._lock:
+            samples = sorted(self._samples.get(operation, ()))
+        if len(samples) < 20:
+            return max(self.min_delay, 0.1)
+        return max(self.min_delay, samples[int(self.percentile * (len(samples) - 1))])
+
+
+def approx_size(value: Any) -> int:
+    """Rough in-memory size in bytes of decoded JSON (dicts, lists, strings, numbers)"""
+    if isinstance(value, str):
+        return 49 + len(value)
+    if isinstance(value, dict):
+        return 64 + 24 * len(value) + sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return 56 + 8 * len(value) + sum(approx_size(v) for v in value)
+    return 32
+
+
+class StaleCache:
+    """Bounded LRU of recent read responses for serving during outages"""
+
+    def __init__(
+        self,
+        max_entries: int = DB_STALE_ENTRIES,
+        max_age: float = DB_STALE_MAX_AGE,
+        max_rows: int = DB_STALE_MAX_ROWS,
+        max_bytes: int = DB_STALE_MAX_BYTES,
+    ):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, key: Hashable, response: Any) -> None:
+        data = getattr(response, "data", None)
+        if isinstance(data, list) and len(data) > self.max_rows:
+            return
+        size = approx_size(data)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[2]
+            if size > self.max_bytes // 8:
+                return
+            self._entries[key] = (time.time(), response, size)
+            self.size += size
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                self.size -= self._entries.popitem(last=False)[1][2]
+
+    def get(self, key: Hashable) -> Optional[Tuple[float, Any]]:
+        """(stored_at, response) if a fresh-enough entry exists"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[0] > self.max_age:
+                return None
+            return entry[:2]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def discard(self, operations) -> int:
+        """Drop every entry for these tables/RPCs (e.g. after purging a user's rows); returns how many"""
+        operations = set(operations)
+        with self._lock:
+            stale = [key for key in self._entries if _operation_of_path(key[1]) in operations]
+            for key in stale:
+                self.size -= self._entries.pop(key)[2]
+        return len(stale)
+
+
+def _request_of(builder: Any) -> Any:
+    # postgrest >= 0.17 keeps the request on ``builder.request``; older versions on the builder itself
+    return getattr(builder, "request", builder)
+
+
+def _operation_of_path(path: str) -> str:
+    return path.split("/rest/v1/", 1)[-1].split("?", 1)[0]
+
+
+def operation_name(builder: Any) -> str:
+    """'artwork', 'rpc/match_artworks', ... from the request path"""
+    return _operation_of_path(str(_request_of(builder).path))
+
+
+def is_read(builder: Any) -> bool:
+    request = _request_of(builder)
+    method = str(getattr(request.http_method, "value", request.http_method)).upper()
+    # RPCs are POSTs but every function exposed here is a read-only query
+    return method in ("GET", "HEAD") or operation_name(builder).startswith("rpc/")
+
+
+def request_key(builder: Any) -> Hashable:
+    request = _request_of(builder)
+    return (str(request.http_method), str(request.path), str(request.params), json.dumps(request.json, sort_keys=True, default=str))
+
+
+class ResilientExecutor:
+    """Timeouts, retries, circuit breaking, stale fallback and hedging around ``.execute()``"""
+
+    def __init__(self, max_workers: int = DB_MAX_CONCURRENCY):
+        self.breaker = CircuitBreaker()
+        self.latencies = LatencyTracker()
+        self.stale = StaleCache()
+        self.hedged_operations = set(DB_HEDGED)
+        self.counters = {"retries": 0, "hedges": 0, "timeouts": 0, "stale_served": 0, "rejected": 0}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+
+    def execute(self, builder: Any) -> Any:
+        operation = operation_name(builder)
+        read = is_read(builder)
+        request = _request_of(builder)
+        if hasattr(request, "retry_enabled"):
+            # Retries are handled here, with jitter and a shorter schedule than postgrest's own
+            request.retry_enabled = False
+        key = request_key(builder) if read else None
+
+        if not self.breaker.allow():
+            self.counters["rejected"] += 1
+            return self._fallback(operation, key, DatabaseUnavailableError(
+                f"Database circuit is open; {operation} rejected", retry_after=self.breaker.retry_after()
+            ))
+
+        attempts = 1 + (DB_READ_RETRIES if read else 0)
+        timeout = DB_READ_TIMEOUT if read else DB_WRITE_TIMEOUT
+        hedge = read and operation in self.hedged_operations
+        for attempt in range(attempts):
+            try:
+                response = self._attempt(builder, operation, timeout, hedge and self.breaker.state == CircuitBreaker.CLOSED)
+            except Exception as e:
+                if not is_transient(e):
+                    # The database answered (constraint violation, bad filter, ...): it is healthy
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                last_error = e
+                if attempt + 1 < attempts and self.breaker.allow():
+                    self.counters["retries"] += 1
+                    time.sleep(backoff_delay(attempt))
+                    continue
+                break
+            else:
+                self.breaker.record_success()
+                if read:
+                    self.stale.put(key, response)
+                return response
+
+        logger.error(f"Database {operation} failed after {attempt + 1} attempt(s): {last_error}")
+        error = DatabaseUnavailableError(f"Database unavailable for {operation}: {last_error}", retry_after=self.breaker.retry_after() or 1.0)
+        error.__cause__ = last_error
+        return self._fallback(operation, key, error)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "stale_entries": len(self.stale._entries),
+            "stale_bytes": self.stale.size,
+            **self.counters,
+        }
+
+    def _attempt(self, builder: Any, operation: str, timeout: float, hedge: bool) -> Any:
+        start = time.monotonic()
+        deadline = start + timeout
+        pending = {self._pool.submit(builder.execute)}
+        if hedge:
+            done, _ = wait(pending, timeout=min(self.latencies.hedge_delay(operation), timeout))
+            if not done:
+                self.counters["hedges"] += 1
+                pending.add(self._pool.submit(builder.execute))
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    self.latencies.record(operation, time.monotonic() - start)
+                    return future.result()
+                error = future.exception()
+        if pending or error is None:
+            self.counters["timeouts"] += 1
+            raise QueryTimeoutError(f"{operation} timed out after {timeout:.1f}s")
+        raise error
+
+    def _fallback(self, operation: str, key: Optional[Hashable], error: DatabaseUnavailableError) -> Any:
+        entry = self.stale.get(key) if key is not None else None
+        if entry is None:
+            raise error
+        stored_at, response = entry
+        self.counters["stale_served"] += 1
+        age = time.time() - stored_at
+        request_context.note_data_age(age, "stale-cache")
+        logger.warning(f"Serving stale {operation} response ({age:.0f}s old): {error}")
+        return response
+
+
+class _ResilientBuilder:
+    """Proxy over a postgrest query builder that routes ``execute`` through the executor"""
+
+    def __init__(self, builder: Any, executor: ResilientExecutor):
+        self._builder = builder
+        self._executor = executor
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            return self._wrap(attr)
+
+        def call(*args, **kwargs):
+            return self._wrap(attr(*args, **kwargs))
+
+        return call
+
+    def _wrap(self, value: Any) -> Any:
+        return _ResilientBuilder(value, self._executor) if hasattr(value, "execute") else value
+
+    def execute(self) -> Any:
+        return self._executor.execute(self._builder)
+
+
+class ResilientClient:
+    """Supabase client whose table and RPC calls go through ``ResilientExecutor``"""
+
+    def __init__(self, client: Any, executor: Optional[ResilientExecutor] = None):
+        self._client = client
+        self.executor = executor or ResilientExecutor()
+
+    def table(self, table_name: str) -> _ResilientBuilder:
+        return _ResilientBuilder(self._client.table(table_name), self.executor)
+
+    def from_(self, table_name: str) -> _ResilientBuilder:
+        return _ResilientBuilder(self._client.from_(table_name), self.executor)
+
+    def rpc(self, fn: str, params: Optional[Dict[str, Any]] = None, *args, **kwargs) -> _ResilientBuilder:
+        return _ResilientBuilder(self._client.rpc(fn, params or {}, *args, **kwargs), self.executor)
+
+    def __getattr__(self, name: str) -> Any:
+        # auth, storage, functions, ... pass straight through
+        return getattr(self._client, name)
+
+
+# Shared executor: one breaker and stale cache for the whole process
+db_executor = ResilientExecutor()
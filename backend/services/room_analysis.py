@@ -0,0 +1,206 @@
+"""
+Room photo analysis: embedding, palette and lighting from a single decode.
+
+Each upload's photo is downloaded and decoded once, to a copy at most
+ROOM_ANALYSIS_SIDE pixels on its long edge. That copy is handed to every
+requested step, and all results are written back in a single update. New
+uploads are analysed by the ``analyze_room_upload`` job, whose worker takes
+several uploads at once (``analyze_uploads``) so their embeddings share one
+model call. Existing ones are
+backfilled with ``python -m services.room_analysis --backfill``.
+"""
+import argparse
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+import numpy as np
+
+from services.embedder import embedder, fetch_image
+from services.lighting import analyze_lighting
+from services.palette import extract_palette
+from services.photo import ANALYSIS_SIDE, ImageInput, decode_photo
+
+logger = logging.getLogger(__name__)
+
+
+def _embedding(photo: np.ndarray) -> List[float]:
+    return embedder.embed([photo])[0].tolist()
+
+
+# Step name -> (room_upload column, analyser over the decoded photo), run in this order
+ROOM_ANALYSIS_STEPS: Dict[str, Tuple[str, Callable[[np.ndarray], Any]]] = {
+    "embedding": ("embedding", _embedding),
+    "palette": ("palette_json", extract_palette),
+    "lighting": ("lighting_json", analyze_lighting),
+}
+DEFAULT_BACKFILL_STEPS = ("palette", "lighting")
+
+
+def validate_steps(steps: Optional[Sequence[str]]) -> List[str]:
+    """Requested steps in run order (default: all); unknown names are a ValueError"""
+    if not steps:
+        return list(ROOM_ANALYSIS_STEPS)
+    unknown = set(steps) - set(ROOM_ANALYSIS_STEPS)
+    if unknown:
+        raise ValueError(f"Unknown room analysis steps: {', '.join(sorted(unknown))}")
+    return [name for name in ROOM_ANALYSIS_STEPS if name in steps]
+
+
+def analyze_photo(image: ImageInput, steps: Sequence[str], skip: Sequence[str] = ()) -> Tuple[Dict[str, Any], Dict[str, float]]:
+    """Decode once and run each step (except ``skip``) -> (column values, milliseconds per stage)"""
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+    photo = decode_photo(image, max_side=ANALYSIS_SIDE)
+    timings["decode"] = round((time.perf_counter() - start) * 1000, 2)
+
+    fields: Dict[str, Any] = {}
+    for name in validate_steps(steps):
+        if name in skip:
+            continue
+        column, analyse = ROOM_ANALYSIS_STEPS[name]
+        start = time.perf_counter()
+        fields[column] = analyse(photo)
+        timings[name] = round((time.perf_counter() - start) * 1000, 2)
+    return fields, timings
+
+
+def _fetch_and_analyze(image_url: str, steps: Sequence[str], allow_local: bool = False) -> Tuple[Dict[str, Any], Dict[str, float]]:
+    return analyze_photo(fetch_image(image_url, allow_local=allow_local), steps)
+
+
+def _fetch_and_decode(image_url: str) -> np.ndarray:
+    return decode_photo(fetch_image(image_url), max_side=ANALYSIS_SIDE)
+
+
+async def analyze_upload(upload_id: UUID, image_url: str, steps: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """Analyse an upload's photo and store the results; returns them (minus the vector) with timings"""
+    result = (await analyze_uploads([(upload_id, image_url, steps)]))[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+async def analyze_uploads(uploads: Sequence[Tuple[UUID, str, Optional[Sequence[str]]]]) -> List[Any]:
+    """Analyse several uploads' photos, embedding them in one batch, and store each upload's results.
+
+    Photos are downloaded and decoded concurrently. Returns one entry per
+    upload, in order: its results (as ``analyze_upload``), or the exception
+    that stopped it.
+    """
+    from crud.room_upload_crud import room_upload_crud
+
+    photos = await asyncio.gather(*(asyncio.to_thread(_fetch_and_decode, url) for _, url, _ in uploads), return_exceptions=True)
+    results: List[Any] = []
+    for photo, (_, _, steps) in zip(photos, uploads):
+        try:
+            if isinstance(photo, BaseException):
+                raise photo
+            # Embeddings are computed below for the whole batch
+            results.append(analyze_photo(photo, validate_steps(steps), skip=("embedding",)))
+        except Exception as e:
+            results.append(e)
+
+    to_embed = [
+        i for i, (result, (_, _, steps)) in enumerate(zip(results, uploads))
+        if not isinstance(result, Exception) and "embedding" in validate_steps(steps)
+    ]
+    if to_embed:
+        start = time.perf_counter()
+        try:
+            vectors = await asyncio.to_thread(embedder.embed, [photos[i] for i in to_embed])
+        except Exception as e:
+            vectors = None
+            for i in to_embed:
+                results[i] = e
+        if vectors is not None:
+            elapsed = round((time.perf_counter() - start) * 1000, 2)
+            for i, vector in zip(to_embed, vectors):
+                results[i][0]["embedding"] = vector.tolist()
+                results[i][1]["embedding"] = elapsed
+
+    for i, (upload_id, _, _) in enumerate(uploads):
+        if isinstance(results[i], Exception):
+            continue
+        fields, timings = results[i]
+        try:
+            if not await room_upload_crud.save_analysis(upload_id, fields):
+                raise ValueError(f"Room upload {upload_id} not found")
+        except Exception as e:
+            results[i] = e
+            continue
+        summary = {column: value for column, value in fields.items() if column != "embedding"}
+        summary["timings_ms"] = timings
+        results[i] = summary
+    return results
+
+
+async def backfill(
+    steps: Sequence[str] = DEFAULT_BACKFILL_STEPS,
+    overwrite: bool = False,
+    limit: Optional[int] = None,
+    page_size: int = 100,
+    fetch_workers: int = 8,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Dict[str, int]:
+    """Run analysis steps over existing room uploads (by default only where their column is empty).
+
+    Uploads are paged by id. Photos in a page are fetched and analysed on a
+    thread pool, since download and JPEG decode release the GIL. Results are
+    written back one row at a time. Returns counts of updated and failed uploads.
+    """
+    from crud.room_upload_crud import room_upload_crud
+
+    steps = validate_steps(steps)
+    columns = [ROOM_ANALYSIS_STEPS[name][0] for name in steps]
+    updated = failed = 0
+    after = None
+    with ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix="room-analysis") as pool:
+        while limit is None or updated + failed < limit:
+            size = page_size if limit is None else min(page_size, limit - updated - failed)
+            rows = await room_upload_crud.get_uploads_for_analysis(columns, after=after, limit=size, overwrite=overwrite)
+            if not rows:
+                break
+            after = rows[-1]["id"]
+            # Only fill the columns a row is missing, so client-supplied values survive
+            row_steps = [[name for name in steps if overwrite or row.get(ROOM_ANALYSIS_STEPS[name][0]) is None] for row in rows]
+            futures = [pool.submit(_fetch_and_analyze, row["s3_url"], todo) for row, todo in zip(rows, row_steps)]
+            for row, future in zip(rows, futures):
+                try:
+                    fields, _ = await asyncio.wrap_future(future)
+                    await room_upload_crud.save_analysis(row["id"], fields)
+                    updated += 1
+                except Exception as e:
+                    logger.warning(f"Room analysis backfill failed for upload {row['id']}: {e}")
+                    failed += 1
+            if progress:
+                progress(updated, failed)
+            if len(rows) < size:
+                break
+    logger.info(f"Room analysis backfill ({', '.join(steps)}) finished: {updated} updated, {failed} failed")
+    return {"updated": updated, "failed": failed}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Analyse room photos (embedding, palette, lighting)")
+    parser.add_argument("images", nargs="*", help="Image files or URLs to analyse and print")
+    parser.add_argument("--steps", nargs="+", help="Analysis steps (default: all; palette and lighting for --backfill)")
+    parser.add_argument("--backfill", action="store_true", help="Fill the steps' columns for existing room uploads")
+    parser.add_argument("--overwrite", action="store_true", help="With --backfill, recompute values that are already set")
+    parser.add_argument("--limit", type=int, help="With --backfill, stop after this many uploads")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.backfill:
+        print(asyncio.run(backfill(args.steps or DEFAULT_BACKFILL_STEPS, overwrite=args.overwrite, limit=args.limit)))
+    for image in args.images:
+        fields, timings = _fetch_and_analyze(image, args.steps or [], allow_local=True)
+        fields.pop("embedding", None)
+        print(image, fields, timings)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Fast response path for database rows.
+
+Rows coming back from Supabase already match the table schema that Postgres
+enforces, so re-validating every field (384 floats per embedding, every
+Decimal and datetime) through Pydantic on each read is wasted work, and
+FastAPI's ``response_model`` then validates and serializes the models a
+second time. This module provides:
+
+* ``trusted_model`` - build a response model from a database row with
+  ``model_construct`` (no validation);
+* ``FastJSONResponse`` - a response class that serializes models and rows
+  directly with orjson (falling back to the standard library encoder).
+
+Routes that return ``FastJSONResponse`` bypass ``response_model``
+serialization; keep ``response_model`` on the route for the OpenAPI schema.
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Type, TypeVar
+from uuid import UUID
+
+# fastapi.responses re-exports this class; importing it from starlette keeps job workers
+# (which serialize rows but serve no routes) from loading all of FastAPI
+from starlette.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional speed-up
+    orjson = None
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+def trusted_model(model_cls: Type[ModelT], row: Dict[str, Any]) -> ModelT:
+    """Build a response model from a trusted database row without validation"""
+    return model_cls.model_construct(**row)
+
+
+def _default(value: Any) -> Any:
+    """Encode the types the JSON encoders don't handle natively"""
+    if isinstance(value, BaseModel):
+        # Constructed models hold the raw row values; nested models are handled recursively
+        return value.__dict__
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize content to JSON bytes with the fastest available encoder"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response that skips jsonable_encoder and Pydantic serialization"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
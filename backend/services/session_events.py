@@ -0,0 +1,36 @@
+"""
+Session write notifications.
+
+``session_crud`` reports every change to a session row here. In-memory
+aggregates over sessions (services/session_stats.py, services/coselection.py)
+register a listener and update themselves incrementally, the way the vector
+indexes follow ``artwork_embedding`` writes through services/embedding_store.py.
+"""
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Columns listeners read from a session row
+SESSION_COLUMNS = "id, user_id, topk_ids, chosen_id"
+
+SessionRow = Dict[str, Any]
+_listeners: List[Callable[[Optional[SessionRow], Optional[SessionRow]], None]] = []
+
+
+def on_session_change(callback: Callable[[Optional[SessionRow], Optional[SessionRow]], None]) -> None:
+    """Register a callback invoked with (previous row, current row); None for a create or delete side"""
+    _listeners.append(callback)
+
+
+def has_listeners() -> bool:
+    return bool(_listeners)
+
+
+def notify_session_change(previous: Optional[SessionRow], current: Optional[SessionRow]) -> None:
+    """Forward a session create (None, row), update (old, new) or delete (row, None) to all listeners"""
+    for callback in _listeners:
+        try:
+            callback(previous, current)
+        except Exception as e:
+            logger.error(f"Session listener {callback.__qualname__} failed: {e}")
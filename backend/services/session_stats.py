@@ -0,0 +1,527 @@
+"""
+Incremental funnel analytics over recommendation sessions.
+
+Every session shows a ranked list of artworks (``topk_ids``) and may record
+the one the user picked (``chosen_id``). Counters are updated as sessions are
+written (through services/session_events.py), so every statistic is
+answered from memory instead of aggregating the session table:
+
+* impressions and choices per artwork, in arrays indexed by a dense artwork
+  slot (O(1) lookup and increment);
+* the distribution of the rank the chosen artwork was shown at;
+* impressions and choices per style tag (the artwork's tags when the session
+  was recorded);
+* sessions and choices per room type, taking the room type of the user's
+  most recent room upload.
+
+An update or delete takes back exactly what was added, even after the
+user's room type or the artwork's tags have since changed. For each counted
+session only two integers are kept: the room slot and the tag epoch it was
+counted at. The epoch advances whenever an artwork's tags change, and the
+replaced tags are kept until no remembered session is older than them, so
+the tags a session was counted under are re-derived from its row. At most
+``SESSION_STATS_MAX_COUNTED`` sessions are remembered (oldest dropped first);
+a dropped session that is later updated or deleted is taken back under the
+current room and tag slots.
+
+The counters are persisted to a ``.npz`` file on shutdown and rebuilt from
+the tables with:
+
+    python -m services.session_stats
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from services.embedding_store import IndexNotReadyError, top_k
+from services.session_events import SESSION_COLUMNS, on_session_change
+from services.settings import DATA_DIR
+from services.snapshot import catalog_snapshot, fetch_table, parse_style_tags
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSION_STATS_PATH = Path(os.getenv("SESSION_STATS_PATH", DATA_DIR / "session_stats.npz"))
+UNKNOWN_ROOM_TYPE = "unknown"
+SESSION_STATS_MAX_COUNTED = int(os.getenv("SESSION_STATS_MAX_COUNTED", "1000000"))
+
+
+def _grown(array: np.ndarray, size: int) -> np.ndarray:
+    """Array with room for ``size`` entries (doubling), zero-filled past the old end"""
+    if size <= array.shape[0]:
+        return array
+    grown = np.zeros(max(size, 2 * array.shape[0], 64), dtype=array.dtype)
+    grown[:array.shape[0]] = array
+    return grown
+
+
+def _rate(choices, impressions) -> Optional[float]:
+    return round(float(choices) / float(impressions), 6) if impressions else None
+
+
+class Vocabulary:
+    """Dense integer slots for string keys (artwork ids, style tags, room types)"""
+
+    def __init__(self, keys: Iterable[str] = ()):
+        self.keys: List[str] = []
+        self.slots: Dict[str, int] = {}
+        for key in keys:
+            self.slot(key)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def slot(self, key: str) -> int:
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = self.slots[key] = len(self.keys)
+            self.keys.append(key)
+        return slot
+
+
+class SessionStats:
+    """Running session funnel counters with O(1) reads"""
+
+    def __init__(self, path: Path = DEFAULT_SESSION_STATS_PATH, max_counted: int = SESSION_STATS_MAX_COUNTED):
+        self.path = Path(path)
+        self.max_counted = max_counted
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._reset()
+
+    def _reset(self) -> None:
+        self.built_at: Optional[float] = None
+        self.sessions = 0
+        self.chosen_sessions = 0
+        self._artworks = Vocabulary()
+        self._impressions = np.zeros(0, dtype=np.int64)
+        self._choices = np.zeros(0, dtype=np.int64)
+        # Chosen rank (0-based) -> sessions; choices outside the shown list are counted apart
+        self._ranks = np.zeros(0, dtype=np.int64)
+        self._unranked_choices = 0
+        # Artwork slot -> style tag slots, captured the first time the artwork is seen
+        self._artwork_tags: Dict[int, np.ndarray] = {}
+        self._tags = Vocabulary()
+        self._tag_impressions = np.zeros(0, dtype=np.int64)
+        self._tag_choices = np.zeros(0, dtype=np.int64)
+        self._rooms = Vocabulary([UNKNOWN_ROOM_TYPE])
+        self._room_sessions = np.zeros(0, dtype=np.int64)
+        self._room_choices = np.zeros(0, dtype=np.int64)
+        self._user_room: Dict[str, int] = {}
+        # Tag epoch, and artwork slot -> [(epoch they were replaced at, tag slots)] for sessions counted earlier
+        self._tag_epoch = 0
+        self._retired_tags: Dict[int, List[Tuple[int, np.ndarray]]] = {}
+        # Session id (oldest first) -> row of the room slot and tag epoch it was counted under
+        self._counted: "OrderedDict[str, int]" = OrderedDict()
+        self._counted_rooms = np.zeros(0, dtype=np.int32)
+        self._counted_epochs = np.zeros(0, dtype=np.int32)
+        self._free_rows: List[int] = []
+
+    @property
+    def is_ready(self) -> bool:
+        self._ensure_loaded()
+        return self.built_at is not None
+
+    # Incremental updates
+
+    def record(self, row: Dict[str, Any]) -> None:
+        """Count a written session row"""
+        self._apply([row], 1)
+
+    def retract(self, row: Dict[str, Any]) -> None:
+        """Take back a session row's counts (before an update, or after a delete)"""
+        self._apply([row], -1)
+
+    def apply_change(self, previous: Optional[Dict[str, Any]], current: Optional[Dict[str, Any]]) -> None:
+        """Session listener: swap a row's old contribution for its new one"""
+        if previous:
+            self.retract(previous)
+        if current:
+            self.record(current)
+
+    def note_room_type(self, user_id, room_type: Optional[str]) -> None:
+        """Remember the room type of a user's latest room upload for their later sessions"""
+        if not room_type or not self.is_ready:
+            return
+        with self._lock:
+            self._user_room[str(user_id)] = self._rooms.slot(room_type)
+
+    def forget_user(self, user_id) -> None:
+        """Drop what is remembered about a purged user (their sessions are retracted as they are deleted)"""
+        with self._lock:
+            self._user_room.pop(str(user_id), None)
+
+    def note_artwork_tags(self, artwork_id, style_tags: Optional[List[str]]) -> None:
+        """Use these tags for an artwork's future impressions and choices"""
+        if not self.is_ready:
+            return
+        with self._lock:
+            slot = self._artworks.slot(str(artwork_id))
+            tags = np.array([self._tags.slot(tag) for tag in style_tags or ()], dtype=np.int64)
+            previous = self._artwork_tags.get(slot)
+            if previous is not None and not np.array_equal(previous, tags):
+                # Sessions counted before this epoch keep being taken back under the old tags
+                self._tag_epoch += 1
+                self._retired_tags.setdefault(slot, []).append((self._tag_epoch, previous))
+            self._artwork_tags[slot] = tags
+
+    def _apply(self, rows: List[Dict[str, Any]], sign: int) -> None:
+        if not self.is_ready:
+            return
+        catalog_tags = self._catalog_tags(rows) if sign > 0 else {}
+        with self._lock:
+            self._accumulate(rows, sign, catalog_tags)
+
+    def _catalog_tags(self, rows: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+        """Snapshot style tags of artworks in ``rows`` seen for the first time, looked up without holding the lock"""
+        ids = {str(a) for row in rows for a in (*(row.get("topk_ids") or ()), row.get("chosen_id")) if a is not None}
+        with self._lock:
+            unseen = [a for a in ids if self._artworks.slots.get(a) not in self._artwork_tags]
+        if not unseen or not catalog_snapshot.is_ready:
+            return {}
+        return {a: parse_style_tags(catalog_snapshot.artwork(a) or {}) for a in unseen}
+
+    def _accumulate(self, rows: List[Dict[str, Any]], sign: int, catalog_tags: Optional[Dict[str, List[str]]] = None) -> None:
+        """Add (sign=1) or subtract (sign=-1) a batch of session rows with one bincount per counter"""
+        shown: List[int] = []
+        chosen: List[int] = []
+        ranks: List[int] = []
+        rooms: List[int] = []
+        room_chosen: List[int] = []
+        shown_tags: List[np.ndarray] = []
+        chosen_tags: List[np.ndarray] = []
+        unranked = 0
+        for row in rows:
+            session_id = str(row["id"]) if row.get("id") is not None else None
+            topk = [self._artworks.slot(str(a)) for a in row.get("topk_ids") or ()]
+            choice = self._artworks.slot(str(row["chosen_id"])) if row.get("chosen_id") is not None else None
+            counted = self._forget(session_id) if sign < 0 and session_id else None
+            if counted is None:
+                # A new session, or one no longer remembered: use the current slots
+                counted = (self._user_room.get(str(row.get("user_id")), 0), self._tag_epoch)
+            room, epoch = counted
+            if sign > 0 and session_id:
+                self._remember(session_id, room)
+            shown.extend(topk)
+            rooms.append(room)
+            shown_tags.extend(self._tags_for(slot, catalog_tags, epoch) for slot in topk)
+            if choice is not None:
+                chosen.append(choice)
+                room_chosen.append(room)
+                chosen_tags.append(self._tags_for(choice, catalog_tags, epoch))
+                if choice in topk:
+                    ranks.append(topk.index(choice))
+                else:
+                    unranked += 1
+
+        self.sessions += sign * len(rows)
+        self.chosen_sessions += sign * len(chosen)
+        self._unranked_choices += sign * unranked
+        self._impressions = self._add(self._impressions, shown, sign, len(self._artworks))
+        self._choices = self._add(self._choices, chosen, sign, len(self._artworks))
+        self._ranks = self._add(self._ranks, ranks, sign, max(ranks, default=-1) + 1)
+        self._tag_impressions = self._add(self._tag_impressions, np.concatenate(shown_tags) if shown_tags else [], sign, len(self._tags))
+        self._tag_choices = self._add(self._tag_choices, np.concatenate(chosen_tags) if chosen_tags else [], sign, len(self._tags))
+        self._room_sessions = self._add(self._room_sessions, rooms, sign, len(self._rooms))
+        self._room_choices = self._add(self._room_choices, room_chosen, sign, len(self._rooms))
+
+    @staticmethod
+    def _add(counts: np.ndarray, slots, sign: int, size: int) -> np.ndarray:
+        counts = _grown(counts, size)
+        if len(slots):
+            hits = np.bincount(np.asarray(slots, dtype=np.int64), minlength=size)
+            counts[:hits.size] += sign * hits
+        return counts
+
+    def _remember(self, session_id: str, room: int) -> None:
+        """Keep the slots a session is counted under, dropping the oldest session past ``max_counted``"""
+        if self.max_counted <= 0:
+            return
+        row = self._counted.pop(session_id, None)
+        if row is None:
+            if self._free_rows:
+                row = self._free_rows.pop()
+            elif len(self._counted) >= self.max_counted:
+                _, row = self._counted.popitem(last=False)
+            else:
+                row = len(self._counted)
+                self._counted_rooms = _grown(self._counted_rooms, row + 1)
+                self._counted_epochs = _grown(self._counted_epochs, row + 1)
+        self._counted[session_id] = row
+        self._counted_rooms[row] = room
+        self._counted_epochs[row] = self._tag_epoch
+
+    def _forget(self, session_id: str) -> Optional[Tuple[int, int]]:
+        """(room slot, tag epoch) a remembered session was counted under"""
+        row = self._counted.pop(session_id, None)
+        if row is None:
+            return None
+        self._free_rows.append(row)
+        return int(self._counted_rooms[row]), int(self._counted_epochs[row])
+
+    def _prune_retired_tags(self) -> None:
+        """Drop replaced tags that no remembered session was counted under"""
+        rows = np.fromiter(self._counted.values(), dtype=np.int64, count=len(self._counted))
+        oldest = int(self._counted_epochs[rows].min()) if rows.size else self._tag_epoch
+        for slot in list(self._retired_tags):
+            kept = [(until, tags) for until, tags in self._retired_tags[slot] if until > oldest]
+            if kept:
+                self._retired_tags[slot] = kept
+            else:
+                del self._retired_tags[slot]
+
+    def _tags_for(self, slot: int, catalog_tags: Optional[Dict[str, List[str]]], epoch: Optional[int] = None) -> np.ndarray:
+        if epoch is not None:
+            for until, tags in self._retired_tags.get(slot, ()):
+                if epoch < until:
+                    return tags
+        tags = self._artwork_tags.get(slot)
+        if tags is None:
+            # First sighting since the last rebuild: take the tags looked up from the catalog snapshot
+            names = (catalog_tags or {}).get(self._artworks.keys[slot], ())
+            tags = np.array([self._tags.slot(tag) for tag in names], dtype=np.int64)
+            self._artwork_tags[slot] = tags
+        return tags
+
+    # Reads
+
+    def funnel(self) -> Dict[str, Any]:
+        """Overall session and choice totals plus mean reciprocal rank of choices"""
+        self._require_ready()
+        with self._lock:
+            ranked = int(self._ranks.sum())
+            impressions = int(self._impressions.sum())
+            reciprocal = float(self._ranks @ (1.0 / np.arange(1, self._ranks.size + 1))) if ranked else 0.0
+            return {
+                "sessions": self.sessions,
+                "chosen_sessions": self.chosen_sessions,
+                "choice_rate": _rate(self.chosen_sessions, self.sessions),
+                "impressions": impressions,
+                "click_through_rate": _rate(self.chosen_sessions, impressions),
+                "mean_reciprocal_rank": round(reciprocal / self.sessions, 6) if self.sessions else None,
+                "built_at": self.built_at,
+            }
+
+    def artwork(self, artwork_id) -> Dict[str, Any]:
+        """Impressions, choices and click-through rate of one artwork"""
+        self._require_ready()
+        with self._lock:
+            slot = self._artworks.slots.get(str(artwork_id))
+            impressions = int(self._impressions[slot]) if slot is not None else 0
+            choices = int(self._choices[slot]) if slot is not None else 0
+        return {"artwork_id": str(artwork_id), "impressions": impressions, "choices": choices, "click_through_rate": _rate(choices, impressions)}
+
+    def top_artworks(self, by: str = "choices", limit: int = 10, min_impressions: int = 1) -> List[Dict[str, Any]]:
+        """Artworks with the most impressions or choices, or the highest click-through rate"""
+        self._require_ready()
+        with self._lock:
+            size = len(self._artworks)
+            impressions, choices = self._impressions[:size], self._choices[:size]
+            if by == "impressions":
+                scores = impressions.astype(np.float64)
+            elif by == "choices":
+                scores = choices.astype(np.float64)
+            elif by == "click_through_rate":
+                scores = np.where(impressions > 0, choices / np.maximum(impressions, 1), 0.0)
+            else:
+                raise ValueError(f"Unknown sort key: {by}")
+            scores = np.where(impressions >= min_impressions, scores, -np.inf)
+            return [
+                {
+                    "artwork_id": self._artworks.keys[i],
+                    "impressions": int(impressions[i]),
+                    "choices": int(choices[i]),
+                    "click_through_rate": _rate(choices[i], impressions[i]),
+                }
+                for i in top_k(scores, limit)
+                if np.isfinite(scores[i])
+            ]
+
+    def rank_distribution(self) -> Dict[str, Any]:
+        """How often the chosen artwork was shown at each (1-based) rank"""
+        self._require_ready()
+        with self._lock:
+            ranks = self._ranks
+            last = int(np.nonzero(ranks)[0].max()) + 1 if ranks.any() else 0
+            total = int(ranks.sum()) + self._unranked_choices
+            return {
+                "ranks": [
+                    {"rank": rank + 1, "choices": int(count), "share": _rate(count, total)}
+                    for rank, count in enumerate(ranks[:last])
+                ],
+                "not_shown": self._unranked_choices,
+                "total_choices": total,
+            }
+
+    def style_tags(self) -> List[Dict[str, Any]]:
+        """Impressions, choices and click-through rate per style tag, most chosen first"""
+        self._require_ready()
+        with self._lock:
+            size = len(self._tags)
+            impressions, choices = self._tag_impressions[:size], self._tag_choices[:size]
+            order = np.lexsort((-impressions, -choices))
+            return [
+                {"style_tag": self._tags.keys[i], "impressions": int(impressions[i]), "choices": int(choices[i]), "click_through_rate": _rate(choices[i], impressions[i])}
+                for i in order
+                if impressions[i] or choices[i]
+            ]
+
+    def room_types(self) -> List[Dict[str, Any]]:
+        """Sessions, choices and choice rate per room type, busiest first"""
+        self._require_ready()
+        with self._lock:
+            size = len(self._rooms)
+            sessions, choices = self._room_sessions[:size], self._room_choices[:size]
+            return [
+                {"room_type": self._rooms.keys[i], "sessions": int(sessions[i]), "choices": int(choices[i]), "choice_rate": _rate(choices[i], sessions[i])}
+                for i in np.argsort(-sessions, kind="stable")
+                if sessions[i]
+            ]
+
+    # Rebuild and persistence
+
+    def rebuild(self, client=None, page_size: int = 1000) -> None:
+        """Recount everything from the session, artwork and room_upload tables"""
+        if client is None:
+            from database import db_connection
+            client = db_connection.client
+        artworks = fetch_table(client, "artwork", "id, style_tags", page_size)
+        uploads = fetch_table(client, "room_upload", "id, user_id, room_type, created_at", page_size)
+        sessions = fetch_table(client, "session", SESSION_COLUMNS, page_size)
+
+        with self._lock:
+            self._reset()
+            for artwork in artworks:
+                slot = self._artworks.slot(str(artwork["id"]))
+                self._artwork_tags[slot] = np.array([self._tags.slot(tag) for tag in parse_style_tags(artwork)], dtype=np.int64)
+            for upload in sorted(uploads, key=lambda u: str(u.get("created_at") or "")):
+                if upload.get("room_type"):
+                    self._user_room[str(upload["user_id"])] = self._rooms.slot(upload["room_type"])
+            for start in range(0, len(sessions), page_size):
+                self._accumulate(sessions[start:start + page_size], 1)
+            self.built_at = time.time()
+            self._loaded = True
+        logger.info(f"Rebuilt session stats from {len(sessions)} sessions over {len(self._artworks)} artworks")
+
+    def save(self, path: Optional[Path] = None) -> Path:
+        """Persist the counters atomically to a .npz file"""
+        path = Path(path or self.path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.stem + ".tmp.npz")
+        with self._lock:
+            slots = sorted(self._artwork_tags)
+            tag_lists = [self._artwork_tags[slot] for slot in slots]
+            self._prune_retired_tags()
+            retired = [(slot, until, tags) for slot, versions in self._retired_tags.items() for until, tags in versions]
+            rows = np.fromiter(self._counted.values(), dtype=np.int64, count=len(self._counted))
+            size = len(self._artworks)
+            np.savez(
+                tmp,
+                built_at=np.float64(self.built_at or time.time()),
+                totals=np.array([self.sessions, self.chosen_sessions, self._unranked_choices], dtype=np.int64),
+                artwork_ids=np.asarray(self._artworks.keys, dtype=str),
+                impressions=self._impressions[:size],
+                choices=self._choices[:size],
+                ranks=self._ranks,
+                # Artwork -> tag membership in CSR form: tags of tagged_slots[i] are tag_slots[offsets[i]:offsets[i + 1]]
+                tagged_slots=np.asarray(slots, dtype=np.int64),
+                tag_offsets=np.cumsum([0] + [len(tags) for tags in tag_lists], dtype=np.int64),
+                tag_slots=np.concatenate(tag_lists) if tag_lists else np.zeros(0, dtype=np.int64),
+                tags=np.asarray(self._tags.keys, dtype=str),
+                tag_impressions=self._tag_impressions[:len(self._tags)],
+                tag_choices=self._tag_choices[:len(self._tags)],
+                room_types=np.asarray(self._rooms.keys, dtype=str),
+                room_sessions=self._room_sessions[:len(self._rooms)],
+                room_choices=self._room_choices[:len(self._rooms)],
+                user_ids=np.asarray(list(self._user_room), dtype=str),
+                user_rooms=np.asarray(list(self._user_room.values()), dtype=np.int64),
+                # Room slot and tag epoch each remembered session was counted under, oldest first
+                counted_ids=np.asarray(list(self._counted), dtype=str),
+                counted_rooms=self._counted_rooms[rows],
+                counted_epochs=self._counted_epochs[rows],
+                # Replaced artwork tags in CSR form: retired_slots[i] had tags retired_tags[offsets[i]:offsets[i + 1]] before retired_until[i]
+                tag_epoch=np.int64(self._tag_epoch),
+                retired_slots=np.asarray([r[0] for r in retired], dtype=np.int64),
+                retired_until=np.asarray([r[1] for r in retired], dtype=np.int64),
+                retired_offsets=np.cumsum([0] + [len(r[2]) for r in retired], dtype=np.int64),
+                retired_tags=np.concatenate([r[2] for r in retired]) if retired else np.zeros(0, dtype=np.int64),
+            )
+        os.replace(tmp, path)
+        logger.info(f"Saved session stats to {path}")
+        return path
+
+    def load(self, path: Optional[Path] = None) -> None:
+        """Load previously saved counters"""
+        path = Path(path or self.path)
+        with np.load(path) as data, self._lock:
+            self._reset()
+            self.built_at = float(data["built_at"])
+            self.sessions, self.chosen_sessions, self._unranked_choices = (int(v) for v in data["totals"])
+            self._artworks = Vocabulary(map(str, data["artwork_ids"]))
+            self._impressions = data["impressions"].astype(np.int64)
+            self._choices = data["choices"].astype(np.int64)
+            self._ranks = data["ranks"].astype(np.int64)
+            offsets, tag_slots = data["tag_offsets"], data["tag_slots"].astype(np.int64)
+            self._artwork_tags = {int(slot): tag_slots[offsets[i]:offsets[i + 1]] for i, slot in enumerate(data["tagged_slots"])}
+            self._tags = Vocabulary(map(str, data["tags"]))
+            self._tag_impressions = data["tag_impressions"].astype(np.int64)
+            self._tag_choices = data["tag_choices"].astype(np.int64)
+            self._rooms = Vocabulary(map(str, data["room_types"]))
+            self._room_sessions = data["room_sessions"].astype(np.int64)
+            self._room_choices = data["room_choices"].astype(np.int64)
+            self._user_room = dict(zip(map(str, data["user_ids"]), map(int, data["user_rooms"])))
+            if "counted_epochs" in data.files:
+                # Keep the newest max_counted sessions
+                start = max(len(data["counted_ids"]) - max(self.max_counted, 0), 0)
+                self._counted = OrderedDict((str(session_id), row) for row, session_id in enumerate(data["counted_ids"][start:]))
+                self._counted_rooms = data["counted_rooms"][start:].astype(np.int32)
+                self._counted_epochs = data["counted_epochs"][start:].astype(np.int32)
+                self._tag_epoch = int(data["tag_epoch"])
+                offsets, tags = data["retired_offsets"], data["retired_tags"].astype(np.int64)
+                for i, (slot, until) in enumerate(zip(data["retired_slots"], data["retired_until"])):
+                    self._retired_tags.setdefault(int(slot), []).append((int(until), tags[offsets[i]:offsets[i + 1]]))
+            self._loaded = True
+        logger.info(f"Loaded session stats for {self.sessions} sessions from {path}")
+
+    def _require_ready(self) -> None:
+        if not self.is_ready:
+            raise IndexNotReadyError(
+                "Session stats are not built - run `python -m services.session_stats` or POST /api/jobs/reindex"
+            )
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if self.path.exists():
+            try:
+                self.load()
+            except Exception as e:
+                logger.error(f"Failed to load session stats from {self.path}: {e}")
+
+
+# Global session stats instance
+session_stats = SessionStats()
+on_session_change(session_stats.apply_change)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild session funnel counters from the database")
+    parser.add_argument("--out", default=str(DEFAULT_SESSION_STATS_PATH), help="Output .npz path")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    stats = SessionStats(path=Path(args.out))
+    stats.rebuild()
+    stats.save()
+    print(stats.funnel())
+
+
+if __name__ == "__main__":
+    main()
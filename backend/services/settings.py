@@ -0,0 +1,15 @@
+"""
+Filesystem locations shared by the backend services
+"""
+import os
+from pathlib import Path
+
+# Indexes, snapshots and job queues are persisted here (override with ARTDECOR_DATA_DIR)
+DATA_DIR = Path(os.getenv("ARTDECOR_DATA_DIR", Path(__file__).resolve().parent.parent / "data"))
+
+
+def data_path(*parts: str) -> Path:
+    """Return a path under DATA_DIR, creating parent directories as needed"""
+    path = DATA_DIR.joinpath(*parts)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
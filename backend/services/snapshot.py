@@ -0,0 +1,336 @@
+"""
+Last-known-good catalog snapshot for degraded serving.
+
+The artwork and artwork_embedding tables are periodically copied to a local
+``.npz`` file. When the database is unavailable (the resilience layer raises
+``DatabaseUnavailableError``, immediately once its circuit is open), catalog
+reads decorated with ``catalog_snapshot.serves_stale`` answer from the
+snapshot instead of failing: lookups, pagination, filters, text search and
+vector search all run in memory. Each such response carries ``X-Data-Source: snapshot``
+and an ``X-Data-Age`` header, and asks the background refresher to
+revalidate. Similar-artwork lists come from the neighbour table, which is
+already served locally.
+
+The refresher thread re-takes the snapshot every
+``SNAPSHOT_REFRESH_INTERVAL`` seconds, and sooner (at most every
+``SNAPSHOT_REVALIDATE_INTERVAL`` seconds) while stale data is being served.
+Take one by hand with:
+
+    python -m services.snapshot
+"""
+import argparse
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from models.artwork import ARTWORK_COLUMNS
+from services import request_context
+from services.catalog_index import CatalogIndex
+from services.embedding_store import EMBEDDING_DIM, normalize_rows, parse_vector, top_k
+from services.resilience import DatabaseUnavailableError
+from services.serialization import trusted_model
+from services.settings import DATA_DIR
+from services.text_index import TextIndex
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SNAPSHOT_PATH = Path(os.getenv("CATALOG_SNAPSHOT_PATH", DATA_DIR / "catalog_snapshot.npz"))
+SNAPSHOT_REFRESH_INTERVAL = float(os.getenv("SNAPSHOT_REFRESH_INTERVAL", "900"))
+SNAPSHOT_REVALIDATE_INTERVAL = float(os.getenv("SNAPSHOT_REVALIDATE_INTERVAL", "30"))
+SNAPSHOT_PAGE_SIZE = 1000
+
+
+def fetch_table(client, table: str, columns: str, page_size: int = SNAPSHOT_PAGE_SIZE) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    offset = 0
+    while True:
+        result = client.table(table).select(columns).order("id").range(offset, offset + page_size - 1).execute()
+        batch = result.data or []
+        rows.extend(batch)
+        if len(batch) < page_size:
+            return rows
+        offset += page_size
+
+
+def parse_style_tags(row: Dict[str, Any]) -> List[str]:
+    tags = row.get("style_tags") or []
+    if isinstance(tags, str):
+        try:
+            tags = json.loads(tags)
+        except ValueError:
+            tags = [tags]
+    return tags
+
+
+def _price(row: Dict[str, Any]) -> Optional[float]:
+    return float(row["price"]) if row.get("price") is not None else None
+
+
+class CatalogSnapshot:
+    """In-memory copy of the artwork and artwork_embedding tables"""
+
+    def __init__(self, path: Path = DEFAULT_SNAPSHOT_PATH):
+        self.path = Path(path)
+        self.taken_at: Optional[float] = None
+        self.artworks: List[Dict[str, Any]] = []
+        self.embedding_ids: List[str] = []
+        self.embedding_artwork_ids: List[str] = []
+        self.embedding_created_at: List[Optional[str]] = []
+        self.vectors = np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        self._normalized = self.vectors
+        self._artwork_pos: Dict[str, int] = {}
+        self._artwork_index = CatalogIndex()
+        self._text_index = TextIndex()
+        self._embedding_pos: Dict[str, int] = {}
+        self._embedding_of_artwork: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_attempt = 0.0
+
+    @property
+    def is_ready(self) -> bool:
+        self._ensure_loaded()
+        return self.taken_at is not None
+
+    @property
+    def age(self) -> float:
+        """Seconds since the snapshot was taken"""
+        return time.time() - self.taken_at if self.taken_at is not None else float("inf")
+
+    def refresh(self, client=None) -> None:
+        """Copy both catalog tables from the database and persist them"""
+        if client is None:
+            from database import db_connection
+            client = db_connection.client
+        taken_at = time.time()
+        artworks = fetch_table(client, "artwork", ARTWORK_COLUMNS)
+        embeddings = fetch_table(client, "artwork_embedding", "id, artwork_id, vector, created_at")
+        vectors = np.stack([parse_vector(row["vector"]) for row in embeddings]) if embeddings else np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        self._set(
+            taken_at,
+            artworks,
+            [str(row["id"]) for row in embeddings],
+            [str(row["artwork_id"]) for row in embeddings],
+            [row.get("created_at") for row in embeddings],
+            vectors,
+        )
+        self.save()
+        logger.info(f"Catalog snapshot refreshed: {len(artworks)} artworks, {len(embeddings)} embeddings")
+
+    def save(self, path: Optional[Path] = None) -> Path:
+        """Persist the snapshot atomically to a .npz file"""
+        path = Path(path or self.path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.stem + ".tmp.npz")
+        with self._lock:
+            np.savez(
+                tmp,
+                taken_at=np.float64(self.taken_at),
+                artworks=np.asarray(json.dumps(self.artworks, default=str)),
+                embedding_ids=np.asarray(self.embedding_ids, dtype=str),
+                embedding_artwork_ids=np.asarray(self.embedding_artwork_ids, dtype=str),
+                embedding_created_at=np.asarray(json.dumps(self.embedding_created_at, default=str)),
+                vectors=self.vectors,
+            )
+        os.replace(tmp, path)
+        return path
+
+    def load(self, path: Optional[Path] = None) -> None:
+        """Load a previously saved snapshot"""
+        path = Path(path or self.path)
+        with np.load(path) as data:
+            self._set(
+                float(data["taken_at"]),
+                json.loads(str(data["artworks"])),
+                list(map(str, data["embedding_ids"])),
+                list(map(str, data["embedding_artwork_ids"])),
+                json.loads(str(data["embedding_created_at"])),
+                data["vectors"].astype(np.float32),
+            )
+        logger.info(f"Loaded catalog snapshot from {path} ({self.age:.0f}s old)")
+
+    # Catalog queries answered from the snapshot
+
+    def artwork(self, artwork_id) -> Optional[Dict[str, Any]]:
+        position = self._artwork_pos.get(str(artwork_id))
+        return self.artworks[position] if position is not None else None
+
+    def artwork_page(self, limit: int = 10, offset: int = 0) -> List[Dict[str, Any]]:
+        return self.artworks[offset:offset + limit]
+
+    def filter_artworks(
+        self,
+        style_tags: Optional[List[str]] = None,
+        brand: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        matches = self._artwork_index.search(style_tags, brand, min_price, max_price)
+        if brand is not None:
+            # The brand index is case-insensitive; snapshot filters match the database's exact eq
+            matches = [row for row in matches if row.get("brand") == brand]
+        return matches
+
+    def search_artworks(self, search_params) -> List[Dict[str, Any]]:
+        matches = self.filter_artworks(search_params.style_tags, search_params.brand, search_params.min_price, search_params.max_price)
+        return matches[search_params.offset:search_params.offset + search_params.limit]
+
+    def artworks_by_style(self, style_tags: List[str]) -> List[Dict[str, Any]]:
+        return self.filter_artworks(style_tags=style_tags)
+
+    def artworks_by_price_range(self, min_price, max_price) -> List[Dict[str, Any]]:
+        return self.filter_artworks(min_price=min_price, max_price=max_price)
+
+    def artworks_by_brand(self, brand: str) -> List[Dict[str, Any]]:
+        return self.filter_artworks(brand=brand)
+
+    def search_text(self, query: str, limit: int = 10, offset: int = 0) -> List[Dict[str, Any]]:
+        return [{**row, "score": score} for row, score in self._text_index.search(query, limit, offset)]
+
+    def recent_artworks(self, limit: int = 5) -> List[Dict[str, Any]]:
+        return sorted(self.artworks, key=lambda row: str(row.get("created_at") or ""), reverse=True)[:limit]
+
+    def count_artworks(self) -> int:
+        return len(self.artworks)
+
+    def embedding(self, embedding_id) -> Optional[Dict[str, Any]]:
+        return self._embedding_row(self._embedding_pos.get(str(embedding_id)))
+
+    def embedding_for_artwork(self, artwork_id) -> Optional[Dict[str, Any]]:
+        return self._embedding_row(self._embedding_of_artwork.get(str(artwork_id)))
+
+    def embedding_page(self, limit: int = 10, offset: int = 0) -> List[Dict[str, Any]]:
+        return [self._embedding_row(i) for i in range(offset, min(offset + limit, len(self.embedding_ids)))]
+
+    def count_embeddings(self) -> int:
+        return len(self.embedding_ids)
+
+    def search_embeddings(self, search_params) -> List[Dict[str, Any]]:
+        """Exact cosine search over the snapshot vectors, shaped like the match_artworks RPC"""
+        query = normalize_rows(np.asarray(search_params.query_vector, dtype=np.float32).reshape(1, -1))[0]
+        scores = self._normalized @ query
+        return [
+            {"id": self.embedding_ids[i], "artwork_id": self.embedding_artwork_ids[i], "similarity": float(scores[i])}
+            for i in top_k(scores, search_params.limit)
+            if scores[i] >= search_params.threshold
+        ]
+
+    def serves_stale(self, fallback: Callable[..., Any], model=None):
+        """Decorate an async CRUD read: on DatabaseUnavailableError, answer from the snapshot
+
+        ``fallback`` is an unbound ``CatalogSnapshot`` method taking the same
+        arguments as the CRUD method; rows are wrapped in ``model`` when given.
+        """
+
+        def decorator(method):
+            @functools.wraps(method)
+            async def wrapper(crud, *args, **kwargs):
+                try:
+                    return await method(crud, *args, **kwargs)
+                except DatabaseUnavailableError:
+                    if not self.is_ready:
+                        raise
+                    self.request_revalidation()
+                    request_context.note_data_age(self.age, "snapshot")
+                    result = fallback(self, *args, **kwargs)
+                    if model is None or result is None:
+                        return result
+                    if isinstance(result, list):
+                        return [trusted_model(model, row) for row in result]
+                    return trusted_model(model, result)
+
+            return wrapper
+
+        return decorator
+
+    # Background refresh
+
+    def start_background_refresh(self) -> None:
+        """Start the refresher thread (idempotent)"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._refresh_loop, name="catalog-snapshot", daemon=True)
+        self._thread.start()
+
+    def request_revalidation(self) -> None:
+        """Ask the refresher to try again soon (rate-limited)"""
+        self._wake.set()
+
+    def _refresh_loop(self) -> None:
+        if self.age < SNAPSHOT_REFRESH_INTERVAL:
+            self._wake.wait(SNAPSHOT_REFRESH_INTERVAL - self.age)
+        while True:
+            self._wake.clear()
+            self._last_attempt = time.monotonic()
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"Catalog snapshot refresh failed, keeping data from {self.age:.0f}s ago: {e}")
+            woken = self._wake.wait(SNAPSHOT_REFRESH_INTERVAL)
+            if woken:
+                # Revalidation requests arrive with every stale response; don't hammer a struggling database
+                time.sleep(max(0.0, SNAPSHOT_REVALIDATE_INTERVAL - (time.monotonic() - self._last_attempt)))
+
+    def _embedding_row(self, position: Optional[int]) -> Optional[Dict[str, Any]]:
+        if position is None:
+            return None
+        return {
+            "id": self.embedding_ids[position],
+            "artwork_id": self.embedding_artwork_ids[position],
+            "vector": self.vectors[position].tolist(),
+            "created_at": self.embedding_created_at[position],
+        }
+
+    def _set(self, taken_at, artworks, embedding_ids, embedding_artwork_ids, embedding_created_at, vectors) -> None:
+        artwork_index = CatalogIndex(artworks, price_of=_price, tags_of=parse_style_tags)
+        text_index = TextIndex(artworks, tags_of=parse_style_tags)
+        with self._lock:
+            self.taken_at = taken_at
+            self.artworks = artworks
+            self.embedding_ids = embedding_ids
+            self.embedding_artwork_ids = embedding_artwork_ids
+            self.embedding_created_at = embedding_created_at
+            self.vectors = vectors
+            self._normalized = normalize_rows(vectors) if len(vectors) else vectors
+            self._artwork_pos = {str(row["id"]): i for i, row in enumerate(artworks)}
+            self._artwork_index = artwork_index
+            self._text_index = text_index
+            self._embedding_pos = {embedding_id: i for i, embedding_id in enumerate(embedding_ids)}
+            self._embedding_of_artwork = {artwork_id: i for i, artwork_id in enumerate(embedding_artwork_ids)}
+            self._loaded = True
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if self.path.exists():
+            try:
+                self.load()
+            except Exception as e:
+                logger.error(f"Failed to load catalog snapshot from {self.path}: {e}")
+
+
+# Global catalog snapshot instance
+catalog_snapshot = CatalogSnapshot()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Take a last-known-good snapshot of the artwork catalog")
+    parser.add_argument("--out", default=str(DEFAULT_SNAPSHOT_PATH), help="Output .npz path")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    CatalogSnapshot(path=Path(args.out)).refresh()
+
+
+if __name__ == "__main__":
+    main()
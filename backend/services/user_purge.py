@@ -0,0 +1,150 @@
+"""
+Cross-table purge of everything stored about a user.
+
+``purge_user`` fans the per-table deletions (sessions, room uploads, user
+profile) out concurrently on a small thread pool. The Supabase client is
+synchronous, so running them one after another would cost the sum of their
+latencies. Large tables are deleted in chunks of ``PURGE_CHUNK_SIZE`` rows
+(``delete_in_chunks``), so no single statement runs long enough to hit the
+write timeout. Each chunk is deleted by the owning filter plus an id bound,
+so the request URL stays the same size whatever the chunk size. Once the rows are gone, the state held in memory is dropped
+too:
+
+* session aggregates, via the session listeners (each deleted row is
+  retracted), and the user's room type in the session stats;
+* stale read responses the resilience layer kept for the purged tables;
+* coalesced reads, which restart after the CRUD deletes.
+
+The result is a per-table report of deleted rows and timings. Privacy
+requests arriving in bursts go through ``purge_users``, which purges up to
+``PURGE_CONCURRENCY`` users at once. Purge a user by hand with:
+
+    python -m services.user_purge <user_id> [...]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Iterator, List
+from uuid import UUID
+
+logger = logging.getLogger(__name__)
+
+PURGE_CHUNK_SIZE = int(os.getenv("PURGE_CHUNK_SIZE", "100"))
+PURGE_CONCURRENCY = int(os.getenv("PURGE_CONCURRENCY", "4"))
+PURGE_WORKERS = int(os.getenv("PURGE_WORKERS", "8"))
+# Tables holding per-user rows, all keyed by user_id
+PURGE_TABLES = ("session", "room_upload", "user_profile")
+
+_pool = ThreadPoolExecutor(max_workers=PURGE_WORKERS, thread_name_prefix="purge")
+
+
+class PurgeIncompleteError(RuntimeError):
+    """Some tables could not be purged; ``report`` says which (purging again is safe)"""
+
+    def __init__(self, report: Dict[str, Any]):
+        failed = [table for table, result in report["tables"].items() if "error" in result]
+        super().__init__(f"Purge of user {report['user_id']} failed for: {', '.join(failed)}")
+        self.report = report
+
+
+def delete_in_chunks(client, table: str, column: str, value: Any, chunk_size: int = PURGE_CHUNK_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """Delete rows where ``column = value``, at most ``chunk_size`` per statement; yields each chunk's deleted rows"""
+    while True:
+        ids = [row["id"] for row in client.table(table).select("id").eq(column, str(value)).order("id").limit(chunk_size).execute().data or []]
+        if not ids:
+            return
+        # Bound the chunk by its highest id rather than listing the ids, which would grow the URL with the chunk
+        deleted = client.table(table).delete().eq(column, str(value)).lte("id", ids[-1]).execute().data or []
+        if not deleted:
+            logger.warning(f"Delete from {table} removed none of {len(ids)} selected rows; stopping")
+            return
+        yield deleted
+        if len(ids) < chunk_size:
+            return
+
+
+def _run_deletion(deletion: Callable[[], Awaitable[Any]]) -> Dict[str, Any]:
+    start = time.perf_counter()
+    deleted = asyncio.run(deletion())
+    return {"deleted": int(deleted), "ms": round((time.perf_counter() - start) * 1000, 1)}
+
+
+def forget_user(user_id) -> None:
+    """Drop in-memory state about a purged user that the table deletes don't reach"""
+    from services.resilience import db_executor
+    from services.session_stats import session_stats
+
+    session_stats.forget_user(user_id)
+    db_executor.stale.discard(PURGE_TABLES)
+
+
+async def purge_user(user_id: UUID, chunk_size: int = PURGE_CHUNK_SIZE) -> Dict[str, Any]:
+    """Delete a user's rows from every table concurrently; returns per-table counts and timings"""
+    from crud.room_upload_crud import room_upload_crud
+    from crud.session_crud import session_crud
+    from crud.user_profile_crud import user_profile_crud
+
+    deletions = {
+        "session": lambda: session_crud.delete_sessions_by_user_id(user_id, chunk_size=chunk_size),
+        "room_upload": lambda: room_upload_crud.delete_room_uploads_by_user_id(user_id, chunk_size=chunk_size),
+        "user_profile": lambda: user_profile_crud.delete_user_profile_by_user_id(user_id),
+    }
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(loop.run_in_executor(_pool, _run_deletion, deletion) for deletion in deletions.values()),
+        return_exceptions=True,
+    )
+    forget_user(user_id)
+
+    tables: Dict[str, Dict[str, Any]] = {}
+    for table, result in zip(deletions, results):
+        if isinstance(result, BaseException):
+            logger.error(f"Purging {table} for user {user_id} failed: {result}")
+            tables[table] = {"deleted": 0, "error": str(result)}
+        else:
+            tables[table] = result
+    report = {
+        "user_id": str(user_id),
+        "tables": tables,
+        "total_deleted": sum(result["deleted"] for result in tables.values()),
+        "ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+    if any("error" in result for result in tables.values()):
+        error = PurgeIncompleteError(report)
+        error.__cause__ = next(r for r in results if isinstance(r, BaseException))
+        raise error
+    logger.info(f"Purged user {user_id}: {report['total_deleted']} rows in {report['ms']} ms")
+    return report
+
+
+async def purge_users(user_ids: List[UUID], chunk_size: int = PURGE_CHUNK_SIZE) -> List[Dict[str, Any]]:
+    """Purge many users, ``PURGE_CONCURRENCY`` at a time; failed purges are reported, not raised"""
+    limit = asyncio.Semaphore(PURGE_CONCURRENCY)
+
+    async def one(user_id: UUID) -> Dict[str, Any]:
+        async with limit:
+            try:
+                return await purge_user(user_id, chunk_size=chunk_size)
+            except PurgeIncompleteError as e:
+                return e.report
+
+    return await asyncio.gather(*(one(user_id) for user_id in dict.fromkeys(user_ids)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Delete all data stored about users")
+    parser.add_argument("user_ids", nargs="+", type=UUID, help="Users to purge")
+    parser.add_argument("--chunk-size", type=int, default=PURGE_CHUNK_SIZE, help="Rows deleted per statement")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    for report in asyncio.run(purge_users(args.user_ids, chunk_size=args.chunk_size)):
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Startup warmup and readiness.
+
+Without warmup, the first requests after a deploy pay for creating the
+Supabase client, loading every index file from disk, the first BLAS call and
+cold stale-read caches. ``warmup.start()`` runs these steps in a background
+thread as soon as the app starts:
+
+* ``database``: create the client and test the connection;
+* ``catalog_snapshot`` and each in-memory index (flat, binary, PQ, style
+  clusters, neighbours, duplicates, session stats, co-selection): load from
+  disk;
+* ``query_paths``: run one search through every loaded vector index, so
+  NumPy/BLAS threads and lookup tables are initialised;
+* ``hot_artworks``: read the artworks (and their embeddings) that sessions
+  show most often, falling back to the most recent ones. This opens the
+  connection pool, fills the stale-read cache the resilience layer serves
+  during outages, and renders the rows once through the response serializer.
+
+``GET /ready`` returns 503 until every step has finished, so a load balancer
+only routes traffic to a warm process; ``GET /health`` stays up throughout.
+A failing step is logged and reported but does not block readiness: the
+service still works, just with that component cold. The report lists how
+long each component took. Set ``WARMUP=0`` to run only the database check.
+"""
+import asyncio
+import importlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+WARMUP = os.getenv("WARMUP", "1").lower() not in ("0", "false", "no")
+WARMUP_HOT_ARTWORKS = int(os.getenv("WARMUP_HOT_ARTWORKS", "50"))
+
+Step = Callable[[], Optional[Dict[str, Any]]]
+
+
+class Warmup:
+    """Ordered warmup steps, run once, with per-step timings"""
+
+    def __init__(self):
+        self._steps: List[Tuple[str, Step, bool]] = []
+        self.components: Dict[str, Dict[str, Any]] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    def step(self, name: str, always: bool = False) -> Callable[[Step], Step]:
+        """Register a warmup step; ``always`` steps run even with WARMUP=0"""
+
+        def register(fn: Step) -> Step:
+            self._steps.append((name, fn, always))
+            return fn
+
+        return register
+
+    @property
+    def is_ready(self) -> bool:
+        return self._done.is_set()
+
+    def run(self) -> Dict[str, Any]:
+        """Run every step in order (blocking) and return the report"""
+        self.started_at = self.started_at or time.time()
+        for name, fn, always in self._steps:
+            if not (WARMUP or always):
+                continue
+            start = time.perf_counter()
+            try:
+                component = {"ok": True, **(fn() or {})}
+            except Exception as e:
+                logger.error(f"Warmup step {name} failed: {e}")
+                component = {"ok": False, "error": str(e)}
+            component["ms"] = round((time.perf_counter() - start) * 1000, 1)
+            with self._lock:
+                self.components[name] = component
+        self.finished_at = time.time()
+        self._done.set()
+        timings = ", ".join(f"{name} {c['ms']:.0f} ms" for name, c in self.components.items())
+        logger.info(f"Warmup finished in {(self.finished_at - self.started_at) * 1000:.0f} ms ({timings})")
+        return self.report()
+
+    def start(self) -> None:
+        """Run the warmup in a background thread (readiness flips when it finishes)"""
+        if self.started_at is not None:
+            return
+        self.started_at = time.time()
+        threading.Thread(target=self.run, name="warmup", daemon=True).start()
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            components = {name: dict(component) for name, component in self.components.items()}
+        end = self.finished_at or time.time()
+        return {
+            "ready": self.is_ready,
+            "ms": round((end - self.started_at) * 1000, 1) if self.started_at else None,
+            "pending": [name for name, _, always in self._steps if name not in components and (WARMUP or always)],
+            "components": components,
+        }
+
+
+# Global warmup instance
+warmup = Warmup()
+
+
+@warmup.step("database", always=True)
+def _database() -> Dict[str, Any]:
+    from database import db_connection
+    from services.snapshot import catalog_snapshot
+
+    connected = db_connection.test_connection()
+    if connected:
+        logger.info("Database connection established successfully")
+    elif catalog_snapshot.is_ready:
+        logger.warning(f"Database connection failed - serving catalog reads from a {catalog_snapshot.age:.0f}s old snapshot")
+    else:
+        logger.warning("Database connection failed - running in standalone mode")
+    return {"connected": connected}
+
+
+@warmup.step("catalog_snapshot")
+def _catalog_snapshot() -> Dict[str, Any]:
+    from services.snapshot import catalog_snapshot
+
+    ready = catalog_snapshot.is_ready
+    return {"loaded": ready, "age_seconds": round(catalog_snapshot.age) if ready else None}
+
+
+# Warmup step -> (module, global instance) of each index loaded from disk
+INDEXES = {
+    "flat_index": ("services.flat_index", "flat_index"),
+    "binary_index": ("services.binary_index", "binary_index"),
+    "pq_index": ("services.pq_index", "pq_index"),
+    "style_clusters": ("services.clustering", "style_clusters"),
+    "neighbour_table": ("services.neighbours", "neighbour_table"),
+    "duplicate_index": ("services.dedup", "duplicate_index"),
+    "session_stats": ("services.session_stats", "session_stats"),
+    "coselection_graph": ("services.coselection", "coselection_graph"),
+}
+VECTOR_INDEXES = ("flat_index", "binary_index", "pq_index", "style_clusters")
+
+
+def _index(name: str) -> Any:
+    module, instance = INDEXES[name]
+    return getattr(importlib.import_module(module), instance)
+
+
+def _index_step(name: str) -> Step:
+    def load() -> Dict[str, Any]:
+        # is_ready loads the index file on first access
+        return {"loaded": _index(name).is_ready}
+
+    return load
+
+
+for _name in INDEXES:
+    warmup.step(_name)(_index_step(_name))
+
+
+@warmup.step("query_paths")
+def _query_paths() -> Dict[str, Any]:
+    from services.embedding_store import EMBEDDING_DIM
+
+    query = np.random.default_rng(0).standard_normal(EMBEDDING_DIM).astype(np.float32)
+    warmed = []
+    for name in VECTOR_INDEXES:
+        index = _index(name)
+        if not index.is_ready:
+            continue
+        if name == "flat_index":
+            index.batch_search([query], limit=1)
+        else:
+            index.search(query, limit=1)
+        warmed.append(name)
+    return {"searched": warmed}
+
+
+def hot_artwork_ids(limit: int = WARMUP_HOT_ARTWORKS) -> Tuple[List[str], str]:
+    """Artworks sessions show most often (or the newest, before any session stats exist)"""
+    from services.session_stats import session_stats
+
+    if session_stats.is_ready:
+        ids = [row["artwork_id"] for row in session_stats.top_artworks(by="impressions", limit=limit)]
+        if ids:
+            return ids, "session_stats"
+    from crud.artwork_crud import artwork_crud
+
+    recent = asyncio.run(artwork_crud.get_recent_artworks(limit))
+    return [str(artwork.id) for artwork in recent], "recent"
+
+
+@warmup.step("hot_artworks")
+def _hot_artworks() -> Dict[str, Any]:
+    from crud.artwork_crud import artwork_crud
+    from crud.artwork_embedding_crud import artwork_embedding_crud
+    from services.serialization import FastJSONResponse
+
+    if not warmup.components.get("database", {}).get("connected"):
+        return {"skipped": "database unavailable"}
+    ids, source = hot_artwork_ids()
+
+    async def read_all():
+        return await asyncio.gather(
+            *(artwork_crud.get_artwork_by_id(artwork_id) for artwork_id in ids),
+            *(artwork_embedding_crud.get_embedding_by_artwork_id(artwork_id) for artwork_id in ids),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(read_all())
+    artworks = [result for result in results[:len(ids)] if result and not isinstance(result, BaseException)]
+    FastJSONResponse(content=artworks)
+    return {"source": source, "artworks": len(artworks), "failed": sum(isinstance(r, BaseException) for r in results)}
@@ -0,0 +1,5 @@
+-- Store an image embedding for each room upload
+-- Filled in the background by the backend embedder after the upload is created
+
+ALTER TABLE public.room_upload
+    ADD COLUMN IF NOT EXISTS embedding VECTOR(384);
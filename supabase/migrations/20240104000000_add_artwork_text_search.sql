@@ -0,0 +1,79 @@
+-- Full-text search over artwork title, brand and style tags
+-- search_vector is a generated tsvector (title weighted A, brand B, style tags C) with a GIN index;
+-- a trigram index over the same text catches typos when the full-text query matches nothing
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- array_to_string is only STABLE, so wrap the document builders to use them in a generated column and an index
+CREATE OR REPLACE FUNCTION artwork_search_document(title text, brand text, style_tags text[])
+RETURNS tsvector
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT setweight(to_tsvector('english'::regconfig, coalesce(title, '')), 'A')
+      || setweight(to_tsvector('english'::regconfig, coalesce(brand, '')), 'B')
+      || setweight(to_tsvector('english'::regconfig, coalesce(array_to_string(style_tags, ' '), '')), 'C');
+$$;
+
+CREATE OR REPLACE FUNCTION artwork_search_text(title text, brand text, style_tags text[])
+RETURNS text
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT lower(concat_ws(' ', title, brand, array_to_string(style_tags, ' ')));
+$$;
+
+ALTER TABLE public.artwork
+    ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (artwork_search_document(title, brand, style_tags)) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_artwork_search_vector ON public.artwork USING GIN(search_vector);
+CREATE INDEX IF NOT EXISTS idx_artwork_search_trgm ON public.artwork
+    USING GIN(artwork_search_text(title, brand, style_tags) gin_trgm_ops);
+
+-- Ranked text search: every query word must match (websearch syntax: "quoted phrases", -excluded, or);
+-- if no artwork matches, fall back to trigram word similarity so misspelt queries still find artworks
+CREATE OR REPLACE FUNCTION search_artworks_text(
+  query text,
+  match_count int DEFAULT 10,
+  match_offset int DEFAULT 0,
+  min_similarity float DEFAULT 0.3
+)
+RETURNS TABLE (
+  id uuid,
+  title text,
+  brand text,
+  price decimal,
+  style_tags text[],
+  dominant_palette jsonb,
+  image_url text,
+  created_at timestamp with time zone,
+  updated_at timestamp with time zone,
+  score float
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  ts_query tsquery := websearch_to_tsquery('english', query);
+  fuzzy_query text := lower(query);
+BEGIN
+  IF EXISTS (SELECT 1 FROM artwork a WHERE a.search_vector @@ ts_query) THEN
+    RETURN QUERY
+    SELECT a.id, a.title, a.brand, a.price, a.style_tags, a.dominant_palette, a.image_url, a.created_at, a.updated_at,
+           ts_rank_cd(a.search_vector, ts_query, 32)::float
+    FROM artwork a
+    WHERE a.search_vector @@ ts_query
+    ORDER BY ts_rank_cd(a.search_vector, ts_query, 32) DESC, a.created_at DESC
+    LIMIT match_count OFFSET match_offset;
+  ELSE
+    PERFORM set_config('pg_trgm.word_similarity_threshold', min_similarity::text, true);
+    RETURN QUERY
+    SELECT a.id, a.title, a.brand, a.price, a.style_tags, a.dominant_palette, a.image_url, a.created_at, a.updated_at,
+           word_similarity(fuzzy_query, artwork_search_text(a.title, a.brand, a.style_tags))::float
+    FROM artwork a
+    WHERE fuzzy_query <% artwork_search_text(a.title, a.brand, a.style_tags)
+    ORDER BY word_similarity(fuzzy_query, artwork_search_text(a.title, a.brand, a.style_tags)) DESC, a.created_at DESC
+    LIMIT match_count OFFSET match_offset;
+  END IF;
+END;
+$$;